@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the harness itself against the local fake ORS server (orsdev.fake): the CPU time per request spent on
+generating, sending and receiving, and diffing, and the highest open-loop rate the async runner keeps up with.
+
+The server runs in separate processes with a constant latency, so the harness process' CPU time is its own overhead.
+
+Run from the root of the project:
+
+`python benchmarks/harness.py`
+"""
+
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+import numpy as np
+import yaml
+
+# Append current path to PYTHONPATH to find the orsdev module
+sys.path.append(os.getcwd())
+
+from orsdev import diff
+from orsdev.client import AsyncClient, build_request
+from orsdev.fake import serve, directions_response, isochrones_response, matrix_response
+from orsdev.generator import ORSGenerator
+from orsdev.loadgen import OpenLoopRunner, step_schedule
+
+geojson = 'geojson/regbez_karlsruhe.geojson'
+templates = {
+    'directions': 'orsdev/templates/openrouteservice_car.yaml',
+    'isochrones': 'orsdev/templates/openrouteservice_isochrones_matrix.yaml',
+    'matrix': 'orsdev/templates/openrouteservice_isochrones_matrix.yaml',
+    'optimization': 'orsdev/templates/openrouteservice_optimization.yaml'
+}
+responses = {'directions': directions_response, 'isochrones': isochrones_response, 'matrix': matrix_response}
+
+# Amount of generated requests per endpoint, cycled by the load steps
+n = 500
+# Server processes and their constant latency in ms
+server_processes = max(multiprocessing.cpu_count() - 1, 1)
+latency = 5
+# Offered rates, doubled per step until the runner falls behind, and seconds per step
+start_rps = 250
+max_rps = 16000
+step_duration = 2
+# The runner keeps up if its sends lag less than this many ms (p99) and it achieves this share of the offered rate
+max_lag = 10
+min_share = 0.95
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('localhost', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("Fake server didn't start within {} s.".format(timeout))
+
+
+def cpu_per_request(func, args):
+    """:return: CPU microseconds per call of func, once per args."""
+    start = time.process_time()
+    for arg in args:
+        func(arg)
+    return 1e6 * (time.process_time() - start) / len(args)
+
+
+def max_rate(base_url, endpoint, requests):
+    """
+    Offers doubling rates until the runner falls behind.
+
+    :return: The highest rate kept up with, and the CPU microseconds per request of the async client at that rate.
+    :rtype: tuple of (float, float)
+    """
+    best, cpu = 0, float('nan')
+    rps = start_rps
+    while rps <= max_rps:
+        runner = OpenLoopRunner(AsyncClient(base_url), endpoint, requests, step_schedule([(rps, step_duration)]))
+        start = time.process_time()
+        result = runner.run()
+        elapsed = time.process_time() - start
+
+        lag = 1000 * np.percentile(result.sent - result.intended, 99)
+        achieved = len(result.sent) / result.sent.max() if len(result.sent) > 1 else 0
+        failed = sum(error is not None for error in result.errors)
+        if failed or lag > max_lag or achieved < min_share * rps:
+            break
+        best, cpu = rps, 1e6 * elapsed / len(result.sent)
+        rps *= 2
+
+    return best, cpu
+
+
+if __name__ == '__main__':
+    port = free_port()
+    # not a daemon, serve() starts the other server processes from it
+    server = multiprocessing.Process(target=serve,
+                                     args=('localhost', port),
+                                     kwargs={'processes': server_processes,
+                                             'latency_median': latency,
+                                             'latency_sigma': 0})
+    server.start()
+    wait_for(port)
+    base_url = 'http://localhost:{}'.format(port)
+
+    print("{} server processes with {} ms latency, {} requests per endpoint\n".format(server_processes, latency, n))
+    print("{:<14}{:>16}{:>16}{:>16}{:>12}{:>18}".format('endpoint', 'generate us/req', 'send us/req', 'diff us/req',
+                                                        'max rps', 'response bytes'))
+    try:
+        for endpoint, template in templates.items():
+            with open(template) as f:
+                template_dict = yaml.safe_load(f)
+            gen = ORSGenerator(endpoint, template_dict, geojson, seed=42)
+
+            generate = cpu_per_request(lambda _: gen.create_requests(), range(n))
+            requests = [gen.create_requests() for _ in range(n)]
+
+            diff_us, size = float('nan'), float('nan')
+            if endpoint in responses:
+                # a real dev test compares two responses per request, diff one against itself
+                pairs = []
+                for params in requests:
+                    path, body = build_request(endpoint, params)
+                    body['profile'] = params['profile']
+                    resp = responses[endpoint](body, path.rsplit('/', 1)[1]) if endpoint == 'directions' \
+                        else responses[endpoint](body)
+                    pairs.append((resp, bool(params.get('elevation'))))
+                # gpx isn't diffed
+                pairs = [pair for pair in pairs if not isinstance(pair[0], str)]
+                methods = template_dict['endpoints'][endpoint]['methods']
+                diff_us = cpu_per_request(lambda pair: list(diff.compare_responses(endpoint, methods, 'semantic',
+                                                                                   [pair[0], pair[0]],
+                                                                                   is3d=pair[1])), pairs)
+                size = np.mean([len(json.dumps(pair[0])) for pair in pairs])
+
+            rps, send = max_rate(base_url, endpoint, requests)
+            print("{:<14}{:>16.0f}{:>16.0f}{:>16.0f}{:>12}{:>18.0f}".format(endpoint, generate, send, diff_us, rps,
+                                                                            size))
+    finally:
+        server.terminate()
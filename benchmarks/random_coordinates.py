@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks coordinate generation of ORSGenerator against the former point-by-point sampler, and rejection against
+annulus distance sampling.
+
+Run from the root of the project:
+
+`python benchmarks/random_coordinates.py`
+"""
+
+import os
+import random
+import sys
+import time
+
+import yaml
+from shapely.geometry import Point, shape, mapping
+
+# Append current path to PYTHONPATH to find the orsdev module
+sys.path.append(os.getcwd())
+
+from orsdev.generator import ORSGenerator
+
+geojson = 'geojson/regbez_karlsruhe.geojson'
+templates = {
+    'no distance': None,
+    'car distance': 'orsdev/templates/openrouteservice_car.yaml',
+    'optimization distance': 'orsdev/templates/openrouteservice_optimization.yaml'
+}
+
+# Amount of coordinates per run, i.e. the maximum amount of jobs of the optimization template
+n = 51
+runs = 200
+
+
+def point_by_point(gen, polygon, n):
+    """The former ORSGenerator._random_coordinates: one shapely Point and one contains() call per candidate."""
+    coordinates = []
+
+    for _ in range(n):
+        counter = 0
+        in_geojson = False
+        while not in_geojson:
+            x = random.uniform(gen.minx, gen.maxx)
+            y = random.uniform(gen.miny, gen.maxy)
+            p = Point(x, y)
+            if polygon.contains(p):
+                if gen.accept_distance and coordinates:
+                    if not gen.accept_distance['min'] < p.distance(Point(coordinates[-1])) < gen.accept_distance['max']:
+                        continue
+                coordinates.append([x, y])
+                in_geojson = True
+            if counter > 1000:
+                raise ValueError("Distance settings are too restrictive. Try a wider range and remember it's in degrees.")
+            counter += 1
+
+    return coordinates
+
+
+def coordinates_per_second(func):
+    start = time.perf_counter()
+    for _ in range(runs):
+        func(n)
+    return n * runs / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    for name, template in templates.items():
+        distance = None
+        if template:
+            with open(template) as f:
+                distance = yaml.safe_load(f)['distance']
+        gen = ORSGenerator('directions',
+                           {'distance': distance, 'endpoints': {'directions': {'params': {}}}},
+                           geojson)
+        # ORSGenerator prepares its polygon in place, the former sampler tested against the plain geometry
+        polygon = shape(mapping(gen.polygon))
+
+        before = coordinates_per_second(lambda k: point_by_point(gen, polygon, k))
+        after = coordinates_per_second(gen._random_coordinates)
+        print("{:<22} before: {:>10.0f} coords/s   after: {:>10.0f} coords/s   speedup: {:.1f}x".format(name,
+                                                                                                      before,
+                                                                                                      after,
+                                                                                                      after / before))
+
+    for name, template in templates.items():
+        if not template:
+            continue
+        with open(template) as f:
+            template_dict = {'distance': yaml.safe_load(f)['distance'], 'endpoints': {'directions': {'params': {}}}}
+        for sampling in ('bbox', 'triangulation'):
+            rates = dict()
+            for distance_sampling in ('rejection', 'annulus'):
+                gen = ORSGenerator('directions', template_dict, geojson, sampling=sampling,
+                                   distance_sampling=distance_sampling)
+                rates[distance_sampling] = coordinates_per_second(gen._random_coordinates), gen.acceptance_rate
+            print("{:<22} {:<14} rejection: {:>10.0f} coords/s ({:.2f} accepted)   "
+                  "annulus: {:>10.0f} coords/s ({:.2f} accepted)".format(name, sampling,
+                                                                         *rates['rejection'] + rates['annulus']))
@@ -0,0 +1,191 @@
+from locust import HttpLocust, TaskSet, task, events, web
+from collections import defaultdict, Counter
+import time
+import sys
+import os
+
+# Append current path to PYTHONPATH to find the orsdev module
+sys.path.append(os.getcwd())
+
+import openrouteservice as ors
+from orsdev import metrics
+from orsdev.client import build_request
+from orsdev.generator import MixedGenerator
+from orsdev.stats import Histogram, ComplexityStats, request_complexity, request_name
+
+# Traffic mix as (endpoint, template, weight), weights are relative. Profiles are drawn from each template's profiles.
+mix = [
+    ('directions', 'orsdev/templates/openrouteservice_car.yaml', 70),
+    ('matrix', 'orsdev/templates/openrouteservice_isochrones_matrix.yaml', 15),
+    ('isochrones', 'orsdev/templates/openrouteservice_isochrones_matrix.yaml', 10),
+    ('optimization', 'orsdev/templates/openrouteservice_optimization.yaml', 5)
+]
+geojson = 'geojson/regbez_karlsruhe.geojson'
+
+# Directory to cache the parsed GeoJSON in, so every worker process loads it in milliseconds. No caching if None.
+cache_dir = '.cache'
+
+# Define client-side timeout in seconds
+timeout = 1800
+api_key = '5b3ce3597851110001cf62484d5d4d0972b540009af270b62e0a5dee'
+
+# stats_page will accessible via http://localhost:8089/<stats_page>
+stats_page = "/ors-stats"
+# Timings of the harness' stages (generating, requesting) in the OpenMetrics format, e.g. to be scraped by Prometheus
+metrics_page = "/metrics"
+metrics.REGISTRY.enabled = True
+
+# Statistics per endpoint/profile, e.g. directions/driving-car: streaming histograms with constant memory, merged on
+# the master in distributed mode
+milliseconds = defaultdict(Histogram)
+apierrors = Counter()
+# any other exception, e.g. of parameters the client doesn't know
+othererrors = Counter()
+# response times by problem size per endpoint
+complexity = defaultdict(ComplexityStats)
+
+
+class OrsMixedTest(TaskSet):
+    """Task set to complete by each spawned user."""
+
+    gen = MixedGenerator(mix, geojson, cache_dir=cache_dir)
+
+    @task
+    def mixed(self):
+        """Does the real request, of the endpoint and profile drawn from the mix."""
+
+        endpoint, params = self.gen.create_requests()
+        name = request_name(endpoint, params)
+
+        start = time.time()
+        try:
+            with metrics.REGISTRY.stage('request', endpoint=endpoint):
+                # the body as the API takes it, the client's endpoint functions reject parameters they don't know,
+                # e.g. the isochrones' intersections
+                path, body = build_request(endpoint, params)
+                self.client.request(path, post_json=body)
+
+        # ref. https://medium.com/locust-io-lets-get-some-fun/locust-custom-client-23e205f4611f
+        except Exception as e:
+            total = int((time.time() - start) * 1000)
+            if isinstance(e, ors.exceptions.ApiError):
+                apierrors[name] += 1
+            else:
+                othererrors[name] += 1
+
+            # needed to count towards locust statistics
+            events.request_failure.fire(request_type="POST",
+                                        name=name,
+                                        response_time=total,
+                                        exception=e)
+        else:
+            total = int((time.time() - start) * 1000)
+            milliseconds[name].record(total)
+            complexity[endpoint].record(request_complexity(endpoint, params)['size'], total)
+            events.request_success.fire(request_type="POST",
+                                        name=name,
+                                        response_time=total,
+                                        response_length=0)
+
+
+class ORSclient(ors.Client):
+    """redefine built-in client to openrouterservice-py Client class"""
+    def __init__(self, host):
+        super(ORSclient, self).__init__(base_url=host,
+                                        key=api_key,
+                                        timeout=timeout)
+
+
+class ORSlocust(HttpLocust):
+    """needed to bind the ORS client to Locust"""
+    def __init__(self):
+        super(ORSlocust, self).__init__()
+        self.client = ORSclient(self.host)
+
+
+class MixedUser(ORSlocust):
+    """The actual user doing things."""
+    task_set = OrsMixedTest
+    min_wait = 15  # msec
+    max_wait = 15  # msec
+
+
+def on_report_to_master(client_id, data):
+    """Sends the stats collected since the last report from a worker to the master."""
+    data['ors_milliseconds'] = {name: h.snapshot() for name, h in milliseconds.items()}
+    data['ors_apierrors'] = dict(apierrors)
+    data['ors_othererrors'] = dict(othererrors)
+    data['ors_complexity'] = {endpoint: c.snapshot() for endpoint, c in complexity.items()}
+    data['ors_metrics'] = metrics.REGISTRY.snapshot()
+    milliseconds.clear()
+    apierrors.clear()
+    othererrors.clear()
+    complexity.clear()
+    metrics.REGISTRY.reset()
+
+
+def on_slave_report(client_id, data):
+    """Merges the stats of a worker on the master."""
+    for name, snapshot in data.get('ors_milliseconds', {}).items():
+        milliseconds[name].merge(snapshot)
+    apierrors.update(data.get('ors_apierrors', {}))
+    othererrors.update(data.get('ors_othererrors', {}))
+    for endpoint, snapshot in data.get('ors_complexity', {}).items():
+        complexity[endpoint].merge(snapshot)
+    if 'ors_metrics' in data:
+        metrics.REGISTRY.merge(data['ors_metrics'])
+
+
+events.report_to_master += on_report_to_master
+events.slave_report += on_slave_report
+
+
+def _format_stats():
+    rows = []
+    for name in sorted(set(milliseconds) | set(apierrors) | set(othererrors)):
+        h = milliseconds[name]
+        if h.count:
+            rows.append("<tr><td>{}</td><td>{}</td><td>{:.2f}</td><td>{:.2f}</td><td>{:.2f}</td><td>{:.2f}</td>"
+                        "<td>{}</td><td>{}</td></tr>".format(name, h.count, h.mean, h.percentile(50),
+                                                             h.percentile(90), h.percentile(99), apierrors[name],
+                                                             othererrors[name]))
+        else:
+            rows.append("<tr><td>{}</td><td>0</td><td></td><td></td><td></td><td></td><td>{}</td><td>{}</td>"
+                        "</tr>".format(name, apierrors[name], othererrors[name]))
+    return """<b>MILLISECONDS BY ENDPOINT/PROFILE<br></b>
+        <table><tr><th>Name</th><th>Count</th><th>Mean</th><th>p50</th><th>p90</th><th>p99</th><th>API errors</th>
+        <th>Other errors</th></tr>
+        {}</table><br>""".format(''.join(rows))
+
+
+def _format_complexity():
+    tables = []
+    for endpoint in sorted(complexity):
+        rows = ["<tr><td>{}-{}</td><td>{}</td><td>{:.2f}</td><td>{:.2f}</td><td>{:.2f}</td></tr>".format(
+            row['bucket'], 2 * row['bucket'] - 1, row['count'], row['p50'], row['p90'], row['p99'])
+            for row in complexity[endpoint].report()]
+        fit = complexity[endpoint].fit()
+        scaling = "ms = {:.3f} * size ^ {:.2f}".format(*fit) if fit else "Not enough data yet."
+        tables.append("""<b>{} MILLISECONDS BY PROBLEM SIZE<br></b>
+        <table><tr><th>Size</th><th>Count</th><th>p50</th><th>p90</th><th>p99</th></tr>{}</table>
+        Scaling: {}<br><br>""".format(endpoint.upper(), ''.join(rows), scaling))
+    return '\n'.join(tables)
+
+
+@web.app.route(stats_page)
+def total_content_length():
+    """
+    Add a route to the Locust web app, where we can see statistics of the generated requests
+    """
+    return """
+    {}
+    {}
+    """.format(_format_stats(), _format_complexity())
+
+
+@web.app.route(metrics_page)
+def openmetrics():
+    """
+    Add a route to the Locust web app with the timings of the harness' stages, merged from all workers
+    """
+    return web.app.response_class(metrics.REGISTRY.text(), mimetype=metrics.CONTENT_TYPE)
@@ -3,16 +3,31 @@ import time
 import sys
 import os
 import yaml
-from statistics import mean, median
+import itertools
 
 # Append current path to PYTHONPATH to find the orsdev module
 sys.path.append(os.getcwd())
 
 import openrouteservice as ors
+from orsdev import metrics
 from orsdev.generator import ORSGenerator
+from orsdev.corpus import RequestCorpus
+from orsdev.cache import ResponseCache, CachingClient
+from orsdev.stats import Histogram, ComplexityStats, request_complexity
 
 template = 'orsdev/templates/openrouteservice_optimization.yaml'
 geojson = 'geojson/regbez_karlsruhe.geojson'
+# Directory to cache the parsed GeoJSON in, so every worker process loads it in milliseconds. No caching if None.
+cache_dir = '.cache'
+
+# Optional pre-generated corpus (see orsdev.corpus.write_corpus), so no requests are generated during the test.
+# Overrides template and geojson.
+corpus = None
+
+# Optional response cache file (see orsdev.cache): records responses, or with replay = True serves recorded responses
+# without requesting the host at all, e.g. to test the harness itself. Replay needs the recorded corpus.
+response_cache = None
+replay = False
 
 # Define client-side timeout in seconds
 timeout = 1800
@@ -20,39 +35,59 @@ api_key = '5b3ce3597851110001cf62484d5d4d0972b540009af270b62e0a5dee'
 
 # stats_page will accessible via http://localhost:8089/<stats_page>
 stats_page = "/ors-stats"
-
-# Statistics counters
-jobs_amount = []
-veh_amount = []
-seconds = []
-apierror = []
+# Timings of the harness' stages (generating, requesting) in the OpenMetrics format, e.g. to be scraped by Prometheus
+metrics_page = "/metrics"
+metrics.REGISTRY.enabled = True
+
+# Statistics: streaming histograms with constant memory, merged on the master in distributed mode
+histograms = {
+    'jobs': Histogram(),
+    'vehicles': Histogram(),
+    'milliseconds': Histogram()
+}
+apierrors = Histogram()
+# response times by problem size, i.e. jobs * vehicles
+complexity = ComplexityStats()
+# shared by all users of this process
+cache = ResponseCache(response_cache) if response_cache else None
 
 class OrsStressTest(TaskSet):
     """Task set to complete by each spawned user."""
 
-    with open(os.path.realpath(template)) as f:
-        template_dict = yaml.safe_load(f)
+    if corpus:
+        requests = RequestCorpus(corpus)
+        # shared by all users of this process, cycles through the corpus
+        counter = itertools.count()
+    else:
+        with open(os.path.realpath(template)) as f:
+            template_dict = yaml.safe_load(f)
 
-    gen = ORSGenerator('optimization',
-                       template_dict,
-                       geojson)
+        gen = ORSGenerator('optimization',
+                           template_dict,
+                           geojson,
+                           cache_dir=cache_dir)
 
     @task
     def optimization(self):
         """Does the real request."""
 
-        # Create random requests defined by 'template' variable
-        params = self.gen.create_requests()
+        if corpus:
+            # Read the next pre-generated request
+            params = self.requests[next(self.counter) % len(self.requests)]
+        else:
+            # Create random requests defined by 'template' variable
+            params = self.gen.create_requests()
 
         start = time.time()
         try:
-            result = ors.optimization.optimization(self.client, **params)
+            with metrics.REGISTRY.stage('request', endpoint='optimization'):
+                result = ors.optimization.optimization(self.client, **params)
 
         # ref. https://medium.com/locust-io-lets-get-some-fun/locust-custom-client-23e205f4611f
         except ors.exceptions.ApiError as e:
             total = int((time.time() - start) * 1000)
 
-            apierror.append(e.message)
+            apierrors.record(total)
             print(e.message)
 
             # needed to count towards locust statistics
@@ -62,11 +97,12 @@ class OrsStressTest(TaskSet):
                                         exception=e)
         else:
             total = int((time.time() - start) * 1000)
-            seconds.append(total)
+            histograms['milliseconds'].record(total)
 
             # count stats and send them to locust
-            jobs_amount.append(len(params['jobs']))
-            veh_amount.append(len(params['vehicles']))
+            histograms['jobs'].record(len(params['jobs']))
+            histograms['vehicles'].record(len(params['vehicles']))
+            complexity.record(request_complexity('optimization', params)['size'], total)
             events.request_success.fire(request_type="POST",
                                         name='optimization',
                                         response_time=total,
@@ -85,7 +121,14 @@ class ORSlocust(HttpLocust):
     """needed to bind the ORS client to Locust"""
     def __init__(self):
         super(ORSlocust, self).__init__()
-        self.client = ORSclient(self.host)
+        if response_cache:
+            self.client = CachingClient(cache,
+                                        replay=replay,
+                                        base_url=self.host,
+                                        key=api_key,
+                                        timeout=timeout)
+        else:
+            self.client = ORSclient(self.host)
 
 
 class OptimizationUser(ORSlocust):
@@ -95,41 +138,81 @@ class OptimizationUser(ORSlocust):
     max_wait = 15  # msec
 
 
+def on_report_to_master(client_id, data):
+    """Sends the histograms collected since the last report from a worker to the master."""
+    data['ors_stats'] = {name: h.snapshot() for name, h in histograms.items()}
+    data['ors_stats']['apierrors'] = apierrors.snapshot()
+    data['ors_complexity'] = complexity.snapshot()
+    for h in list(histograms.values()) + [apierrors, complexity]:
+        h.reset()
+    data['ors_metrics'] = metrics.REGISTRY.snapshot()
+    metrics.REGISTRY.reset()
+
+
+def on_slave_report(client_id, data):
+    """Merges the histograms of a worker on the master."""
+    for name, snapshot in data.get('ors_stats', {}).items():
+        (apierrors if name == 'apierrors' else histograms[name]).merge(snapshot)
+    complexity.merge(data.get('ors_complexity', {}))
+    if 'ors_metrics' in data:
+        metrics.REGISTRY.merge(data['ors_metrics'])
+
+
+events.report_to_master += on_report_to_master
+events.slave_report += on_slave_report
+
+
+def _format_stats(name, h):
+    if not h.count:
+        return "<b>{}<br></b>\n        No data yet.<br><br>".format(name.upper())
+    return """<b>{}<br></b>
+        Count: {}<br>
+        Mean: {:.2f}<br>
+        p50: {:.2f}<br>
+        p90: {:.2f}<br>
+        p99: {:.2f}<br>
+        p99.9: {:.2f}<br>
+        Max: {}<br>
+        Min: {}<br><br>""".format(name.upper(),
+                                  h.count,
+                                  h.mean,
+                                  h.percentile(50),
+                                  h.percentile(90),
+                                  h.percentile(99),
+                                  h.percentile(99.9),
+                                  h.max,
+                                  h.min)
+
+
+def _format_complexity():
+    rows = ["<tr><td>{}-{}</td><td>{}</td><td>{:.2f}</td><td>{:.2f}</td><td>{:.2f}</td></tr>".format(
+        row['bucket'], 2 * row['bucket'] - 1, row['count'], row['p50'], row['p90'], row['p99'])
+        for row in complexity.report()]
+    fit = complexity.fit()
+    scaling = "ms = {:.3f} * size ^ {:.2f}".format(*fit) if fit else "Not enough data yet."
+    return """<b>MILLISECONDS BY JOBS * VEHICLES<br></b>
+        <table><tr><th>Size</th><th>Count</th><th>p50</th><th>p90</th><th>p99</th></tr>{}</table>
+        Scaling: {}<br><br>""".format(''.join(rows), scaling)
+
+
 @web.app.route(stats_page)
 def total_content_length():
     """
-    Add a route to the Locust web app, where we can see the total content-length
+    Add a route to the Locust web app, where we can see statistics of the generated requests
     """
     return """
-    <b>JOBS<br></b>
-        Mean: {0:.2f}<br>
-        Median: {1:.2f}<br>
-        Max: {2}<br>
-        Min: {3}<br><br>
-    <b>VEHICLES<br></b>
-        Mean: {4:.2f}<br>
-        Median: {5:.2f}<br>
-        Max: {6}<br>
-        Min: {7}<br><br>
-    <b>SECONDS<br></b>
-        Mean: {8:.2f}<br>
-        Median: {9:.2f}<br>
-        Max: {10}<br>
-        Min: {11}<br><br>
+    {}
+    {}
+    {}
+    {}
     <b>API ERRORS:<br></b>
-        Total: {12}<br>
-        
-    """.format(mean(jobs_amount),
-               median(jobs_amount),
-               max(jobs_amount),
-               min(jobs_amount),
-               mean(veh_amount),
-               median(veh_amount),
-               max(veh_amount),
-               min(veh_amount),
-               mean(seconds),
-               median(seconds),
-               max(seconds),
-               min(seconds),
-               len(apierror)
-               )
\ No newline at end of file
+        Total: {}<br>
+    """.format(*[_format_stats(name, h) for name, h in histograms.items()], _format_complexity(), apierrors.count)
+
+
+@web.app.route(metrics_page)
+def openmetrics():
+    """
+    Add a route to the Locust web app with the timings of the harness' stages, merged from all workers
+    """
+    return web.app.response_class(metrics.REGISTRY.text(), mimetype=metrics.CONTENT_TYPE)
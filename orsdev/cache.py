@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import sqlite3
+import threading
+import zlib
+
+import openrouteservice as ors
+
+
+class CacheMiss(Exception):
+    """Raised by a replaying client for requests which weren't recorded."""
+    pass
+
+
+def request_key(path, body=None, query=None):
+    """
+    Content address of a request: its URL path and canonicalized parameters, i.e. JSON with sorted keys, so the same
+    request maps to the same key regardless of the parameters' order or the client which sends it.
+
+    :param path: URL path of the request, e.g. /v2/directions/driving-car/json.
+    :type path: str
+
+    :param body: JSON body of the request.
+    :type body: dict
+
+    :param query: Query parameters of the request.
+    :type query: dict
+
+    :rtype: str
+    """
+    canonical = json.dumps([path, query, body], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+class ResponseCache(object):
+
+    def __init__(self,
+                 filename,
+                 max_size=None):
+        """
+        Persistent, content-addressed cache of ORS responses in a SQLite file, see request_key(). Use one file per
+        server, i.e. for the stable server of dev tests, whose responses don't change between runs with the same seed.
+
+        Safe to share between threads, and between processes for reading, e.g. locust workers replaying responses.
+
+        :param filename: Path of the SQLite file, created if it doesn't exist.
+        :type filename: str
+
+        :param max_size: Maximum size of the stored (compressed) responses in bytes, the least recently used ones are
+            evicted beyond. Access order is only tracked if set, so unbounded caches are read without writing. None for
+            no limit.
+        :type max_size: int
+        """
+        self.filename = filename
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(filename, timeout=60, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS responses "
+                               "(key TEXT PRIMARY KEY, response BLOB, size INTEGER, accessed INTEGER)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self.size, last = self._conn.execute("SELECT COALESCE(SUM(size), 0), COALESCE(MAX(accessed), 0) "
+                                                 "FROM responses").fetchone()
+        self._clock = last
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+
+    def get(self, key):
+        """
+        :param key: The request's key, see request_key().
+        :type key: str
+
+        :return: The recorded response, None if there is none.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.max_size is not None:
+                self._clock += 1
+                self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (self._clock, key))
+
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def put(self, key, response):
+        """
+        Records a response and evicts the least recently used ones if the cache grows beyond max_size.
+
+        :param key: The request's key, see request_key().
+        :type key: str
+
+        :param response: The parsed JSON response, or the response text for GPX.
+        """
+        blob = zlib.compress(json.dumps(response, separators=(',', ':')).encode('utf-8'))
+        with self._lock:
+            self._clock += 1
+            self._conn.execute("BEGIN")
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                               (key, sqlite3.Binary(blob), len(blob), self._clock))
+            self.size += len(blob) - (old[0] if old else 0)
+            if self.max_size is not None and self.size > self.max_size:
+                self._evict()
+            self._conn.execute("COMMIT")
+
+    def _evict(self):
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            if self.size <= self.max_size:
+                break
+            evicted.append((key,))
+            self.size -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self.size = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachingClient(ors.Client):
+
+    def __init__(self,
+                 cache,
+                 replay=False,
+                 **kwargs):
+        """
+        ors-py client answering recorded requests from a ResponseCache and recording all others. Drop-in replacement
+        for openrouteservice.Client, e.g. as the stable client of ORSprocessor.dev_test(), so repeated dev tests with the
+        same seed only hit the dev server.
+
+        In replay mode, no server is requested at all and unrecorded requests raise CacheMiss, e.g. to feed dev tests or
+        locust from a recording. Set "CacheMiss" in the template's error_handler to skip or log those.
+
+        :param cache: The cache to answer from and record to.
+        :type cache: ResponseCache
+
+        :param replay: Whether to only serve recorded responses.
+        :type replay: bool
+
+        :param kwargs: Passed on to openrouteservice.Client, e.g. base_url and timeout.
+        """
+        if replay:
+            # no server to request, but ors-py insists on a key for its default URL
+            kwargs.setdefault('base_url', 'replay://{}'.format(cache.filename))
+        super(CachingClient, self).__init__(**kwargs)
+        self.cache = cache
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+
+    def request(self,
+                url,
+                get_params=None,
+                first_request_time=None,
+                retry_counter=0,
+                requests_kwargs=None,
+                post_json=None,
+                dry_run=None):
+        """Answers from the cache if possible, see openrouteservice.Client.request()."""
+        if dry_run:
+            return super(CachingClient, self).request(url, get_params, first_request_time, retry_counter,
+                                                      requests_kwargs, post_json, dry_run)
+
+        key = request_key(url, post_json, get_params)
+        response = self.cache.get(key)
+        if response is not None:
+            self.hits += 1
+            return response
+        # retries of ors-py come back here, only count the first attempt
+        if retry_counter == 0:
+            self.misses += 1
+        if self.replay:
+            raise CacheMiss("No response recorded for {}".format(url))
+
+        response = super(CachingClient, self).request(url, get_params, first_request_time, retry_counter,
+                                                      requests_kwargs, post_json, dry_run)
+        self.cache.put(key, response)
+        return response
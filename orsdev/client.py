@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+
+import aiohttp
+from openrouteservice import exceptions
+
+from orsdev import metrics
+from orsdev.corpus import serialize_params
+
+
+class TransportError(Exception):
+    """
+    A request failed below HTTP, e.g. the connection was refused or reset. openrouteservice-py has no exception for
+    this, its client lets requests' ConnectionError through.
+    """
+    pass
+
+
+def build_request(endpoint, params):
+    """
+    Translates parameters as generated by ORSGenerator into the URL path and JSON body of an ORS API request, the same
+    way as openrouteservice-py does.
+
+    :param endpoint: One of 'directions', 'isochrones', 'matrix', 'optimization'.
+    :type endpoint: str
+
+    :param params: Parameters as returned by ORSGenerator.create_requests().
+    :type params: dict
+
+    :return: The URL path and the JSON body.
+    :rtype: tuple of (str, dict)
+    """
+    if endpoint == 'optimization':
+        return '/optimization', serialize_params(params)
+
+    body = dict(params)
+    profile = body.pop('profile')
+    if endpoint == 'directions':
+        path = '/v2/directions/{}/{}'.format(profile, body.pop('format', 'json'))
+    elif endpoint == 'isochrones':
+        path = '/v2/isochrones/{}/geojson'.format(profile)
+    elif endpoint == 'matrix':
+        path = '/v2/matrix/{}/json'.format(profile)
+    else:
+        raise ValueError("{} not a valid endpoint".format(endpoint))
+
+    return path, body
+
+
+class AsyncClient(object):
+
+    def __init__(self,
+                 base_url,
+                 key=None,
+                 timeout=60,
+                 pool_size=1000,
+                 per_host=0,
+                 keepalive_timeout=30):
+        """
+        Asynchronous ORS client with a bounded keep-alive connection pool, so one process can sustain thousands of
+        requests in flight. Raises the same exceptions as openrouteservice-py, so the templates' error_handler applies,
+        and TransportError for failed connections.
+
+        Use as async context manager or call close() when done.
+
+        :param base_url: URL of the ORS instance, e.g. https://api.openrouteservice.org.
+        :type base_url: str
+
+        :param key: API key, only needed for the ORS API.
+        :type key: str
+
+        :param timeout: Total timeout per request in seconds.
+        :type timeout: int
+
+        :param pool_size: Maximum amount of open connections. Further requests wait for a free connection.
+        :type pool_size: int
+
+        :param per_host: Maximum amount of open connections per host, 0 for no limit.
+        :type per_host: int
+
+        :param keepalive_timeout: Seconds to keep idle connections open.
+        :type keepalive_timeout: int
+        """
+        self.base_url = base_url.rstrip('/')
+        self._headers = {'Content-Type': 'application/json; charset=utf-8'}
+        if key:
+            self._headers['Authorization'] = key
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._connector_kwargs = dict(limit=pool_size,
+                                      limit_per_host=per_host,
+                                      keepalive_timeout=keepalive_timeout)
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @property
+    def session(self):
+        # Created lazily, a session needs a running event loop
+        if self._session is None:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(**self._connector_kwargs),
+                                                  headers=self._headers,
+                                                  timeout=self._timeout)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def request(self, endpoint, params):
+        """
+        Requests an endpoint with generated parameters.
+
+        :param endpoint: One of 'directions', 'isochrones', 'matrix', 'optimization'.
+        :type endpoint: str
+
+        :param params: Parameters as returned by ORSGenerator.create_requests().
+        :type params: dict
+
+        :return: The parsed JSON response, or the response text for GPX.
+        """
+        with metrics.REGISTRY.stage('serialize', endpoint=endpoint):
+            path, body = build_request(endpoint, params)
+            data = json.dumps(body)
+
+        metrics.REGISTRY.count('requests', server=self.base_url)
+        try:
+            with metrics.REGISTRY.stage('wait', endpoint=endpoint):
+                async with self.session.post(self.base_url + path, data=data) as resp:
+                    text = await resp.text()
+                    status = resp.status
+        except asyncio.TimeoutError as e:
+            # before ClientError, aiohttp's ServerTimeoutError is both
+            metrics.REGISTRY.count('errors', server=self.base_url, error='Timeout')
+            raise exceptions.Timeout() from e
+        except aiohttp.ClientError as e:
+            metrics.REGISTRY.count('errors', server=self.base_url, error='TransportError')
+            raise TransportError("{} {}: {}".format(e.__class__.__name__, self.base_url + path, e)) from e
+
+        if status != 200:
+            metrics.REGISTRY.count('errors', server=self.base_url, error=str(status))
+        if status in (403, 429):
+            raise exceptions._OverQueryLimit(status, text)
+        if status != 200:
+            try:
+                message = json.loads(text)
+            except ValueError:
+                message = text
+            raise exceptions.ApiError(status, message)
+
+        if path.endswith('/gpx'):
+            return text
+        with metrics.REGISTRY.stage('parse', endpoint=endpoint):
+            return json.loads(text)
+
+    async def directions(self, **params):
+        return await self.request('directions', params)
+
+    async def isochrones(self, **params):
+        return await self.request('isochrones', params)
+
+    async def distance_matrix(self, **params):
+        return await self.request('matrix', params)
+
+    async def optimization(self, **params):
+        return await self.request('optimization', params)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+import json
+import mmap
+import multiprocessing
+from math import ceil
+import numpy as np
+
+from openrouteservice import optimization
+
+
+def serialize_params(params):
+    """
+    Converts generated request parameters to plain JSON types, i.e. optimization jobs and vehicles to dicts.
+
+    :param params: Parameters as returned by ORSGenerator.create_requests().
+    :type params: dict
+
+    :rtype: dict
+    """
+    if 'jobs' in params or 'vehicles' in params:
+        params = dict(params)
+        for key in ('jobs', 'vehicles'):
+            if key in params:
+                params[key] = [o.__dict__ for o in params[key]]
+
+    return params
+
+
+def deserialize_params(endpoint, params):
+    """
+    Reverts serialize_params(), so the parameters can be passed to openrouteservice-py again.
+
+    :param endpoint: The endpoint the parameters were generated for.
+    :type endpoint: str
+
+    :param params: Parameters as stored in a corpus.
+    :type params: dict
+
+    :rtype: dict
+    """
+    if endpoint == 'optimization':
+        params['jobs'] = [optimization.Job(**job) for job in params['jobs']]
+        params['vehicles'] = [optimization.Vehicle(**vehicle) for vehicle in params['vehicles']]
+
+    return params
+
+
+def _generate_chunk(generator, chunk_seed, size):
+    generator.seed(chunk_seed)
+    return [json.dumps(serialize_params(generator.create_requests()), separators=(',', ':')) + '\n'
+            for _ in range(size)]
+
+
+# The generator of a worker process, see _init_worker()
+_worker_generator = None
+
+
+def _init_worker(generator):
+    global _worker_generator
+    _worker_generator = generator
+
+
+def _worker_chunk(args):
+    return _generate_chunk(_worker_generator, *args)
+
+
+def write_corpus(generator, n, filename, seed=None, processes=1, chunk_size=1000):
+    """
+    Pre-generates requests into a newline-delimited JSON file. The first line holds the metadata, i.e. endpoint,
+    amount of requests and seed, every following line one request's parameters.
+
+    Requests are generated in chunks of chunk_size, each with its own random stream spawned from seed, so chunks can be
+    generated in parallel and the corpus is the same regardless of the amount of processes.
+
+    :param generator: The generator to create requests from. Its random stream is reseeded.
+    :type generator: orsdev.generator.ORSGenerator
+
+    :param n: Amount of requests to generate.
+    :type n: int
+
+    :param filename: Full path of the output file.
+    :type filename: str
+
+    :param seed: Seed for reproducible requests. Random if None, the used entropy is stored in the metadata.
+    :type seed: int
+
+    :param processes: Amount of worker processes.
+    :type processes: int
+
+    :param chunk_size: Amount of requests per random stream.
+    :type chunk_size: int
+    """
+    seed_seq = np.random.SeedSequence(seed)
+    n_chunks = int(ceil(n / chunk_size))
+    chunks = [(chunk_seed, min(chunk_size, n - idx * chunk_size))
+              for idx, chunk_seed in enumerate(seed_seq.spawn(n_chunks))]
+
+    with open(filename, 'w') as f:
+        f.write(json.dumps({'endpoint': generator._endpoint,
+                            'count': n,
+                            'seed': seed_seq.entropy,
+                            'chunk_size': chunk_size}) + '\n')
+
+        if processes > 1:
+            with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(generator,)) as pool:
+                for lines in pool.imap(_worker_chunk, chunks):
+                    f.writelines(lines)
+        else:
+            for chunk_seed, size in chunks:
+                f.writelines(_generate_chunk(generator, chunk_seed, size))
+
+
+class RequestCorpus(object):
+
+    def __init__(self, filename):
+        """
+        Reads a corpus written by write_corpus() through a memory map. Only the line offsets are indexed up front,
+        requests are parsed when they're accessed.
+
+        :param filename: Full path of the corpus file.
+        :type filename: str
+        """
+        self._file = open(filename, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        newlines = np.flatnonzero(np.frombuffer(self._mmap, dtype=np.uint8) == ord('\n'))
+        self._starts = np.concatenate(([0], newlines[:-1] + 1))
+        self._ends = newlines
+
+        self.meta = json.loads(self._line(0))
+        self.endpoint = self.meta['endpoint']
+
+    def _line(self, idx):
+        return self._mmap[self._starts[idx]:self._ends[idx]]
+
+    def __len__(self):
+        return len(self._starts) - 1
+
+    def __getitem__(self, idx):
+        if not -len(self) <= idx < len(self):
+            raise IndexError("Corpus has only {} requests.".format(len(self)))
+        params = json.loads(self._line(idx % len(self) + 1).decode('utf-8'))
+        return deserialize_params(self.endpoint, params)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+
+from numbers import Number
+
+import dictdiffer
+import numpy as np
+from shapely.geometry import LineString, shape
+from openrouteservice import convert
+
+try:
+    # shapely >= 2.0
+    from shapely import STRtree, points
+except ImportError:
+    STRtree = None
+
+# Mean earth radius in meters
+EARTH_RADIUS = 6371008.8
+
+
+def _as_array(value):
+    """Converts a list or a list of lists of numbers to a float array, returns None for anything else."""
+    if not isinstance(value, list) or not value:
+        return None
+    first = value[0]
+    if isinstance(first, list):
+        first = first[0] if first else None
+    if not isinstance(first, Number) or isinstance(first, bool):
+        return None
+    try:
+        array = np.asarray(value, dtype=float)
+    except (TypeError, ValueError):
+        # ragged or mixed lists
+        return None
+    # deeper nesting, e.g. polygon rings, is compared level by level
+    return array if array.ndim <= 2 else None
+
+
+def _path_text(path):
+    return '.'.join(str(p) for p in path)
+
+
+def line_length(coordinates):
+    """
+    :param coordinates: [lon, lat(, elevation)] coordinates of a line.
+    :type coordinates: numpy.ndarray
+
+    :return: Haversine length in meters.
+    :rtype: float
+    """
+    lon, lat = np.radians(coordinates[:, 0]), np.radians(coordinates[:, 1])
+    a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+    return float(2 * EARTH_RADIUS * np.arcsin(np.sqrt(a)).sum())
+
+
+def hausdorff_distance(a, b):
+    """
+    Discrete Hausdorff distance between the vertices of two lines, through nearest neighbour queries on a spatial index
+    instead of comparing all vertex pairs.
+
+    :param a: [lon, lat(, elevation)] coordinates of a line.
+    :type a: numpy.ndarray
+
+    :param b: [lon, lat(, elevation)] coordinates of another line.
+    :type b: numpy.ndarray
+
+    :return: The distance in degrees.
+    :rtype: float
+    """
+    if STRtree is None:
+        return LineString(a[:, :2]).hausdorff_distance(LineString(b[:, :2]))
+
+    a, b = points(a[:, :2]), points(b[:, :2])
+    distance = 0
+    for source, target in ((a, b), (b, a)):
+        _, distances = STRtree(target).query_nearest(source, return_distance=True, all_matches=False)
+        distance = max(distance, float(distances.max()))
+    return distance
+
+
+def geometry_metrics(stable, dev):
+    """
+    Summarizes how two lines deviate from each other.
+
+    :param stable: [lon, lat(, elevation)] coordinates of the stable line.
+    :type stable: numpy.ndarray
+
+    :param dev: [lon, lat(, elevation)] coordinates of the dev line.
+    :type dev: numpy.ndarray
+
+    :return: Vertex counts, maximum vertex deviation (only for equal vertex counts) and Hausdorff distance (only for
+        different vertex counts, it can't exceed the maximum vertex deviation otherwise) in degrees, maximum elevation
+        deviation (only for equal vertex counts of 3D lines) and length delta in meters.
+    :rtype: dict
+    """
+    metrics = {
+        'vertices': (len(stable), len(dev)),
+        'max_vertex_deviation': None,
+        'max_elevation_deviation': None,
+        'hausdorff': None,
+        'length_delta': line_length(dev) - line_length(stable)
+    }
+    if stable.shape == dev.shape:
+        metrics['max_vertex_deviation'] = float(np.hypot(*(stable[:, :2] - dev[:, :2]).T).max())
+        if stable.shape[1] == 3:
+            metrics['max_elevation_deviation'] = float(np.abs(stable[:, 2] - dev[:, 2]).max())
+    elif len(stable) and len(dev):
+        metrics['hausdorff'] = hausdorff_distance(stable, dev)
+
+    return metrics
+
+
+def _diff_geometry(path, stable, dev, tolerance):
+    metrics = geometry_metrics(stable, dev)
+    if stable.shape == dev.shape and metrics['max_vertex_deviation'] <= tolerance and \
+            (metrics['max_elevation_deviation'] or 0) <= tolerance:
+        return
+    text = "Vertices: {} --> {}, max vertex deviation: {}, Hausdorff: {}, length delta: {:.1f} m".format(
+        metrics['vertices'][0], metrics['vertices'][1], metrics['max_vertex_deviation'], metrics['hausdorff'],
+        metrics['length_delta'])
+    if metrics['max_elevation_deviation'] is not None:
+        text += ", max elevation deviation: {} m".format(metrics['max_elevation_deviation'])
+    yield path, text
+
+
+def _diff_array(path, stable, dev, tolerance):
+    if stable.shape != dev.shape:
+        yield path, "Shape: {} --> {}".format(stable.shape, dev.shape)
+        return
+    deviation = np.abs(stable - dev)
+    # NaN stands for null, e.g. unroutable matrix cells
+    differs = ~((deviation <= tolerance) | (np.isnan(stable) & np.isnan(dev)))
+    if not differs.any():
+        return
+    deviation = np.where(np.isnan(deviation), np.inf, deviation)
+    idx = np.unravel_index(np.argmax(np.where(differs, deviation, -1)), deviation.shape)
+    yield path, "{} of {} values differ, max deviation at {}: Stable: {} Dev: {}".format(
+        int(differs.sum()), differs.size, list(map(int, idx)), stable[idx], dev[idx])
+
+
+def compare(stable, dev, tolerance=0.0001, is3d=False, path=()):
+    """
+    Compares two response subtrees. Numeric arrays are compared vectorized within tolerance and reported as one
+    summary row each, coordinate arrays by geometry metrics (see geometry_metrics()). Encoded polylines are decoded
+    first. Only scalar subtrees are compared with dictdiffer.
+
+    :param stable: Subtree of the stable server's response.
+    :param dev: The same subtree of the dev server's response.
+
+    :param tolerance: Absolute tolerance for numbers, in degrees for coordinates.
+    :type tolerance: float
+
+    :param is3d: Whether encoded polylines contain elevation.
+    :type is3d: bool
+
+    :param path: Path of the subtrees within the response.
+    :type path: tuple
+
+    :return: Generator of (path, change text) per difference.
+    """
+    if isinstance(stable, str) and isinstance(dev, str) and path and path[-1] == 'geometry' and stable != dev:
+        stable = convert.decode_polyline(stable, is3d)['coordinates']
+        dev = convert.decode_polyline(dev, is3d)['coordinates']
+
+    if isinstance(stable, dict) and isinstance(dev, dict):
+        for key in stable:
+            if key not in dev:
+                yield _path_text(path + (key,)), "remove --> {}: {}".format(key, stable[key])
+            else:
+                for row in compare(stable[key], dev[key], tolerance, is3d, path + (key,)):
+                    yield row
+        for key in dev:
+            if key not in stable:
+                yield _path_text(path + (key,)), "add --> {}: {}".format(key, dev[key])
+        return
+
+    stable_array, dev_array = _as_array(stable), _as_array(dev)
+    if stable_array is not None and dev_array is not None:
+        is_geometry = 'coordinates' in path or 'geometry' in path
+        if is_geometry and stable_array.ndim == dev_array.ndim == 2 and stable_array.shape[1] in (2, 3):
+            rows = _diff_geometry(_path_text(path), stable_array, dev_array, tolerance)
+        else:
+            rows = _diff_array(_path_text(path), stable_array, dev_array, tolerance)
+        for row in rows:
+            yield row
+        return
+
+    if isinstance(stable, list) and isinstance(dev, list) and len(stable) == len(dev):
+        for idx, (s, d) in enumerate(zip(stable, dev)):
+            for row in compare(s, d, tolerance, is3d, path + (idx,)):
+                yield row
+        return
+
+    for changeset, node, changes in dictdiffer.diff(stable, dev, tolerance=tolerance, expand=True):
+        # dictdiffer reports the node as dotted string or as list
+        if isinstance(node, str):
+            node = node.split('.') if node else []
+        node_path = _path_text(path + tuple(node))
+        if changeset in ('remove', 'add'):
+            for change in changes:
+                yield node_path, "{} --> {}: {}".format(changeset, *change)
+        elif changeset == 'change':
+            yield node_path, "Stable: {}\n\nDev: {}".format(*changes)
+
+
+def relative_deviation(stable, dev):
+    """
+    :return: |dev - stable| relative to |stable|, element-wise for arrays. Infinite if only stable is 0.
+    """
+    stable, dev = np.asarray(stable, dtype=float), np.asarray(dev, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        deviation = np.abs(dev - stable) / np.abs(stable)
+    return np.where(stable == dev, 0, deviation)
+
+
+def _routes(resp, is3d):
+    """Yields summary and coordinates of every route in a directions response, json or geojson."""
+    if 'features' in resp:
+        for feature in resp['features']:
+            yield feature['properties'].get('summary', {}), np.asarray(feature['geometry']['coordinates'], dtype=float)
+        return
+    for route in resp.get('routes', []):
+        geometry = route.get('geometry')
+        if isinstance(geometry, str):
+            geometry = convert.decode_polyline(geometry, is3d)
+        coordinates = geometry['coordinates'] if isinstance(geometry, dict) else (geometry or [])
+        yield route.get('summary', {}), np.asarray(coordinates, dtype=float)
+
+
+def _diff_summary(path, stable, dev, tolerances):
+    for key, tolerance in tolerances.items():
+        if key not in stable or key not in dev:
+            if key in stable or key in dev:
+                yield "{}.{}".format(path, key), "Stable: {}\n\nDev: {}".format(stable.get(key), dev.get(key))
+            continue
+        deviation = float(relative_deviation(stable[key], dev[key]))
+        if deviation > tolerance:
+            yield "{}.{}".format(path, key), "Stable: {}\n\nDev: {}\n\nDeviation: {:.2%}".format(stable[key],
+                                                                                             dev[key],
+                                                                                             deviation)
+
+
+def _diff_line(path, stable, dev, thresholds):
+    if len(stable) < 2 or len(dev) < 2:
+        if len(stable) != len(dev):
+            yield path, "Vertices: {} --> {}".format(len(stable), len(dev))
+        return
+    stable, dev = LineString(stable[:, :2]), LineString(dev[:, :2])
+
+    if 'overlap' in thresholds:
+        # the share of each line within the buffer of the other one
+        buffer = thresholds.get('buffer', 0.0005)
+        overlap = min(dev.intersection(stable.buffer(buffer)).length / dev.length if dev.length else 1,
+                      stable.intersection(dev.buffer(buffer)).length / stable.length if stable.length else 1)
+        if overlap < thresholds['overlap']:
+            yield path, "Overlap within {} degrees: {:.2%}".format(buffer, overlap)
+
+    if 'frechet' in thresholds:
+        frechet = stable.frechet_distance(dev)
+        if frechet > thresholds['frechet']:
+            yield path, "Frechet distance: {}".format(frechet)
+
+
+def semantic_compare(endpoint, stable, dev, thresholds, is3d=False):
+    """
+    Compares two responses by meaning instead of by value: summaries within relative tolerances, route geometries by
+    buffered overlap or Frechet distance, isochrones by overlapping area, matrix values within relative tolerances.
+    Only differences crossing the thresholds are reported.
+
+    :param endpoint: One of 'directions', 'isochrones', 'matrix'.
+    :type endpoint: str
+
+    :param stable: The stable server's response.
+    :type stable: dict
+
+    :param dev: The dev server's response.
+    :type dev: dict
+
+    :param thresholds: The endpoint's 'semantic' method of the template, e.g. {'summary': {'distance': 0.01},
+        'geometry': {'buffer': 0.0005, 'overlap': 0.95}} for directions or {'durations': 0.05} for matrix.
+    :type thresholds: dict
+
+    :param is3d: Whether encoded polylines contain elevation.
+    :type is3d: bool
+
+    :return: Generator of (path, change text) per difference.
+    """
+    if endpoint == 'directions':
+        stable_routes, dev_routes = list(_routes(stable, is3d)), list(_routes(dev, is3d))
+        if len(stable_routes) != len(dev_routes):
+            yield 'routes', "Routes: {} --> {}".format(len(stable_routes), len(dev_routes))
+        for idx, ((stable_summary, stable_line), (dev_summary, dev_line)) in enumerate(zip(stable_routes, dev_routes)):
+            path = 'routes.{}'.format(idx)
+            for row in _diff_summary(path + '.summary', stable_summary, dev_summary, thresholds.get('summary', {})):
+                yield row
+            for row in _diff_line(path + '.geometry', stable_line, dev_line, thresholds.get('geometry', {})):
+                yield row
+
+    elif endpoint == 'isochrones':
+        stable_features, dev_features = stable.get('features', []), dev.get('features', [])
+        if len(stable_features) != len(dev_features):
+            yield 'features', "Isochrones: {} --> {}".format(len(stable_features), len(dev_features))
+        for idx, (stable_feature, dev_feature) in enumerate(zip(stable_features, dev_features)):
+            path = 'features.{}'.format(idx)
+            for row in _diff_summary(path + '.properties', stable_feature['properties'], dev_feature['properties'],
+                                     thresholds.get('properties', {})):
+                yield row
+            if 'overlap' in thresholds.get('geometry', {}):
+                stable_polygon, dev_polygon = shape(stable_feature['geometry']), shape(dev_feature['geometry'])
+                union = stable_polygon.union(dev_polygon).area
+                overlap = stable_polygon.intersection(dev_polygon).area / union if union else 1
+                if overlap < thresholds['geometry']['overlap']:
+                    yield path + '.geometry', "Overlap (intersection over union): {:.2%}".format(overlap)
+
+    elif endpoint == 'matrix':
+        for key, tolerance in thresholds.items():
+            if key not in stable or key not in dev:
+                continue
+            stable_array, dev_array = _as_array(stable[key]), _as_array(dev[key])
+            if stable_array is None or dev_array is None or stable_array.shape != dev_array.shape:
+                yield key, "Shape: {} --> {}".format(np.shape(stable[key]), np.shape(dev[key]))
+                continue
+            deviation = relative_deviation(stable_array, dev_array)
+            # NaN stands for null, e.g. unroutable matrix cells
+            differs = ~((deviation <= tolerance) | (np.isnan(stable_array) & np.isnan(dev_array)))
+            if differs.any():
+                idx = np.unravel_index(np.argmax(np.where(differs, np.nan_to_num(deviation, nan=np.inf), -1)),
+                                       deviation.shape)
+                yield key, "{} of {} values deviate more than {:.2%}, max at {}: Stable: {} Dev: {}".format(
+                    int(differs.sum()), differs.size, tolerance, list(map(int, idx)), stable_array[idx],
+                    dev_array[idx])
+    else:
+        raise ValueError("{} not a valid endpoint".format(endpoint))
+
+
+def lookup(resp, keys):
+    """
+    Looks up dot separated keys in a response, e.g. routes.0.summary. Missing keys are left out, so keys for json and
+    geojson responses can be listed together.
+
+    :param resp: The response.
+    :type resp: dict
+
+    :param keys: The keys to look up.
+    :type keys: list of str
+
+    :return: The values per key.
+    :rtype: dict
+    """
+    values = dict()
+    for key in keys:
+        try:
+            values[key] = dictdiffer.dot_lookup(resp, key)
+        except (KeyError, IndexError):
+            continue
+    return values
+
+
+def compare_responses(endpoint, methods, method, responses, is3d=False):
+    """
+    Compares the responses of the stable and the dev server to one request with one of the template's methods.
+
+    :param endpoint: One of 'directions', 'isochrones', 'matrix'.
+    :type endpoint: str
+
+    :param methods: The endpoint's 'methods' section of the template.
+    :type methods: dict
+
+    :param method: One of 'differ', i.e. compare() of the lookup keys, or 'semantic', i.e. semantic_compare().
+    :type method: str
+
+    :param responses: The stable and the dev server's response.
+    :type responses: list
+
+    :param is3d: Whether encoded polylines contain elevation.
+    :type is3d: bool
+
+    :return: Generator of (path, change text) per difference.
+    """
+    if method == 'differ':
+        stable, dev = [lookup(resp, methods['differ']) for resp in responses]
+        if stable.keys() != dev.keys():
+            raise KeyError("Responses differ in lookup keys: {} vs. {}".format(list(stable), list(dev)))
+        for key in stable:
+            for row in compare(stable[key], dev[key], tolerance=0.0001, is3d=is3d, path=tuple(key.split('.'))):
+                yield row
+    elif method == 'semantic':
+        for row in semantic_compare(endpoint, responses[0], responses[1], methods['semantic'], is3d=is3d):
+            yield row
+    else:
+        raise ValueError("{} is not a valid method.".format(method))
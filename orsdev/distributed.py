@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from collections import Counter, deque
+import logging
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+from orsdev import diff
+from orsdev.client import AsyncClient
+from orsdev.corpus import RequestCorpus
+from orsdev.loadgen import OpenLoopRunner, constant_schedule
+from orsdev.retry import RetryPolicy
+from orsdev.stats import Histogram, ComplexityStats
+
+logger = logging.getLogger(__name__)
+
+# Hosts which only accept connections from the same machine, a coordinator listening beyond needs an explicit authkey
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+
+def _load_shard(task, corpus):
+    """Runs a shard of the corpus against one server on a fixed schedule, see OpenLoopRunner."""
+    requests = [corpus[idx] for idx in range(*task['shard'])]
+    client = AsyncClient(task['base_url'], key=task.get('key'), pool_size=task.get('pool_size', 1000))
+    runner = OpenLoopRunner(client, corpus.endpoint, requests,
+                            constant_schedule(task['rps'], len(requests) / task['rps']))
+    result = runner.run()
+
+    histograms = {'latency': Histogram(), 'uncorrected_latency': Histogram()}
+    ok = np.array([error is None for error in result.errors], dtype=bool)
+    for name, corrected in (('latency', True), ('uncorrected_latency', False)):
+        for latency in 1000 * result.latencies(corrected)[ok]:
+            histograms[name].record(float(latency))
+
+    return {'requests': len(requests),
+            'errors': Counter(error for error in result.errors if error is not None),
+            'max_send_lag': float(1000 * (result.sent - result.intended).max()) if len(requests) else 0,
+            'histograms': {name: h.snapshot() for name, h in histograms.items()},
+            'complexity': result.complexity().snapshot()}
+
+
+async def _diff_shard_async(task, corpus):
+    stable = AsyncClient(task['stable'], key=task.get('key'))
+    dev = AsyncClient(task['dev'], key=task.get('key'))
+    semaphore = asyncio.Semaphore(task.get('concurrency', 4))
+    # budgets and attempts count per shard
+    policy = RetryPolicy.from_config(task['error_handler']) if task.get('error_handler') else None
+    rows, errors = [], Counter() if policy is None else policy.errors
+
+    async def cycle(idx):
+        params = corpus[idx]
+        attempt = 0
+        while True:
+            async with semaphore:
+                try:
+                    responses = await asyncio.gather(stable.request(corpus.endpoint, params),
+                                                     dev.request(corpus.endpoint, params))
+                    rows.extend((idx, path, change) for path, change in
+                                diff.compare_responses(corpus.endpoint, task['methods'], task['method'], responses,
+                                                       is3d=bool(params.get('elevation'))))
+                    return
+                except Exception as e:
+                    if policy is None:
+                        errors[e.__class__.__name__] += 1
+                        return
+                    # raises if the error_handler says so, which fails the shard
+                    delay = policy.handle(e, attempt)
+                    if policy.should_log(e):
+                        logger.error("Request {} threw a {}: {}".format(idx, e.__class__.__name__, e))
+            # a corpus has no new parameters to draw, the same request is retried
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    cycles = [asyncio.ensure_future(cycle(idx)) for idx in range(*task['shard'])]
+    try:
+        await asyncio.gather(*cycles)
+    finally:
+        for future in cycles:
+            future.cancel()
+        await asyncio.gather(*cycles, return_exceptions=True)
+        await stable.close()
+        await dev.close()
+
+    return {'requests': task['shard'][1] - task['shard'][0], 'errors': errors, 'rows': rows}
+
+
+def _diff_shard(task, corpus):
+    """Compares the responses of the stable and the dev server to a shard of the corpus."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(_diff_shard_async(task, corpus))
+    finally:
+        loop.close()
+
+
+def run_worker(address, authkey):
+    """
+    Connects to a coordinator and works off the shards it hands out until it says stop. Start one per core, on as many
+    hosts as needed, e.g. with ORSDEV_AUTHKEY=<authkey> python -m orsdev.distributed <host>:<port>. The corpus has to
+    be available under the same path on every host.
+
+    :param address: The coordinator's (host, port).
+    :type address: tuple
+
+    :param authkey: The coordinator's shared secret.
+    :type authkey: bytes
+    """
+    corpora = dict()
+    with Client(tuple(address), authkey=authkey) as conn:
+        while True:
+            task = conn.recv()
+            if task is None:
+                break
+            if task['corpus'] not in corpora:
+                corpora[task['corpus']] = RequestCorpus(task['corpus'])
+            corpus = corpora[task['corpus']]
+            try:
+                if task['kind'] == 'load':
+                    result = _load_shard(task, corpus)
+                else:
+                    result = _diff_shard(task, corpus)
+            except Exception as e:
+                result = {'failed': repr(e)}
+            conn.send(result)
+
+    for corpus in corpora.values():
+        corpus.close()
+
+
+class Coordinator(object):
+
+    def __init__(self,
+                 corpus,
+                 workers=0,
+                 address=('localhost', 0),
+                 authkey=None,
+                 shard_size=1000,
+                 timeout=60):
+        """
+        Splits a request corpus (see orsdev.corpus.write_corpus()) into shards and hands them to workers connecting over
+        a local socket (see run_worker()), then merges their results. Workers fetch the next shard when done, so faster
+        workers take more shards, and shards of lost workers are handed out again. Workers stay connected for further
+        runs until the coordinator is closed.
+
+        Use as context manager or call close() when done.
+
+        :param corpus: Path of the corpus file. Needs to be the same path for all workers.
+        :type corpus: str
+
+        :param workers: Amount of local worker processes to start. More can connect from other hosts at any time.
+        :type workers: int
+
+        :param address: (host, port) to listen on. Port 0 picks a free one, see self.address.
+        :type address: tuple
+
+        :param authkey: Shared secret of coordinator and workers, see self.authkey. Messages are pickled, so only
+            listen on trusted networks. Random if None, which only works for local workers, so listening on another
+            host than localhost needs one.
+        :type authkey: bytes
+
+        :param shard_size: Amount of requests per shard.
+        :type shard_size: int
+
+        :param timeout: Seconds to wait for a worker while none is connected, e.g. before the first one connects or
+            after all were lost. The remaining shards fail then.
+        :type timeout: float
+        """
+        if authkey is None:
+            if address[0] not in LOCAL_HOSTS:
+                raise ValueError("Listening on {} needs an explicit authkey.".format(address[0]))
+            authkey = os.urandom(32)
+        self.authkey = authkey
+        self.corpus = corpus
+        self.workers = workers
+        self.shard_size = shard_size
+        self.timeout = timeout
+
+        requests = RequestCorpus(corpus)
+        self._n = len(requests)
+        self.endpoint = requests.endpoint
+        requests.close()
+
+        self._listener = Listener(tuple(address), authkey=authkey)
+        self.address = self._listener.address
+        self._processes = [multiprocessing.Process(target=run_worker, args=(self.address, authkey), daemon=True)
+                           for _ in range(workers)]
+        for process in self._processes:
+            process.start()
+
+        # connections of workers waiting for a task
+        self._idle = queue.Queue()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _accept(self):
+        while True:
+            try:
+                self._idle.put(self._listener.accept())
+            except multiprocessing.AuthenticationError:
+                logger.warning("Refused a worker with another authkey.")
+            except OSError:
+                # listener closed
+                return
+
+    def close(self):
+        """Stops all idle workers and the local worker processes."""
+        self._listener.close()
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            conn.close()
+        for process in self._processes:
+            process.join()
+
+    def load(self, base_url, rps, workers=None, key=None, pool_size=1000):
+        """
+        Runs the corpus against a server on an open-loop schedule, see orsdev.loadgen.OpenLoopRunner.
+
+        :param base_url: URL of the ORS instance.
+        :type base_url: str
+
+        :param rps: Requests per second in total.
+        :type rps: float
+
+        :param workers: Amount of workers to split the rate across, i.e. each sends rps / workers. Defaults to the
+            amount of local workers.
+        :type workers: int
+
+        :param key: API key, only needed for the ORS API.
+        :type key: str
+
+        :param pool_size: Maximum amount of open connections per worker.
+        :type pool_size: int
+
+        :return: Amount of requests, errors per exception class, failed shards, maximum send lag in ms, latency
+            percentiles in ms (corrected and uncorrected) and the latency by problem size, see
+            orsdev.stats.ComplexityStats.
+        :rtype: dict
+        """
+        task = {'kind': 'load',
+                'base_url': base_url,
+                'key': key,
+                'rps': rps / (workers or self.workers or 1),
+                'pool_size': pool_size}
+        results, failed = self._run(task)
+
+        histograms = {'latency': Histogram(), 'uncorrected_latency': Histogram()}
+        complexity = ComplexityStats()
+        for result in results:
+            for name, h in histograms.items():
+                h.merge(result['histograms'][name])
+            complexity.merge(result['complexity'])
+
+        report = self._merge_counts(results, failed)
+        report['max_send_lag'] = max([result['max_send_lag'] for result in results] or [0])
+        for name, h in histograms.items():
+            prefix = '' if name == 'latency' else 'uncorrected_'
+            for p in (50, 90, 99, 99.9):
+                report['{}p{}'.format(prefix, p)] = h.percentile(p)
+        report['complexity'] = complexity.report()
+        report['scaling'] = complexity.fit()
+
+        return report
+
+    def dev_test(self, stable, dev, methods, method='differ', key=None, concurrency=4, error_handler=None):
+        """
+        Compares the responses of the stable and the dev server to the corpus, see orsdev.diff.compare_responses().
+
+        :param stable: URL of the stable server.
+        :type stable: str
+
+        :param dev: URL of the dev server.
+        :type dev: str
+
+        :param methods: The endpoint's 'methods' section of the template.
+        :type methods: dict
+
+        :param method: One of 'differ', 'semantic'.
+        :type method: str
+
+        :param key: API key, only needed for the ORS API.
+        :type key: str
+
+        :param concurrency: How many requests are in flight per server and worker.
+        :type concurrency: int
+
+        :param error_handler: The template's error_handler section. Failed requests are retried following its rules,
+            see orsdev.retry.RetryPolicy, with its attempts and budgets counted per shard. Failed requests are only
+            counted if None.
+        :type error_handler: dict
+
+        :return: Amount of requests, errors per exception class, failed shards and the (corpus index, path, change
+            text) rows of all differences, ordered by corpus index.
+        :rtype: dict
+        """
+        task = {'kind': 'dev_test',
+                'stable': stable,
+                'dev': dev,
+                'key': key,
+                'methods': methods,
+                'method': method,
+                'concurrency': concurrency,
+                'error_handler': error_handler}
+        results, failed = self._run(task)
+
+        report = self._merge_counts(results, failed)
+        report['rows'] = sorted((row for result in results for row in result['rows']), key=lambda row: row[0])
+        return report
+
+    @staticmethod
+    def _merge_counts(results, failed):
+        errors = Counter()
+        for result in results:
+            errors.update(result['errors'])
+        return {'requests': sum(result['requests'] for result in results),
+                'errors': dict(errors),
+                'failed_shards': failed}
+
+    def _run(self, task):
+        """
+        Hands out the shards with the task's settings to the workers until all are done.
+
+        :return: The results of the shards and the shards which failed.
+        :rtype: tuple of (list, list)
+        """
+        task = dict(task, corpus=self.corpus)
+        shards = deque((start, min(start + self.shard_size, self._n)) for start in range(0, self._n, self.shard_size))
+        n_shards = len(shards)
+        results, failed, finished = [], [], []
+        # guards the shards and results, notified when a shard is handed back or all are done
+        cond = threading.Condition()
+        done = threading.Event()
+        if not n_shards:
+            done.set()
+
+        def serve(conn):
+            while True:
+                with cond:
+                    # a worker without a shard waits until all are done, a lost worker's shard may come back
+                    while not shards and not done.is_set():
+                        cond.wait()
+                    if done.is_set():
+                        break
+                    shard = shards.popleft()
+                try:
+                    conn.send(dict(task, shard=shard))
+                    result = conn.recv()
+                except (EOFError, OSError):
+                    logger.warning("Lost a worker, handing out shard {} again.".format(shard))
+                    conn.close()
+                    with cond:
+                        shards.append(shard)
+                        cond.notify()
+                    return
+                with cond:
+                    if 'failed' in result:
+                        logger.error("Shard {} failed: {}".format(shard, result['failed']))
+                        failed.append(shard)
+                    else:
+                        results.append(result)
+                    if len(results) + len(failed) == n_shards:
+                        done.set()
+                        cond.notify_all()
+            with cond:
+                finished.append(conn)
+
+        threads = []
+        waiting_since = time.monotonic()
+        while not done.is_set():
+            try:
+                conn = self._idle.get(timeout=0.1)
+            except queue.Empty:
+                if any(thread.is_alive() for thread in threads):
+                    waiting_since = time.monotonic()
+                elif time.monotonic() - waiting_since > self.timeout:
+                    with cond:
+                        logger.error("No worker connected for {} s, giving up {} shards.".format(self.timeout,
+                                                                                                 len(shards)))
+                        failed.extend(shards)
+                        shards.clear()
+                        done.set()
+                        cond.notify_all()
+                continue
+            threads.append(threading.Thread(target=serve, args=(conn,), daemon=True))
+            threads[-1].start()
+        for thread in threads:
+            thread.join()
+        # workers which connected in the meantime are still idle
+        for conn in finished:
+            self._idle.put(conn)
+
+        return results, failed
+
+
+if __name__ == '__main__':
+    if 'ORSDEV_AUTHKEY' not in os.environ:
+        sys.exit("Set ORSDEV_AUTHKEY to the coordinator's authkey.")
+    host, port = sys.argv[1].rsplit(':', 1)
+    run_worker((host, int(port)), os.environ['ORSDEV_AUTHKEY'].encode('utf-8'))
@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import math
+import multiprocessing
+
+from aiohttp import web
+import numpy as np
+
+from orsdev.diff import EARTH_RADIUS
+from orsdev.stats import request_complexity
+
+# Crow-flight distances are stretched by this factor to look like road distances
+DETOUR_FACTOR = 1.3
+
+# Meters per second by profile prefix
+SPEEDS = {'driving': 13.9, 'cycling': 4.2, 'foot': 1.4, 'wheelchair': 1.0}
+
+# Meters per returned route vertex, so geometries grow with the route's length like real ones
+VERTEX_SPACING = 50
+
+UNITS = {'m': 1, 'km': 1000, 'mi': 1609.344}
+
+
+def encode_polyline(coordinates, is3d=False):
+    """
+    Encodes [lon, lat(, elevation)] coordinates the way ORS does, i.e. the inverse of
+    openrouteservice.convert.decode_polyline().
+
+    :param coordinates: [lon, lat(, elevation)] coordinates of a line.
+    :type coordinates: numpy.ndarray
+
+    :param is3d: Whether to encode the elevation.
+    :type is3d: bool
+
+    :rtype: str
+    """
+    # lat, lon in 1e-5 degrees, elevation in cm
+    values = np.round(np.asarray(coordinates)[:, [1, 0, 2] if is3d else [1, 0]] * ([1e5, 1e5, 1e2] if is3d else 1e5))
+    deltas = np.diff(values.astype(np.int64), axis=0, prepend=0).ravel()
+
+    chunks = []
+    for value in deltas.tolist():
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def _distances(a, b):
+    """Haversine distances in meters between all pairs of [lon, lat] coordinates of a and b."""
+    a, b = np.radians(np.asarray(a, dtype=float)[:, :2]), np.radians(np.asarray(b, dtype=float)[:, :2])
+    dlon = b[None, :, 0] - a[:, None, 0]
+    dlat = b[None, :, 1] - a[:, None, 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(a[:, None, 1]) * np.cos(b[None, :, 1]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+def _speed(profile):
+    return SPEEDS.get((profile or 'driving').split('-')[0], SPEEDS['driving'])
+
+
+def _bbox(coordinates):
+    return coordinates.min(axis=0).tolist() + coordinates.max(axis=0).tolist()
+
+
+def _route(coordinates, profile, elevation=False):
+    """
+    Interpolates a route through the waypoints with a vertex every VERTEX_SPACING meters.
+
+    :return: The route's coordinates, the waypoint indices in it and distance and duration per leg.
+    :rtype: tuple of (numpy.ndarray, list, list of tuple)
+    """
+    coordinates = np.asarray(coordinates, dtype=float)[:, :2]
+    lines, way_points, legs = [coordinates[:1]], [0], []
+    for start, end in zip(coordinates[:-1], coordinates[1:]):
+        distance = DETOUR_FACTOR * float(_distances([start], [end])[0, 0])
+        steps = max(int(distance / VERTEX_SPACING), 1)
+        lines.append(start + np.linspace(0, 1, steps + 1)[1:, None] * (end - start))
+        way_points.append(way_points[-1] + steps)
+        legs.append((distance, distance / _speed(profile)))
+
+    line = np.round(np.concatenate(lines), 5)
+    if elevation:
+        # gently rolling terrain, the same for the same coordinates
+        line = np.column_stack((line, np.round(200 + 50 * np.sin(line[:, 0] * 100) * np.cos(line[:, 1] * 100), 1)))
+    return line, way_points, legs
+
+
+def _extras(extra_info, n, distance):
+    return {name: {'values': [[0, n - 1, 0]], 'summary': [{'value': 0, 'distance': distance, 'amount': 100}]}
+            for name in extra_info or []}
+
+
+def directions_response(params, fmt='json'):
+    """
+    Builds a response shaped like the ORS directions response to the request, deterministic in the request.
+
+    :param params: The request body with the profile.
+    :type params: dict
+
+    :param fmt: One of 'json', 'geojson', 'gpx'.
+    :type fmt: str
+
+    :return: The response, as text for gpx.
+    :rtype: dict or str
+    """
+    elevation = bool(params.get('elevation'))
+    line, way_points, legs = _route(params['coordinates'], params.get('profile'), elevation)
+    unit = UNITS.get(params.get('units', 'm'), 1)
+
+    segments = []
+    for idx, (distance, duration) in enumerate(legs):
+        segment = {'distance': round(distance / unit, 2), 'duration': round(duration, 1)}
+        if params.get('instructions', True):
+            segment['steps'] = [{'distance': segment['distance'], 'duration': segment['duration'], 'type': 11,
+                                 'instruction': 'Head on', 'name': '-',
+                                 'way_points': [way_points[idx], way_points[idx + 1]]},
+                                {'distance': 0.0, 'duration': 0.0, 'type': 10, 'instruction': 'Arrive',
+                                 'name': '-', 'way_points': [way_points[idx + 1], way_points[idx + 1]]}]
+        segments.append(segment)
+    summary = {'distance': round(sum(leg[0] for leg in legs) / unit, 2),
+               'duration': round(sum(leg[1] for leg in legs), 1)}
+
+    if fmt == 'gpx':
+        points = ''.join('<rtept lat="{}" lon="{}"/>'.format(lat, lon) for lon, lat in line[:, :2].tolist())
+        return '<?xml version="1.0" encoding="UTF-8"?><gpx version="1.1" creator="orsdev"><rte>{}</rte></gpx>'.format(
+            points)
+
+    properties = {'summary': summary, 'segments': segments, 'way_points': [way_points[0], way_points[-1]]}
+    if params.get('extra_info'):
+        properties['extras'] = _extras(params['extra_info'], len(line), summary['distance'])
+    metadata = {'query': params, 'engine': {'version': 'fake'}}
+
+    if fmt == 'geojson':
+        return {'type': 'FeatureCollection',
+                'bbox': _bbox(line),
+                'features': [{'type': 'Feature', 'bbox': _bbox(line), 'properties': properties,
+                              'geometry': {'type': 'LineString', 'coordinates': line.tolist()}}],
+                'metadata': metadata}
+
+    route = dict(properties, bbox=_bbox(line))
+    if params.get('geometry', True):
+        route['geometry'] = encode_polyline(line, elevation)
+    return {'routes': [route], 'bbox': _bbox(line), 'metadata': metadata}
+
+
+def isochrones_response(params):
+    """
+    Builds a response shaped like the ORS isochrones response to the request: a circle per location and range, with
+    more vertices for larger ranges. Deterministic in the request.
+
+    :param params: The request body with the profile.
+    :type params: dict
+
+    :rtype: dict
+    """
+    speed = _speed(params.get('profile'))
+    features = []
+    for group_index, (lon, lat) in enumerate(np.asarray(params['locations'], dtype=float)[:, :2].tolist()):
+        for value in sorted(params['range']):
+            # time ranges at a fraction of the speed, roads don't lead straight out
+            radius = value if params.get('range_type') == 'distance' else 0.5 * value * speed
+            n = 16 + int(radius / 100)
+            angles = np.linspace(0, 2 * np.pi, n + 1)
+            ring = np.column_stack((lon + np.degrees(radius / EARTH_RADIUS) * np.cos(angles) /
+                                    math.cos(math.radians(lat)),
+                                    lat + np.degrees(radius / EARTH_RADIUS) * np.sin(angles)))
+            ring = np.round(ring, 6)
+            ring[-1] = ring[0]
+            properties = {'group_index': group_index, 'value': value, 'center': [lon, lat]}
+            if 'area' in (params.get('attributes') or []):
+                properties['area'] = round(math.pi * radius ** 2, 2)
+            if 'reachfactor' in (params.get('attributes') or []):
+                properties['reachfactor'] = 0.5
+            features.append({'type': 'Feature', 'properties': properties,
+                             'geometry': {'type': 'Polygon', 'coordinates': [ring.tolist()]}})
+
+    return {'type': 'FeatureCollection', 'features': features, 'metadata': {'query': params,
+                                                                            'engine': {'version': 'fake'}}}
+
+
+def matrix_response(params):
+    """
+    Builds a response shaped like the ORS matrix response to the request, with a sources x destinations array per
+    metric. Deterministic in the request.
+
+    :param params: The request body with the profile.
+    :type params: dict
+
+    :rtype: dict
+    """
+    locations = np.asarray(params['locations'], dtype=float)
+    sources = params.get('sources') or 'all'
+    destinations = params.get('destinations') or 'all'
+    sources = locations if sources == 'all' else locations[[int(idx) for idx in sources]]
+    destinations = locations if destinations == 'all' else locations[[int(idx) for idx in destinations]]
+
+    distances = DETOUR_FACTOR * _distances(sources, destinations)
+    response = {'sources': [{'location': location, 'snapped_distance': 0.0} for location in sources.tolist()],
+                'destinations': [{'location': location, 'snapped_distance': 0.0}
+                                 for location in destinations.tolist()],
+                'metadata': {'query': params, 'engine': {'version': 'fake'}}}
+    metrics = params.get('metrics') or ['duration']
+    if 'duration' in metrics:
+        response['durations'] = np.round(distances / _speed(params.get('profile')), 2).tolist()
+    if 'distance' in metrics:
+        response['distances'] = np.round(distances / UNITS.get(params.get('units', 'm'), 1), 2).tolist()
+    return response
+
+
+def optimization_response(params):
+    """
+    Builds a response shaped like the ORS (VROOM) optimization response to the request, with the jobs assigned to the
+    vehicles in turn. Deterministic in the request.
+
+    :param params: The request body.
+    :type params: dict
+
+    :rtype: dict
+    """
+    vehicles = params.get('vehicles') or []
+    assigned = [[] for _ in vehicles]
+    for idx, job in enumerate(params.get('jobs') or []):
+        if vehicles:
+            assigned[idx % len(vehicles)].append(job)
+
+    routes = []
+    for vehicle, jobs in zip(vehicles, assigned):
+        stops = [vehicle.get('start')] + [job['location'] for job in jobs] + [vehicle.get('end')]
+        stops = [stop for stop in stops if stop is not None]
+        legs = DETOUR_FACTOR * np.diagonal(_distances(stops[:-1], stops[1:])) if len(stops) > 1 else np.zeros(0)
+        duration = int(legs.sum() / _speed(vehicle.get('profile')))
+        steps = [{'type': 'start', 'location': vehicle['start']}] if vehicle.get('start') else []
+        steps += [{'type': 'job', 'job': job['id'], 'location': job['location'], 'service': job.get('service', 0)}
+                  for job in jobs]
+        if vehicle.get('end'):
+            steps.append({'type': 'end', 'location': vehicle['end']})
+        routes.append({'vehicle': vehicle['id'], 'cost': duration, 'service': sum(step.get('service', 0)
+                                                                                  for step in steps),
+                       'duration': duration, 'distance': int(legs.sum()), 'steps': steps})
+
+    unassigned = [{'id': job['id'], 'location': job['location']} for job in params.get('jobs') or []] \
+        if not vehicles else []
+    return {'code': 0,
+            'summary': {'cost': sum(route['cost'] for route in routes),
+                        'routes': len(routes),
+                        'unassigned': len(unassigned),
+                        'duration': sum(route['duration'] for route in routes),
+                        'distance': sum(route['distance'] for route in routes)},
+            'unassigned': unassigned,
+            'routes': routes}
+
+
+class LatencyModel(object):
+
+    def __init__(self,
+                 median=20,
+                 sigma=0.5,
+                 per_size=0.0,
+                 exponent=1.0,
+                 seed=None):
+        """
+        Response times in ms as a lognormal base latency plus a cost growing with the problem size (see
+        orsdev.stats.request_complexity()), i.e. median * exp(sigma * N(0, 1)) + per_size * size ** exponent.
+
+        :param median: Median base latency in ms.
+        :type median: float
+
+        :param sigma: Spread of the base latency, 0 for a constant one.
+        :type sigma: float
+
+        :param per_size: Milliseconds per unit of problem size.
+        :type per_size: float
+
+        :param exponent: How the cost scales with the problem size, e.g. 2 for quadratic.
+        :type exponent: float
+
+        :param seed: Seed for reproducible latencies. Random if None.
+        :type seed: int or numpy.random.SeedSequence
+        """
+        self.median = median
+        self.sigma = sigma
+        self.per_size = per_size
+        self.exponent = exponent
+        self.rng = np.random.default_rng(seed)
+
+    def sample(self, size=1):
+        """
+        :param size: The problem size of the request.
+        :type size: int
+
+        :return: Latency in seconds.
+        :rtype: float
+        """
+        ms = self.median * math.exp(self.sigma * self.rng.standard_normal()) if self.sigma else self.median
+        return (ms + self.per_size * size ** self.exponent) / 1000
+
+
+class FakeServer(object):
+
+    def __init__(self,
+                 latency=None,
+                 error_rate=0.0,
+                 server_error_rate=0.0,
+                 max_concurrency=None,
+                 max_queue=None,
+                 seed=None):
+        """
+        Local stand-in for an ORS instance, serving the directions, isochrones, matrix and optimization endpoints
+        under the same paths. Responses are shaped like real ones and sized from the request (see
+        directions_response() etc.), so harness overhead, client parsing and diffing can be benchmarked without a
+        routing graph, and load test plans can be checked against known latencies.
+
+        Run with serve() or orsdev fake-server, or add self.app() to a running aiohttp application.
+
+        :param latency: Response time model. No latency if None.
+        :type latency: LatencyModel
+
+        :param error_rate: Share of requests answered with a 400, like invalid requests.
+        :type error_rate: float
+
+        :param server_error_rate: Share of requests answered with a 500.
+        :type server_error_rate: float
+
+        :param max_concurrency: How many requests are processed at once, like the worker threads of ORS. Further
+            requests wait. No limit if None.
+        :type max_concurrency: int
+
+        :param max_queue: How many requests may wait for processing, further ones are answered with a 503. No limit if
+            None.
+        :type max_queue: int
+
+        :param seed: Seed for reproducible errors. Random if None.
+        :type seed: int or numpy.random.SeedSequence
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.rng = np.random.default_rng(seed)
+
+        self.requests = 0
+        self.waiting = 0
+        self._semaphore = None
+
+    def app(self):
+        """
+        :rtype: aiohttp.web.Application
+        """
+        app = web.Application(client_max_size=64 * 1024 ** 2)
+        app.router.add_post('/v2/directions/{profile}/{format}', self._directions)
+        app.router.add_post('/v2/isochrones/{profile}/geojson', self._isochrones)
+        app.router.add_post('/v2/matrix/{profile}/json', self._matrix)
+        app.router.add_post('/optimization', self._optimization)
+        return app
+
+    async def _directions(self, request):
+        return await self._handle(request, 'directions')
+
+    async def _isochrones(self, request):
+        return await self._handle(request, 'isochrones')
+
+    async def _matrix(self, request):
+        return await self._handle(request, 'matrix')
+
+    async def _optimization(self, request):
+        return await self._handle(request, 'optimization')
+
+    async def _handle(self, request, endpoint):
+        self.requests += 1
+        try:
+            params = await request.json()
+            if 'profile' in request.match_info:
+                params['profile'] = request.match_info['profile']
+            size = request_complexity(endpoint, params)['size']
+        except (ValueError, KeyError, TypeError) as e:
+            return self._error(400, 2000, "Unable to parse request: {}".format(e))
+
+        if self.max_concurrency:
+            if self._semaphore is None:
+                # created lazily, it needs the server's event loop
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            if self.max_queue is not None and self._semaphore.locked() and self.waiting >= self.max_queue:
+                return self._error(503, 2099, "Server is busy.")
+            self.waiting += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self.waiting -= 1
+            try:
+                return await self._respond(request, endpoint, params, size)
+            finally:
+                self._semaphore.release()
+        return await self._respond(request, endpoint, params, size)
+
+    async def _respond(self, request, endpoint, params, size):
+        if self.latency:
+            await asyncio.sleep(self.latency.sample(size))
+
+        draw = self.rng.random()
+        if draw < self.error_rate:
+            return self._error(400, 2003, "Parameter 'coordinates' has incorrect value or format.")
+        if draw < self.error_rate + self.server_error_rate:
+            return self._error(500, 2099, "Unknown internal error.")
+
+        try:
+            if endpoint == 'directions':
+                fmt = request.match_info['format']
+                response = directions_response(params, fmt)
+                if fmt == 'gpx':
+                    return web.Response(text=response, content_type='application/gpx+xml')
+            elif endpoint == 'isochrones':
+                response = isochrones_response(params)
+            elif endpoint == 'matrix':
+                response = matrix_response(params)
+            else:
+                response = optimization_response(params)
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            return self._error(400, 2003, "Invalid request: {}".format(e))
+
+        return web.Response(text=json.dumps(response), content_type='application/json')
+
+    @staticmethod
+    def _error(status, code, message):
+        return web.Response(status=status,
+                            text=json.dumps({'error': {'code': code, 'message': message}}),
+                            content_type='application/json')
+
+
+def _seed_sequence(seed):
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+
+def serve(host='localhost', port=8080, processes=1, reuse_port=False, **kwargs):
+    """
+    Runs a FakeServer until interrupted. Takes the same keyword arguments as FakeServer, plus those of LatencyModel
+    prefixed with latency_, e.g. latency_median=50.
+
+    :param host: Interface to listen on.
+    :type host: str
+
+    :param port: Port to listen on.
+    :type port: int
+
+    :param processes: Amount of server processes sharing the port, so the server doesn't limit the harness' rate. Each
+        one applies max_concurrency on its own.
+    :type processes: int
+
+    :param reuse_port: Whether other processes may listen on the same port, only supported on Linux and BSDs.
+    :type reuse_port: bool
+    """
+    # every process gets its own random streams spawned from the seeds, the same seeds would draw the same errors and
+    # latencies in lockstep
+    seeds = {key: _seed_sequence(kwargs.pop(key)).spawn(processes)
+             for key in ('seed', 'latency_seed') if processes > 1 and key in kwargs}
+    children = [multiprocessing.Process(target=serve, args=(host, port),
+                                        kwargs=dict(kwargs, reuse_port=True,
+                                                    **{key: spawned[idx] for key, spawned in seeds.items()}),
+                                        daemon=True)
+                for idx in range(1, processes)]
+    kwargs.update((key, spawned[0]) for key, spawned in seeds.items())
+    for child in children:
+        child.start()
+
+    latency_kwargs = {key[len('latency_'):]: kwargs.pop(key) for key in list(kwargs) if key.startswith('latency_')}
+    server = FakeServer(latency=LatencyModel(**latency_kwargs) if latency_kwargs else None, **kwargs)
+    try:
+        web.run_app(server.app(), host=host, port=port, reuse_port=reuse_port or bool(children), print=None,
+                    access_log=None)
+    finally:
+        for child in children:
+            child.terminate()
@@ -1,15 +1,15 @@
-from os import path
-import json
-from copy import deepcopy
-import random
+from collections import deque
+import copy
 from math import ceil
 import numpy as np
 import yaml
-from shapely.geometry import shape, Point
-import time
 
+from orsdev import metrics
+from orsdev.geometry import load_geometry
+from orsdev.sampling import BoundingBoxSampler, TriangulationSampler, AnnulusSampler, PointSampler, \
+    PointAnnulusSampler, HotspotSampler, RasterSampler, load_points, load_raster, zipf_weights
+from orsdev.template import CompiledTemplate
 from openrouteservice import optimization
-import openrouteservice as ors
 
 
 class ORSGenerator(object):
@@ -17,7 +17,58 @@ class ORSGenerator(object):
     def __init__(self,
                  endpoint,
                  template_dict,
-                 geojson):
+                 geojson,
+                 sampling='bbox',
+                 distance_sampling='rejection',
+                 cache_dir=None,
+                 simplify=None,
+                 points=None,
+                 workload=None,
+                 seed=None):
+        """
+        Generates randomized request parameters for an ORS endpoint.
+
+        :param endpoint: Endpoint to generate parameters for, one of 'directions', 'isochrones', 'matrix',
+            'optimization'.
+        :type endpoint: str
+
+        :param template_dict: Parsed parameter template YAML. See ./templates/ for options.
+        :type template_dict: dict
+
+        :param geojson: Polygon to limit coordinate generation. Needs a fully qualified file path.
+        :type geojson: str
+
+        :param sampling: How coordinates are drawn within the GeoJSON. 'bbox' rejects random points from its bounding
+            box, 'triangulation' draws from its area-weighted triangles and never rejects a point, which is much faster
+            for thin or fragmented polygons. 'points' draws from the routable points in the points file within the
+            GeoJSON, so requests don't fail on coordinates off the road network.
+        :type sampling: str
+
+        :param distance_sampling: How waypoints are drawn if the template specifies a distance. 'rejection' draws
+            from the whole polygon and rejects waypoints not matching the distance to the previous one, 'annulus'
+            draws directly from the annulus around the previous waypoint, with 'points' sampling from the points within
+            it.
+        :type distance_sampling: str
+
+        :param cache_dir: Directory to cache the parsed geometry, its triangulation and annulus grid in, keyed by the
+            GeoJSON's hash, so e.g. every locust worker loads them in milliseconds. No caching if None.
+        :type cache_dir: str
+
+        :param simplify: Tolerance in degrees to simplify the GeoJSON's geometry with before sampling. No
+            simplification if None.
+        :type simplify: float
+
+        :param points: Path of a .npy file of routable points for 'points' sampling, see orsdev.sampling.save_points().
+        :type points: str
+
+        :param workload: Overrides keys of the template's workload section, e.g. {'repeat_rate': 0.9} for a cache-warm
+            run of a template made for cache-cold ones. See ../templates/openrouteservice.template.yaml for the keys.
+        :type workload: dict
+
+        :param seed: Seed of the generator's own random stream, e.g. an int, a numpy.random.SeedSequence or a
+            numpy.random.Generator. Random if None.
+        :type seed: int or numpy.random.SeedSequence or numpy.random.Generator
+        """
 
         self._endpoint_dict = template_dict['endpoints'][endpoint]
 
@@ -27,22 +78,126 @@ class ORSGenerator(object):
         if not geojson.endswith('.geojson'):
             geojson += '.geojson'
 
-        with open(path.realpath(geojson)) as f:
-            geojson_dict = json.load(f)
-
-        self.polygon = shape(geojson_dict)
+        self.polygon, geometry_key = load_geometry(geojson, cache_dir, simplify)
         self.minx, self.miny, self.maxx, self.maxy = self.polygon.bounds
 
+        if sampling == 'bbox':
+            self.sampler = BoundingBoxSampler(self.polygon)
+        elif sampling == 'triangulation':
+            self.sampler = TriangulationSampler(self.polygon,
+                                                cache_key=geometry_key,
+                                                cache_dir=cache_dir)
+        elif sampling == 'points':
+            if points is None:
+                raise ValueError("Sampling from points needs a points file.")
+            self.sampler = PointSampler(load_points(points, self.polygon))
+        else:
+            raise ValueError("{} is not a valid sampling method.".format(sampling))
+
+        self.annulus_sampler = None
+        if distance_sampling == 'annulus':
+            if self.accept_distance and sampling == 'points':
+                self.annulus_sampler = PointAnnulusSampler(self.sampler.points,
+                                                           self.accept_distance['min'],
+                                                           self.accept_distance['max'])
+            elif self.accept_distance:
+                self.annulus_sampler = AnnulusSampler(self.polygon,
+                                                      self.accept_distance['min'],
+                                                      self.accept_distance['max'],
+                                                      cache_key=geometry_key,
+                                                      cache_dir=cache_dir)
+        elif distance_sampling != 'rejection':
+            raise ValueError("{} is not a valid distance sampling method.".format(distance_sampling))
+
+        # Concentrates the coordinates (or the first waypoint with annulus distance sampling) like real traffic
+        self.workload = dict(template_dict.get('workload') or dict(), **(workload or dict()))
+        spatial = self.workload.get('spatial', 'uniform')
+        if spatial == 'hotspots':
+            self.sampler = self._hotspot_sampler(self.workload.get('hotspots') or dict())
+        elif spatial == 'raster':
+            if not self.workload.get('raster'):
+                raise ValueError("Raster workloads need a raster file.")
+            self.sampler = RasterSampler(self.polygon, *load_raster(self.workload['raster']))
+        elif spatial != 'uniform':
+            raise ValueError("{} is not a valid spatial workload.".format(spatial))
+
+        # Share of requests repeating one of the last repeat_pool requests, e.g. to exercise server-side caches
+        self.repeat_rate = self.workload.get('repeat_rate', 0)
+        self._history = deque(maxlen=self.workload.get('repeat_pool', 1000))
+        self.repeated = 0
+
+        # Drawn vs. accepted coordinate candidates over the lifetime of the generator
+        self.sampling_stats = {'drawn': 0, 'accepted': 0}
+        # Set to a orsdev.metrics.SamplingProfiler to find out where generating requests spends its time
+        self.profiler = None
+
         self._endpoint = endpoint
         self._multi_params = self._get_multi_params_map().get(endpoint, [])
+        self._template = CompiledTemplate(self._endpoint_params, self._multi_params)
 
         self.params = dict()
+        self.seed(seed)
+
+    def seed(self, seed):
+        """
+        Reseeds the generator's random stream and discards left over coordinate candidates, so the following requests
+        are reproducible.
+
+        :param seed: The seed, see __init__.
+        :type seed: int or numpy.random.SeedSequence or numpy.random.Generator
+        """
+        self.rng = np.random.default_rng(seed)
+        self._candidates = np.empty((0, 2))
+        if isinstance(self.annulus_sampler, AnnulusSampler):
+            self.annulus_sampler.reset()
+        self._history.clear()
+
+    @property
+    def acceptance_rate(self):
+        """The share of drawn coordinate candidates which ended up in a request. Useful to tune template distances."""
+        if not self.sampling_stats['drawn']:
+            return None
+        return self.sampling_stats['accepted'] / self.sampling_stats['drawn']
 
     def create_requests(self):
+        """
+        Draws the parameters of a request, or repeats an earlier one with a probability of self.repeat_rate. Timed as
+        stage 'generate', see orsdev.metrics.
+
+        :return: The parameters, as accepted by the ors-py client's function for the endpoint.
+        :rtype: dict
+        """
+        with metrics.REGISTRY.stage('generate', endpoint=self._endpoint), self.profiler or metrics.NO_OP:
+            if self.repeat_rate:
+                if self._history and self.rng.random() < self.repeat_rate:
+                    self.repeated += 1
+                    return copy.deepcopy(self._history[int(self.rng.integers(len(self._history)))])
+                params = self._create_requests()
+                self._history.append(copy.deepcopy(params))
+                return params
+            return self._create_requests()
+
+    def _hotspot_sampler(self, config):
+        """
+        Draws the hotspots with the configured sampling, from their own seed, so every generator of a template, e.g. one
+        per locust worker or corpus chunk, has the same ones.
+        """
+        count = config.get('count', 20)
+        rng = np.random.default_rng(config.get('seed', 0))
+        hotspots = np.empty((0, 2))
+        while len(hotspots) < count:
+            hotspots = np.concatenate((hotspots, self.sampler.draw(rng)[0]))
+
+        return HotspotSampler(self.polygon,
+                              hotspots[:count],
+                              zipf_weights(count, config.get('exponent', 1.0)),
+                              config.get('spread', 0.01),
+                              points=self.sampler.points if isinstance(self.sampler, PointSampler) else None)
+
+    def _create_requests(self):
 
-        # First create all random parameters and pick all random parameters from template
-        self._reset_params()
-        self._pick_random_parameters(self.params)
+        # First create all random parameters and pick all random parameters from the compiled template
+        self.params = self._template.execute(self.rng)
 
         # Create all endpoint specific parameters
         # Coordinates are already initialized to an integer representing the amount of coordinates (through
@@ -56,32 +211,27 @@ class ORSGenerator(object):
                 isAvoidCountries = self.params['options'].get('avoid_countries')
                 if isAvoidCountries is not None:
                     if isAvoidCountries is True:
-                        num = random.choice(range(1, 3))
-                        self.params['options']['avoid_countries'] = random.sample(range(1, 236), num)
+                        num = int(self.rng.integers(1, 3))
+                        self.params['options']['avoid_countries'] = (self.rng.choice(235, num, replace=False) + 1).tolist()
                     else:
                         del self.params['options']['avoid_countries']
 
             if self.params.get('radiuses') is not None:
                 if self.params['radiuses'] is True:
                     num = len(self.params['coordinates'])
-                    pop = range(-1, 1000 * num, 1000)
-                    self.params['radiuses'] = random.sample(pop, num)
+                    pop = np.arange(-1, 1000 * num, 1000)
+                    self.params['radiuses'] = self.rng.choice(pop, num, replace=False).tolist()
                 else:
                     del self.params['radiuses']
 
         if self._endpoint == 'isochrones':
             self.params['locations'] = self._random_coordinates(n=self.params['locations'])
-            if self.params['profile'].startswith('driving'):
-                factor = 2000 if self.params['range_type'] == 'distance' else 60
-            if self.params['profile'].startswith('cycling'):
-                factor = 2000 if self.params['range_type'] == 'distance' else 60
-            if self.params['profile'].startswith('foot'):
-                factor = 2000 if self.params['range_type'] == 'distance' else 60
-
-            # self.params['range'] = random.sample(range(100, 60 * factor, 100), self.params['range'])
-            self.params['range'] = random.sample(range(100, 2 * factor, 100), self.params['range'])
+            # ranges up to 4 km or 1 hour, for all profiles
+            factor = 2000 if self.params['range_type'] == 'distance' else 1800
+            self.params['range'] = self.rng.choice(np.arange(100, 2 * factor, 100), self.params['range'],
+                                                   replace=False).tolist()
             if len(self.params['range']) == 1:
-                self.params['interval'] = int(self.params['range'][0]/random.choice(range(1, 10)))
+                self.params['interval'] = int(self.params['range'][0]/self.rng.integers(1, 10))
 
         if self._endpoint == 'matrix':
             self.params['locations'] = self._random_coordinates(n=self.params['locations'])
@@ -123,23 +273,6 @@ class ORSGenerator(object):
 
         return self.params
 
-    def _reset_params(self):
-        """Reset parameters before each request"""
-        self.params = deepcopy(self._endpoint_params)
-        self._init_parameters(self.params)
-
-    def _init_parameters(self, d):
-        """
-        Updates self.init_params: when value is a dict not being able to call np.arange() on its values,
-        it will call itself again with this dict value.
-        """
-        for k in d:
-            if isinstance(d[k], dict):
-                try:
-                    d[k] = np.arange(*d[k].values())
-                except:
-                    self._init_parameters(d[k])
-
     @staticmethod
     def _get_multi_params_map():
         m = {
@@ -149,73 +282,123 @@ class ORSGenerator(object):
         }
         return m
 
-    def _pick_random_parameters(self, d):
-        for k in d:
-            if isinstance(d[k], dict):
-                self._pick_random_parameters(d[k])
-            elif isinstance(d[k], (list, range, tuple, np.ndarray)):
-                if k in self._multi_params:
-                    num = random.choice(range(1, len(d[k])))
-                    d[k] = random.sample(d[k], num)
-                else:
-                    d[k] = random.choice(d[k])
-
-                # Sanitize to be regular Python builtin types
-                if isinstance(d[k], np.int64):
-                    d[k] = int(d[k])
-                if isinstance(d[k], np.float64):
-                    d[k] = float(d[k])
-
-            elif isinstance(d[k], int):
-                d[k] = range(d[k])
-            else:
-                raise ValueError
-
-        return d
-
     def _random_coordinates(self, n):
         """
         Populates coordinates list depending on geojson given and if minimum_distance is given, it checks whether the
         last coordinate is further away from the one generated in that cycle.
 
-        :param n:
-        :return:
+        Candidates are drawn in batches by self.sampler, the ones left over from a batch are used for the next
+        coordinates, also across requests. With annulus distance sampling, waypoints after the first are drawn by
+        self.annulus_sampler.
+
+        :param n: Amount of coordinates to generate.
+        :type n: int
+
+        :return: List of [x, y] coordinates.
+        :rtype: list
         """
         coordinates = []
+        candidates = self._candidates
 
-        for _ in range(n):
-            counter = 0
-            in_geojson = False
-            while not in_geojson:
-                x = random.uniform(self.minx, self.maxx)
-                y = random.uniform(self.miny, self.maxy)
-                p = Point(x, y)
-                if self.polygon.contains(p):
-                    if self.accept_distance and coordinates:
-                        if not self.accept_distance['min'] < p.distance(Point(coordinates[-1])) < self.accept_distance['max']:
-                            continue
-                    coordinates.append([x, y])
-                    in_geojson = True
+        counter = 0
+        while len(coordinates) < n:
+            if self.annulus_sampler is not None and coordinates:
+                if counter > 1000:
+                    raise ValueError("Distance settings are too restrictive. Try a wider range and remember it's in degrees.")
+                coordinate, drawn = self.annulus_sampler.draw(self.rng, coordinates[-1])
+                counter += drawn
+                self.sampling_stats['drawn'] += drawn
+                if coordinate is not None:
+                    coordinates.append(coordinate)
+                    counter = 0
+                continue
+
+            if not len(candidates):
                 if counter > 1000:
                     raise ValueError("Distance settings are too restrictive. Try a wider range and remember it's in degrees.")
-                counter += 1
+                candidates, drawn = self.sampler.draw(self.rng)
+                counter += drawn
+                # the candidates rejected by the sampler count now, the others once they are tested
+                self.sampling_stats['drawn'] += drawn - len(candidates)
+                continue
+
+            if not self.accept_distance:
+                k = n - len(coordinates)
+                coordinates.extend(candidates[:k].tolist())
+                self.sampling_stats['drawn'] += len(candidates[:k])
+                candidates = candidates[k:]
+                counter = 0
+                continue
+
+            idx = 0
+            if coordinates:
+                distances = np.hypot(*(candidates - coordinates[-1]).T)
+                valid = np.flatnonzero((self.accept_distance['min'] < distances) &
+                                       (distances < self.accept_distance['max']))
+                if not valid.size:
+                    self.sampling_stats['drawn'] += len(candidates)
+                    candidates = candidates[:0]
+                    continue
+                idx = valid[0]
+
+            coordinates.append(candidates[idx].tolist())
+            self.sampling_stats['drawn'] += int(idx) + 1
+            candidates = candidates[idx + 1:]
+            counter = 0
+
+        self._candidates = candidates
+        self.sampling_stats['accepted'] += n
 
         return coordinates
 
-if __name__ == '__main__':
-    gen = ORSGenerator('optimization',
-                 './templates/openrouteservice_optimization.yaml',
-                 '..//geojson/regbez_karlsruhe.geojson')
-    r = gen.create_requests()
-    print("request successfully prepared:\n{}".format(r))
-    clnt = ors.Client('5b3ce3597851110001cf62484d5d4d0972b540009af270b62e0a5dee',
-                      timeout=1200)
-    start = time.time()
-    try:
-        o = clnt.optimization(**r)
-    except:
-        print("Error from {}".format(clnt.req.body.decode('utf-8')))
-        raise
-    print("request took {} secs.".format(time.time() - start))
-    print("Jobs: {}, Vehicles: {}".format(len(r['jobs']), len(r['vehicles'])))
-    print(o)
+
+class MixedGenerator(object):
+
+    def __init__(self,
+                 mix,
+                 geojson,
+                 seed=None,
+                 **kwargs):
+        """
+        Generates requests for several endpoints and templates at once, each drawn by its weight, e.g. to load a server
+        with a mix of traffic like in production.
+
+        :param mix: (endpoint, template path, weight) per part of the mix, e.g. ('directions',
+            'templates/openrouteservice_car.yaml', 70). Weights are relative.
+        :type mix: list of tuple
+
+        :param geojson: Polygon to limit coordinate generation. Needs a fully qualified file path.
+        :type geojson: str
+
+        :param seed: Seed of the random streams, see ORSGenerator.
+        :type seed: int or numpy.random.SeedSequence
+
+        :param kwargs: Passed on to every ORSGenerator, e.g. sampling or cache_dir.
+        """
+        weights = np.array([weight for _, _, weight in mix], dtype=float)
+        if not len(weights) or (weights < 0).any() or not weights.sum():
+            raise ValueError("The mix needs at least one part and only positive weights.")
+        self._cum_weights = np.cumsum(weights) / weights.sum()
+
+        # one stream to pick the parts, one per part's generator
+        seeds = np.random.SeedSequence(seed).spawn(len(mix) + 1) if not isinstance(seed, np.random.SeedSequence) \
+            else seed.spawn(len(mix) + 1)
+        self.rng = np.random.default_rng(seeds[0])
+
+        templates = dict()
+        self.generators = []
+        for (endpoint, template, _), part_seed in zip(mix, seeds[1:]):
+            if template not in templates:
+                with open(template) as f:
+                    templates[template] = yaml.safe_load(f)
+            self.generators.append(ORSGenerator(endpoint, templates[template], geojson, seed=part_seed, **kwargs))
+
+    def create_requests(self):
+        """
+        :return: The endpoint and the parameters of the drawn part of the mix.
+        :rtype: tuple of (str, dict)
+        """
+        idx = min(int(np.searchsorted(self._cum_weights, self.rng.random(), side='right')), len(self.generators) - 1)
+        generator = self.generators[idx]
+        return generator._endpoint, generator.create_requests()
+
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+from os import path, makedirs, replace, getpid, stat
+
+from shapely import wkb
+from shapely.geometry import shape
+
+
+def _write(filename, data):
+    # write aside and move in place, so concurrently starting workers never read a partial file
+    tmp_file = '{}.{}.tmp'.format(filename, getpid())
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+    replace(tmp_file, filename)
+
+
+def load_geometry(geojson,
+                  cache_dir=None,
+                  simplify=None):
+    """
+    Loads the geometry of a GeoJSON file. Parsing large, pretty-printed boundaries takes seconds, so with a cache_dir
+    the parsed (and simplified) geometry is stored as WKB, keyed by the file's hash and the simplification tolerance.
+    The hash is stored in a sidecar file keyed by the file's path, modification time and size, so further loads
+    neither read nor hash the GeoJSON, they just read the WKB.
+
+    :param geojson: Path of the GeoJSON file.
+    :type geojson: str
+
+    :param cache_dir: Directory to cache the geometry in. No caching if None.
+    :type cache_dir: str
+
+    :param simplify: Tolerance in degrees to simplify the geometry with, topology preserving. Speeds up sampling in
+        detailed boundaries, where a few meters don't matter. No simplification if None.
+    :type simplify: float
+
+    :return: The geometry and its key, e.g. to cache data derived from it such as a triangulation.
+    :rtype: tuple of (shapely.geometry.base.BaseGeometry, str)
+    """
+    geojson = path.realpath(geojson)
+    suffix = '-{}'.format(simplify) if simplify else ''
+
+    sidecar = None
+    if cache_dir:
+        info = stat(geojson)
+        file_id = '{}:{}:{}'.format(geojson, info.st_mtime_ns, info.st_size).encode('utf-8')
+        sidecar = path.join(cache_dir, '{}.key'.format(hashlib.sha1(file_id).hexdigest()))
+        if path.exists(sidecar):
+            with open(sidecar) as f:
+                key = f.read() + suffix
+            cache_file = path.join(cache_dir, '{}.wkb'.format(key))
+            if path.exists(cache_file):
+                with open(cache_file, 'rb') as f:
+                    return wkb.loads(f.read()), key
+
+    with open(geojson, 'rb') as f:
+        geojson_bytes = f.read()
+
+    file_hash = hashlib.sha1(geojson_bytes).hexdigest()
+    key = file_hash + suffix
+
+    geometry = shape(json.loads(geojson_bytes.decode('utf-8')))
+    if simplify:
+        geometry = geometry.simplify(simplify, preserve_topology=True)
+
+    if sidecar:
+        makedirs(cache_dir, exist_ok=True)
+        _write(path.join(cache_dir, '{}.wkb'.format(key)), wkb.dumps(geometry))
+        _write(sidecar, file_hash.encode('utf-8'))
+
+    return geometry, key
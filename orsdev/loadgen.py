@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import csv
+import numpy as np
+
+from orsdev import metrics
+from orsdev.stats import request_complexity, ComplexityStats
+
+
+def constant_schedule(rps, duration):
+    """
+    Arrivals at a constant rate.
+
+    :param rps: Requests per second.
+    :type rps: float
+
+    :param duration: Duration in seconds.
+    :type duration: float
+
+    :return: Intended send times in seconds from the start.
+    :rtype: numpy.ndarray
+    """
+    return np.arange(0, duration, 1 / rps)
+
+
+def ramp_schedule(start_rps, end_rps, duration):
+    """
+    Arrivals at a rate increasing (or decreasing) linearly from start_rps to end_rps.
+
+    :return: Intended send times in seconds from the start.
+    :rtype: numpy.ndarray
+    """
+    # the amount of requests sent until t is the integral of the rate, invert it for evenly spaced counts
+    slope = (end_rps - start_rps) / duration
+    total = start_rps * duration + slope * duration ** 2 / 2
+    counts = np.arange(0, total)
+    if slope == 0:
+        return counts / start_rps
+    return (np.sqrt(start_rps ** 2 + 2 * slope * counts) - start_rps) / slope
+
+
+def step_schedule(steps):
+    """
+    Arrivals at constant rates, one after another.
+
+    :param steps: Rates and their durations, as [(rps, duration), ...].
+    :type steps: list of tuple
+
+    :return: Intended send times in seconds from the start.
+    :rtype: numpy.ndarray
+    """
+    times, offset = [], 0
+    for rps, duration in steps:
+        times.append(offset + constant_schedule(rps, duration))
+        offset += duration
+    return np.concatenate(times)
+
+
+def poisson_schedule(rps, duration, seed=None):
+    """
+    Arrivals of a Poisson process, i.e. exponentially distributed gaps with a mean rate of rps.
+
+    :return: Intended send times in seconds from the start.
+    :rtype: numpy.ndarray
+    """
+    rng = np.random.default_rng(seed)
+    # draw a few more gaps than expected and cut at the duration
+    gaps = rng.exponential(1 / rps, int(rps * duration * 1.2) + 10)
+    times = np.cumsum(gaps) - gaps[0]
+    while times[-1] < duration:
+        times = np.concatenate((times, times[-1] + np.cumsum(rng.exponential(1 / rps, len(gaps)))))
+    return times[times < duration]
+
+
+class LoadResult(object):
+
+    def __init__(self, intended, sent, done, errors, sizes):
+        """
+        Timings of an open-loop run in seconds from its start, one entry per request.
+
+        :param intended: When the request should have been sent according to the schedule.
+        :param sent: When the request was actually sent.
+        :param done: When the response arrived.
+        :param errors: The exception class name per request, None if successful.
+        :param sizes: The problem size per request, see orsdev.stats.request_complexity().
+        """
+        self.intended = intended
+        self.sent = sent
+        self.done = done
+        self.errors = errors
+        self.sizes = sizes
+
+    def latencies(self, corrected=True):
+        """
+        Latencies in seconds. Corrected latencies are measured from the intended send time, so time a request had to
+        wait for the harness or a connection counts as well (no coordinated omission).
+
+        :param corrected: Whether to measure from the intended instead of the actual send time.
+        :type corrected: bool
+
+        :rtype: numpy.ndarray
+        """
+        return self.done - (self.intended if corrected else self.sent)
+
+    def summary(self, percentiles=(50, 90, 99, 99.9)):
+        """
+        :return: Amount of requests and errors, achieved rate, maximum send lag and latency percentiles in ms,
+            corrected and uncorrected.
+        :rtype: dict
+        """
+        summary = {
+            'requests': len(self.intended),
+            'errors': sum(error is not None for error in self.errors),
+            'rps': float(len(self.intended) / self.done.max()) if len(self.done) else 0,
+            'max_send_lag': float(1000 * (self.sent - self.intended).max()) if len(self.sent) else 0
+        }
+        for corrected in (True, False):
+            values = np.percentile(1000 * self.latencies(corrected), percentiles) if len(self.done) else []
+            for p, value in zip(percentiles, values):
+                summary['{}p{}'.format('' if corrected else 'uncorrected_', p)] = float(value)
+
+        return summary
+
+    def complexity(self, corrected=True):
+        """
+        Latencies of successful requests in ms by problem size, see orsdev.stats.ComplexityStats.
+
+        :param corrected: Whether to measure from the intended instead of the actual send time.
+        :type corrected: bool
+
+        :rtype: orsdev.stats.ComplexityStats
+        """
+        stats = ComplexityStats()
+        for size, latency, error in zip(self.sizes, self.latencies(corrected), self.errors):
+            if error is None:
+                stats.record(size, 1000 * latency)
+        return stats
+
+    def write(self, filename):
+        """Writes the timings and problem size per request as CSV."""
+        with metrics.REGISTRY.stage('write_csv'), open(filename, 'w') as f:
+            writer = csv.writer(f, delimiter=',')
+            writer.writerow(("Intended", "Sent", "Done", "Error", "Size"))
+            writer.writerows(zip(self.intended, self.sent, self.done, self.errors, self.sizes))
+
+
+class OpenLoopRunner(object):
+
+    def __init__(self,
+                 client,
+                 endpoint,
+                 requests,
+                 schedule):
+        """
+        Fires requests on a fixed arrival schedule, independent of how fast the server responds. Unlike the closed-loop
+        locust users, offered load doesn't drop when the server slows down.
+
+        :param client: The client to send with.
+        :type client: orsdev.client.AsyncClient
+
+        :param endpoint: One of 'directions', 'isochrones', 'matrix', 'optimization'.
+        :type endpoint: str
+
+        :param requests: Request parameters, e.g. a orsdev.corpus.RequestCorpus or
+            iter(generator.create_requests, None) for a live stream. Sequences are cycled if shorter than the schedule,
+            the run stops early if an iterator is exhausted.
+        :type requests: iterable
+
+        :param schedule: Intended send times in seconds from the start, e.g. from constant_schedule().
+        :type schedule: numpy.ndarray
+        """
+        self.client = client
+        self.endpoint = endpoint
+        self.requests = requests
+        self.schedule = np.asarray(schedule, dtype=float)
+
+    def run(self):
+        """
+        Runs the schedule to completion in a new event loop.
+
+        :rtype: LoadResult
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.run_async())
+        finally:
+            loop.run_until_complete(self.client.close())
+            loop.close()
+
+    async def run_async(self):
+        """
+        Runs the schedule to completion.
+
+        :rtype: LoadResult
+        """
+        loop = asyncio.get_running_loop()
+        n = len(self.schedule)
+        sent, done = np.zeros(n), np.zeros(n)
+        sizes = np.zeros(n, dtype=np.int64)
+        errors = [None] * n
+
+        async def send(idx, params):
+            sent[idx] = loop.time() - start
+            try:
+                await self.client.request(self.endpoint, params)
+            except Exception as e:
+                errors[idx] = e.__class__.__name__
+            done[idx] = loop.time() - start
+
+        requests = self._cycle(self.requests)
+        tasks = []
+        start = loop.time()
+        for idx, intended in enumerate(self.schedule):
+            params = next(requests, None)
+            if params is None:
+                n = idx
+                break
+            sizes[idx] = request_complexity(self.endpoint, params)['size']
+            # always yield to the event loop, even when behind schedule
+            await asyncio.sleep(max(start + intended - loop.time(), 0))
+            tasks.append(asyncio.ensure_future(send(idx, params)))
+        await asyncio.gather(*tasks)
+
+        return LoadResult(self.schedule[:n].copy(), sent[:n], done[:n], errors[:n], sizes[:n])
+
+    @staticmethod
+    def _cycle(requests):
+        if hasattr(requests, '__len__'):
+            idx = 0
+            while True:
+                yield requests[idx % len(requests)]
+                idx += 1
+        else:
+            for params in requests:
+                yield params
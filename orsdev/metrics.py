@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from os import replace, getpid
+import sys
+import threading
+import time
+
+from orsdev.stats import Histogram
+
+# Quantiles of the stage timings in the OpenMetrics text
+QUANTILES = (0.5, 0.9, 0.99)
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+class _NoOp(object):
+    """Stands in for stages and profilers while they are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_OP = _NoOp()
+
+
+class _Stage(object):
+
+    __slots__ = ('registry', 'key', 'start')
+
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.key, time.perf_counter() - self.start)
+        return False
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _label_text(labels, extra=()):
+    labels = labels + extra
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                          for key, value in labels) + '}'
+
+
+class Registry(object):
+
+    def __init__(self, prefix='orsdev', enabled=False):
+        """
+        Counters and timing histograms of the harness' stages, e.g. generating, waiting for the server, parsing and
+        diffing, to tell whether a slow run is due to the server or the harness. Disabled by default, stage() then
+        returns a shared no-op, so the instrumentation costs next to nothing. Thread-safe.
+
+        Exported as OpenMetrics text with text(), to a file with write() or start_export(), or over HTTP with serve().
+
+        :param prefix: Prefix of the metric names.
+        :type prefix: str
+
+        :param enabled: Whether to record.
+        :type enabled: bool
+        """
+        self.prefix = prefix
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._exporter = None
+        self._server = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # (stage, labels) -> histogram of microseconds
+            self.stages = dict()
+            # (name, labels) -> count
+            self.counters = Counter()
+
+    def stage(self, name, **labels):
+        """
+        Times a stage, as context manager: with REGISTRY.stage('diff', endpoint='directions'): ...
+
+        :param name: The stage, e.g. 'generate'.
+        :type name: str
+
+        :param labels: Labels to tell timings of the same stage apart, e.g. the server.
+        """
+        if not self.enabled:
+            return NO_OP
+        return _Stage(self, (name, _labels(labels)))
+
+    def observe(self, key, seconds):
+        """Records the duration of a stage, keyed by (name, labels) as built by stage()."""
+        with self._lock:
+            if key not in self.stages:
+                self.stages[key] = Histogram(max_value=1e9)
+            # microseconds, the histogram lumps values below 1 together
+            self.stages[key].record(1e6 * seconds)
+
+    def count(self, name, value=1, **labels):
+        """
+        Increases a counter, e.g. of errors.
+
+        :param name: The counter, e.g. 'errors'.
+        :type name: str
+
+        :param value: The increment.
+        :type value: int
+        """
+        if self.enabled:
+            with self._lock:
+                self.counters[(name, _labels(labels))] += value
+
+    def snapshot(self):
+        """
+        :return: The state as builtin types, e.g. to be sent from a locust worker to the master.
+        :rtype: dict
+        """
+        with self._lock:
+            return {'stages': [[name, [list(label) for label in labels], h.snapshot()]
+                               for (name, labels), h in self.stages.items()],
+                    'counters': [[name, [list(label) for label in labels], value]
+                                 for (name, labels), value in self.counters.items()]}
+
+    def merge(self, other):
+        """
+        :param other: A snapshot of another registry.
+        :type other: dict
+        """
+        with self._lock:
+            for name, labels, snapshot in other['stages']:
+                key = (name, tuple(tuple(label) for label in labels))
+                if key not in self.stages:
+                    self.stages[key] = Histogram(max_value=1e9)
+                self.stages[key].merge(snapshot)
+            for name, labels, value in other['counters']:
+                self.counters[(name, tuple(tuple(label) for label in labels))] += value
+
+    def text(self):
+        """
+        :return: The metrics in the OpenMetrics text format: a summary of seconds per stage and a counter per count.
+        :rtype: str
+        """
+        with self._lock:
+            stages = sorted(self.stages.items())
+            counters = sorted(self.counters.items())
+            lines = []
+            if stages:
+                name = '{}_stage_seconds'.format(self.prefix)
+                lines.extend(('# TYPE {} summary'.format(name),
+                              '# UNIT {} seconds'.format(name),
+                              '# HELP {} Time spent per stage of the harness.'.format(name)))
+                for (stage, labels), h in stages:
+                    labels = (('stage', stage),) + labels
+                    for q in QUANTILES:
+                        lines.append('{}{} {}'.format(name, _label_text(labels, (('quantile', str(q)),)),
+                                                      repr(h.percentile(100 * q) / 1e6)))
+                    lines.append('{}_sum{} {}'.format(name, _label_text(labels), repr(h.sum / 1e6)))
+                    lines.append('{}_count{} {}'.format(name, _label_text(labels), h.count))
+
+            for counter in sorted(set(name for (name, _), _ in counters)):
+                name = '{}_{}'.format(self.prefix, counter)
+                lines.append('# TYPE {} counter'.format(name))
+                for (_, labels), value in ((key, value) for key, value in counters if key[0] == counter):
+                    lines.append('{}_total{} {}'.format(name, _label_text(labels), value))
+
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, filename):
+        """Writes the metrics to a file, e.g. for the textfile collector of the Prometheus node exporter."""
+        # write aside and move in place, so scrapers never read a partial file
+        tmp_file = '{}.{}.tmp'.format(filename, getpid())
+        with open(tmp_file, 'w') as f:
+            f.write(self.text())
+        replace(tmp_file, filename)
+
+    def start_export(self, filename, interval=10):
+        """
+        Enables recording and rewrites the metrics file every interval seconds until stop() is called.
+
+        :param filename: Path of the metrics file.
+        :type filename: str
+
+        :param interval: Seconds between writes.
+        :type interval: float
+        """
+        self.enabled = True
+        stop = threading.Event()
+
+        def export():
+            while not stop.wait(interval):
+                self.write(filename)
+            self.write(filename)
+
+        thread = threading.Thread(target=export, daemon=True)
+        thread.start()
+        self._exporter = (stop, thread)
+
+    def serve(self, port, host='localhost'):
+        """
+        Enables recording and serves the metrics at http://host:port/metrics from a background thread until stop() is
+        called.
+
+        :param port: Port to listen on, 0 picks a free one.
+        :type port: int
+
+        :param host: Interface to listen on.
+        :type host: str
+
+        :return: The port.
+        :rtype: int
+        """
+        self.enabled = True
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = HTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_address[1]
+
+    def stop(self):
+        """Stops exporting, after writing the metrics file a last time, and serving."""
+        if self._exporter is not None:
+            stop, thread = self._exporter
+            stop.set()
+            thread.join()
+            self._exporter = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# The registry the harness' stages report to
+REGISTRY = Registry()
+
+
+class SamplingProfiler(object):
+
+    def __init__(self, interval=0.005):
+        """
+        Samples the call stacks of threads while they are inside a profiled block, e.g. the generator's hot path:
+        with profiler: ... Unlike cProfile it doesn't slow down the profiled code, only a background thread wakes up
+        every interval to look at the stacks. Write the counts with write() as collapsed stacks, the input of
+        flamegraph.pl or speedscope.
+
+        :param interval: Seconds between samples.
+        :type interval: float
+        """
+        self.interval = interval
+        self.samples = Counter()
+        self._threads = Counter()
+        self._lock = threading.Lock()
+        self._stop = None
+
+    def __enter__(self):
+        with self._lock:
+            self._threads[threading.get_ident()] += 1
+            if self._stop is None:
+                self._stop = threading.Event()
+                threading.Thread(target=self._sample, args=(self._stop,), daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            ident = threading.get_ident()
+            self._threads[ident] -= 1
+            if not self._threads[ident]:
+                del self._threads[ident]
+        return False
+
+    def _sample(self, stop):
+        while not stop.wait(self.interval):
+            with self._lock:
+                threads = list(self._threads)
+            frames = sys._current_frames()
+            for ident in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append('{}:{}'.format(code.co_filename.rsplit('/', 1)[-1], code.co_name))
+                    frame = frame.f_back
+                if stack:
+                    self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        """Stops sampling, samples taken so far are kept."""
+        with self._lock:
+            if self._stop is not None:
+                self._stop.set()
+                self._stop = None
+
+    def write(self, filename):
+        """Writes the samples as collapsed stacks, one 'frame;frame;... count' line per distinct stack."""
+        with open(filename, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write('{} {}\n'.format(stack, count))
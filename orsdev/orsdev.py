@@ -1,47 +1,298 @@
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict
+import json
+
 import click
-from datetime import datetime
+
+# Heavy dependencies (numpy, shapely, openrouteservice, aiohttp) are imported in the commands, so --help is instant.
+
+ENDPOINTS = ('directions', 'isochrones', 'matrix', 'optimization')
+
+
+def _load_template(template):
+    import yaml
+
+    if not template.endswith('.yaml'):
+        template += '.yaml'
+    with open(template) as f:
+        return yaml.safe_load(f)
+
+
+def _echo(summary, fmt):
+    """Prints a flat summary as text lines or JSON."""
+    if fmt == 'json':
+        click.echo(json.dumps(summary, indent=2))
+    else:
+        for key, value in summary.items():
+            click.echo("{}: {}".format(key, value))
+
+
+def _start_metrics(metrics_file, metrics_port):
+    """Records the harness' stages if asked to, exported until the command finishes, see orsdev.metrics."""
+    if not (metrics_file or metrics_port):
+        return
+    from orsdev.metrics import REGISTRY
+
+    if metrics_file:
+        REGISTRY.start_export(metrics_file)
+    if metrics_port:
+        click.echo("Serving metrics on http://localhost:{}/metrics".format(REGISTRY.serve(metrics_port)))
+    click.get_current_context().call_on_close(REGISTRY.stop)
+
+
+metrics_options = [
+    click.option('--metrics', 'metrics_file', type=click.Path(dir_okay=False),
+                 help='File to write timings of the harness\' stages to every 10 s, in the OpenMetrics format.'),
+    click.option('--metrics-port', type=int, help='Port to serve the timings on at /metrics during the run.')
+]
+
+
+def _add_options(options):
+    def decorator(func):
+        for option in reversed(options):
+            func = option(func)
+        return func
+    return decorator
+
 
 @click.group()
 def main():
-    """Entry point for the program."""
-
+    """Dev and load testing of openrouteservice instances."""
     pass
 
+
 @main.command()
-@click.argument('')
-
-
-def parse_args():
-    parser = argparse.ArgumentParser(
-        description='ORS development tester')
-
-    parser.add_argument(
-        'test_server',
-        help='The test server holding your development environment',
-        type=str)
-
-    parser.add_argument(
-        'outfile',
-        help=
-        'The full path to your output PBF/XML file. Note, the file ending determines the format.',
-        type=str)
-
-    parser.add_argument(
-        '-p',
-        '--provider',
-        help='Choose the provider of the proprietary dataset. Default tomtom.',
-        choices=['tomtom'],
-        default='tomtom')
-
-    # Just a flag, no values to pass
-    parser.add_argument('-r',
-                        '--report',
-                        help='Print out report to stdout.',
-                        action='store_true')
-
-    return parser.parse_args()
+@click.argument('endpoint', type=click.Choice(ENDPOINTS))
+@click.argument('template', type=click.Path(exists=True, dir_okay=False))
+@click.argument('geojson', type=click.Path(exists=True, dir_okay=False))
+@click.option('-n', '--count', default=1000, show_default=True, help='Amount of requests to generate.')
+@click.option('-o', '--output', required=True, type=click.Path(dir_okay=False), help='Corpus file to write.')
+@click.option('--seed', type=int, help='Seed for reproducible requests. Random if not set.')
+@click.option('-p', '--processes', default=1, show_default=True, help='Amount of generating processes.')
+@click.option('--chunk-size', default=1000, show_default=True, help='Amount of requests per random stream.')
+@click.option('--sampling', type=click.Choice(('bbox', 'triangulation', 'points')), default='bbox',
+              show_default=True, help='How coordinates are drawn within the GeoJSON.')
+@click.option('--distance-sampling', type=click.Choice(('rejection', 'annulus')), default='rejection',
+              show_default=True, help='How waypoints with a distance constraint are drawn.')
+@click.option('--points', type=click.Path(exists=True, dir_okay=False), help='Routable points for --sampling points.')
+@click.option('--cache-dir', type=click.Path(file_okay=False), help='Directory to cache the parsed GeoJSON in.')
+@click.option('--repeat-rate', type=float,
+              help='Share of requests repeating an earlier one of the same chunk, overrides the template\'s workload.')
+def generate(endpoint, template, geojson, count, output, seed, processes, chunk_size, sampling, distance_sampling,
+             points, cache_dir, repeat_rate):
+    """Pre-generates a corpus of random requests."""
+    from orsdev.generator import ORSGenerator
+    from orsdev.corpus import write_corpus
+
+    generator = ORSGenerator(endpoint,
+                             _load_template(template),
+                             geojson,
+                             sampling=sampling,
+                             distance_sampling=distance_sampling,
+                             cache_dir=cache_dir,
+                             points=points,
+                             workload=None if repeat_rate is None else {'repeat_rate': repeat_rate})
+    write_corpus(generator, count, output, seed=seed, processes=processes, chunk_size=chunk_size)
+    click.echo("Wrote {} {} requests to {}.".format(count, endpoint, output))
+
+
+@main.command('dev-test')
+@click.argument('template', type=click.Path(exists=True, dir_okay=False))
+@click.option('-e', '--endpoint', type=click.Choice(ENDPOINTS[:3]), default='directions', show_default=True)
+@click.option('--stable', required=True, help='URL of the stable server.')
+@click.option('--dev', required=True, help='URL of the dev server.')
+@click.option('--geojson', type=click.Path(exists=True, dir_okay=False),
+              help='Polygon to generate requests in. Either this or --corpus.')
+@click.option('--corpus', type=click.Path(exists=True, dir_okay=False),
+              help='Pre-generated requests to test, distributed to --workers processes.')
+@click.option('-n', '--cycles', default=100, show_default=True, help='Amount of generated requests.')
+@click.option('-m', '--method', type=click.Choice(('differ', 'semantic', 'performance')), default='differ',
+              show_default=True, help='performance compares latencies and exits with 1 if dev is significantly slower.')
+@click.option('-c', '--concurrency', default=4, show_default=True, help='Requests in flight per server.')
+@click.option('-w', '--workers', default=1, show_default=True, help='Worker processes for --corpus.')
+@click.option('--seed', type=int, help='Seed for reproducible requests. Random if not set.')
+@click.option('--compression', type=click.Choice(('none', 'gzip', 'zstd')), default='none', show_default=True,
+              help='Compression of the JSON Lines results.')
+@click.option('-o', '--output', type=click.Path(dir_okay=False), help='Results file. Named by time and template if '
+                                                                     'not set.')
+@click.option('--stable-cache', type=click.Path(dir_okay=False),
+              help='Response cache of the stable server, see orsdev.cache.')
+@click.option('--replay', is_flag=True, help='Only serve the stable server from --stable-cache.')
+@click.option('-f', '--format', 'fmt', type=click.Choice(('text', 'json')), default='text', show_default=True)
+@click.option('--key', help='API key, only needed for the ORS API.')
+@_add_options(metrics_options)
+@click.option('--profile', type=click.Path(dir_okay=False),
+              help='File to write samples of the generator\'s call stacks to, as collapsed stacks for flame graphs.')
+def dev_test(template, endpoint, stable, dev, geojson, corpus, cycles, method, concurrency, workers, seed,
+             compression, output, stable_cache, replay, fmt, key, metrics_file, metrics_port, profile):
+    """Compares the responses of a stable and a dev server."""
+    compression = None if compression == 'none' else compression
+    if bool(geojson) == bool(corpus):
+        raise click.UsageError("Pass either --geojson or --corpus.")
+    if method == 'performance' and (corpus or stable_cache):
+        raise click.UsageError("--method performance needs both live servers and only works with --geojson.")
+    if corpus and (profile or metrics_file or metrics_port):
+        raise click.UsageError("--profile, --metrics and --metrics-port only work with --geojson.")
+    _start_metrics(metrics_file, metrics_port)
+
+    if corpus:
+        from orsdev.distributed import Coordinator
+        from orsdev.results import ResultWriter, SUFFIXES
+        from orsdev.corpus import RequestCorpus
+
+        if stable_cache:
+            raise click.UsageError("--stable-cache only works with --geojson.")
+        output = output or '{}.results.jsonl{}'.format(corpus, SUFFIXES[compression])
+        template_dict = _load_template(template)
+        with Coordinator(corpus, workers=workers) as coordinator:
+            report = coordinator.dev_test(stable, dev, template_dict['endpoints'][coordinator.endpoint]['methods'],
+                                          method=method, key=key, concurrency=concurrency,
+                                          error_handler=template_dict.get('error_handler'))
+
+        # rows are ordered by corpus index
+        changes = OrderedDict()
+        for idx, path, change in report.pop('rows'):
+            changes.setdefault(idx, []).append((path, change))
+
+        requests = RequestCorpus(corpus)
+        meta = dict(requests.meta, method=method, stable=stable, dev=dev)
+        with ResultWriter(output, meta, compression) as writer:
+            for idx, cycle_changes in changes.items():
+                writer.write_cycle(idx, requests[idx], cycle_changes)
+        requests.close()
+        report['changed_cycles'] = len(changes)
+    else:
+        import openrouteservice as ors
+        from orsdev.cache import ResponseCache, CachingClient
+        from orsdev.processors.processor_ors import ORSprocessor
+
+        processor = ORSprocessor(endpoint, template, geojson, cycles=cycles, seed=seed, compression=compression)
+        if output:
+            processor.filename = output
+        output = processor.filename
+        if stable_cache:
+            client_stable = CachingClient(ResponseCache(stable_cache), replay=replay, base_url=stable, key=key)
+        elif replay:
+            raise click.UsageError("--replay needs --stable-cache.")
+        else:
+            client_stable = ors.Client(base_url=stable, key=key)
+        if profile:
+            from orsdev.metrics import SamplingProfiler
+
+            processor.requester.profiler = SamplingProfiler()
+        processor.dev_test(client_stable, ors.Client(base_url=dev, key=key), method=method, concurrency=concurrency)
+        if profile:
+            processor.requester.profiler.stop()
+            processor.requester.profiler.write(profile)
+        report = {'requests': cycles, 'errors': dict(processor.retry_policy.errors)}
+        if processor.performance is not None:
+            report['performance'] = processor.performance
+
+    report['output'] = output
+    _echo(report, fmt)
+    if any(group['regression'] for group in report.get('performance', {}).values()):
+        click.get_current_context().exit(1)
+
+
+@main.command()
+@click.argument('corpus', type=click.Path(exists=True, dir_okay=False))
+@click.option('--host', required=True, help='URL of the server to load.')
+@click.option('-r', '--rps', default=10.0, show_default=True, help='Requests per second, at the start for ramps.')
+@click.option('--end-rps', type=float, help='Requests per second at the end, i.e. a linear ramp.')
+@click.option('-d', '--duration', default=60.0, show_default=True, help='Duration in seconds.')
+@click.option('--poisson', is_flag=True, help='Poisson instead of evenly spaced arrivals.')
+@click.option('--seed', type=int, help='Seed of the Poisson arrivals.')
+@click.option('-c', '--concurrency', default=1000, show_default=True, help='Maximum open connections per process.')
+@click.option('-w', '--workers', default=1, show_default=True,
+              help='Worker processes, sharing the rate. More than 1 runs the corpus once at constant rate.')
+@click.option('-o', '--output', type=click.Path(dir_okay=False), help='CSV file for the timings of every request.')
+@click.option('-f', '--format', 'fmt', type=click.Choice(('text', 'json')), default='text', show_default=True)
+@click.option('--key', help='API key, only needed for the ORS API.')
+@_add_options(metrics_options)
+def load(corpus, host, rps, end_rps, duration, poisson, seed, concurrency, workers, output, fmt, key, metrics_file,
+         metrics_port):
+    """Sends a corpus to a server on an open-loop schedule."""
+    if workers > 1 and (metrics_file or metrics_port):
+        raise click.UsageError("--metrics and --metrics-port only work with a single worker.")
+    _start_metrics(metrics_file, metrics_port)
+    if workers > 1:
+        from orsdev.distributed import Coordinator
+
+        if end_rps or poisson or output:
+            raise click.UsageError("--end-rps, --poisson and --output only work with a single worker.")
+        with Coordinator(corpus, workers=workers) as coordinator:
+            summary = coordinator.load(host, rps, key=key, pool_size=concurrency)
+    else:
+        from orsdev.client import AsyncClient
+        from orsdev.corpus import RequestCorpus
+        from orsdev.loadgen import OpenLoopRunner, constant_schedule, ramp_schedule, poisson_schedule
+
+        if poisson:
+            schedule = poisson_schedule(rps, duration, seed=seed)
+        elif end_rps is not None:
+            schedule = ramp_schedule(rps, end_rps, duration)
+        else:
+            schedule = constant_schedule(rps, duration)
+
+        requests = RequestCorpus(corpus)
+        client = AsyncClient(host, key=key, pool_size=concurrency)
+        result = OpenLoopRunner(client, requests.endpoint, requests, schedule).run()
+        requests.close()
+
+        if output:
+            result.write(output)
+        summary = result.summary()
+        summary['complexity'] = result.complexity().report()
+
+    _echo(summary, fmt)
+
+
+@main.command()
+@click.argument('results', type=click.Path(exists=True, dir_okay=False))
+@click.option('-f', '--format', 'fmt', type=click.Choice(('text', 'json')), default='text', show_default=True)
+@click.option('--top', default=10, show_default=True, help='Amount of most frequently changed keys to list.')
+def report(results, fmt, top):
+    """Summarizes the results of a dev test."""
+    from collections import Counter
+    from orsdev.results import read_results
+
+    meta, params, changes = read_results(results)
+    keys = Counter(key for _, key, _ in changes)
+
+    summary = dict(meta)
+    summary['changed_cycles'] = len(params)
+    summary['changes'] = len(changes)
+    summary['top_keys'] = keys.most_common(top)
+    _echo(summary, fmt)
+
+
+@main.command('fake-server')
+@click.option('--host', default='localhost', show_default=True, help='Interface to listen on.')
+@click.option('--port', default=8080, show_default=True)
+@click.option('-p', '--processes', default=1, show_default=True, help='Server processes sharing the port.')
+@click.option('--median', default=20.0, show_default=True, help='Median base latency in ms.')
+@click.option('--sigma', default=0.5, show_default=True, help='Lognormal spread of the base latency, 0 for constant.')
+@click.option('--per-size', default=0.0, show_default=True, help='Milliseconds per unit of problem size.')
+@click.option('--exponent', default=1.0, show_default=True, help='How the latency scales with the problem size.')
+@click.option('--error-rate', default=0.0, show_default=True, help='Share of requests answered with a 400.')
+@click.option('--server-error-rate', default=0.0, show_default=True, help='Share of requests answered with a 500.')
+@click.option('-c', '--max-concurrency', type=int, help='Requests processed at once per process. No limit if not set.')
+@click.option('--max-queue', type=int, help='Requests waiting per process before answering 503. No limit if not set.')
+@click.option('--seed', type=int, help='Seed for reproducible latencies and errors.')
+def fake_server(host, port, processes, median, sigma, per_size, exponent, error_rate, server_error_rate,
+                max_concurrency, max_queue, seed):
+    """Serves ORS-shaped responses with a configurable latency, to benchmark the harness."""
+    import numpy as np
+    from orsdev.fake import serve
+
+    # independent streams for errors and latencies, the same seed would draw them in lockstep
+    seed, latency_seed = np.random.SeedSequence(seed).spawn(2)
+
+    click.echo("Serving on http://{}:{}".format(host, port))
+    serve(host, port, processes=processes, error_rate=error_rate, server_error_rate=server_error_rate,
+          max_concurrency=max_concurrency, max_queue=max_queue, seed=seed, latency_median=median, latency_sigma=sigma,
+          latency_per_size=per_size, latency_exponent=exponent, latency_seed=latency_seed)
 
 
 if __name__ == '__main__':
@@ -1,15 +1,17 @@
-from orsdev import generator
-
-import openrouteservice as ors
+from orsdev import generator, diff, metrics
+from orsdev.stats import compare_latencies, request_name
+from orsdev.cache import CachingClient
+from orsdev.results import ResultWriter, SUFFIXES
+from orsdev.retry import RetryPolicy, CircuitBreaker
 
+from collections import defaultdict
 from os import path
-import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import time
-import csv
 import logging
 import json
 import yaml
-import dictdiffer
+import numpy as np
 
 logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s',
                     datefmt='%Y-%m-%d %H:%M',
@@ -18,6 +20,14 @@ logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s',
                     filemode='w')
 logger = logging.getLogger(__name__)
 
+# Cycles per concurrent request which may be compared ahead of the oldest cycle not yet written
+REORDER_WINDOW = 16
+
+
+def _base_url(client):
+    """The server URL of an ors-py client, which keeps it private in recent versions."""
+    return getattr(client, 'base_url', None) or client._base_url
+
 
 class ORSprocessor(object):
 
@@ -25,7 +35,9 @@ class ORSprocessor(object):
                  endpoint,
                  template,
                  geojson,
-                 cycles=100):
+                 cycles=100,
+                 seed=None,
+                 compression=None):
         """
         Initializes a processing client to request dev or load testing.
 
@@ -40,6 +52,12 @@ class ORSprocessor(object):
 
         :param cycles: how many requests should be generated.
         :type cycles: int
+
+        :param seed: Seed to reproduce the generated requests of an earlier run. Random if None, the used seed is logged.
+        :type seed: int
+
+        :param compression: Compression of the JSON Lines results, one of None, 'gzip' or 'zstd'.
+        :type compression: str
         """
 
         if not template.endswith('.yaml'):
@@ -48,121 +66,223 @@ class ORSprocessor(object):
         with open(path.realpath(template)) as f:
             template_dict = yaml.safe_load(f)
             self._endpoint_dict = template_dict['endpoints'][endpoint]
-            self.error_rules = template_dict['error_handler']['errors']
-            self.apierrors = 0
-            self.jsonerrors = 0
-            self.error_breaker = 0
+            self._error_handler = template_dict['error_handler']
+            self.error_rules = self._error_handler['errors']
+            self.retry_policy = RetryPolicy.from_config(self._error_handler)
 
         self._endpoint = endpoint
         self._cycles = cycles
         self.cycle = None
+        # Report of the performance method by endpoint/profile, see orsdev.stats.compare_latencies()
+        self.performance = None
 
-        self.requester = generator.ORSGenerator(endpoint, template_dict, geojson)
-        self.params = dict()
+        self.seed = np.random.SeedSequence(seed)
+        self.requester = generator.ORSGenerator(endpoint, template_dict, geojson, seed=self.seed)
 
-        self.out = list()
-        self.filename = "{}_{}.csv".format(time.strftime('%Y%m%d-%H%M'), template.split('/')[-1])
+        self.compression = compression
+        self.filename = "{}_{}.jsonl{}".format(time.strftime('%Y%m%d-%H%M'),
+                                               template.split('/')[-1],
+                                               SUFFIXES[compression])
 
     def dev_test(self,
                  client_stable,
                  client_dev,
-                 method="differ"):
+                 method="differ",
+                 concurrency=4):
         """
         Constructs tests for dev purposes.
 
-        :param client_stable: ors-py client with base_url pointing to server to test against.
+        Requests are pipelined: up to concurrency requests are in flight against both servers at once. Responses are
+        compared as soon as both arrived, a retried cycle keeps its number, and the results are written in the order of
+        the cycles.
+
+        :param client_stable: ors-py client with base_url pointing to server to test against. Use a
+            orsdev.cache.CachingClient to record its responses once and replay them in later runs with the same seed.
         :type client_stable: openrouteservice.Client()
 
         :param client_dev: ors-py client with base_url pointing to server to test from.
         :type client_dev: openrouteservice.Client()
 
-        :param method: What needs to be done. One of ["differ"].
+        :param method: What needs to be done. One of ["differ", "semantic", "performance"]. "differ" reports every
+            difference of the lookup keys in the template, "semantic" only differences crossing the template's
+            thresholds, e.g. routes with deviating distance or geometry. "performance" compares the latencies instead:
+            both servers get each request right after each other, in random order, and the speed ratios per
+            endpoint/profile end up in self.performance. Cycles where dev is slower than the template's threshold are
+            written as changes. Use concurrency=1 for the least noise.
+
+        :param concurrency: How many requests are in flight per server.
+        :type concurrency: int
 
         :return:
         """
 
         clients = (client_stable, client_dev)
 
-        logger.info("Starting testing on\nStable server: {}\nDev Server: {}".format(*map(lambda x: x.base_url, clients)))
-
-        if method == 'differ':
-            self.out.append(("Cycle", "Key", "Change (Stable to Dev)", "Parameters"))
-
-        pool = multiprocessing.Pool(2)
-        for self.cycle in range(self._cycles):
-            self.error_breaker = 0
-            self._call_function(pool, clients, method)
-            if self.cycle % (self._cycles / 10) == 0:
-                logger.info("{} requests processed.".format(self.cycle + 1))
-                self._write_results(method)
-        logger.info("Testing finished!\nCycles: {}\nApiErrors: {}\nJSONDecodeErrors:{}".format(self._cycles,
-                                                                                               self.apierrors,
-                                                                                               self.jsonerrors))
-
-    def _write_results(self, method):
-        with open(self.filename, 'a+') as f:
-            writer = csv.writer(f, delimiter=',')
-            writer.writerows(self.out)
-            self.out = list()
-
-    def _call_function(self, pool, clients, method="differ"):
+        logger.info("Starting testing on\nStable server: {}\nDev Server: {}".format(*map(_base_url, clients)))
+        logger.info("Seed: {}".format(self.seed.entropy))
+
+        if method not in ('differ', 'semantic', 'performance'):
+            raise ValueError("{} is not a valid method.".format(method))
+        paired = method == 'performance'
+        performance = self._endpoint_dict['methods'].get('performance') or dict()
+        threshold = performance.get('threshold', 0.05)
+        warmup = performance.get('warmup', 0)
+        # Which server gets a request first is drawn from the seed as well
+        self._order_rng = np.random.default_rng(self.seed.spawn(1)[0])
+        latencies = defaultdict(list)
+
+        meta = {'endpoint': self._endpoint,
+                'method': method,
+                'cycles': self._cycles,
+                'seed': self.seed.entropy,
+                'stable': _base_url(clients[0]),
+                'dev': _base_url(clients[1])}
+
+        breakers = [CircuitBreaker(_base_url(client), **self._error_handler.get('circuit_breaker', dict()))
+                    for client in clients]
+
+        # Holds (cycle, params, futures, attempt) of requests in flight. Cycles are compared as soon as both responses
+        # arrived, so a cycle waiting for its retry doesn't hold up the others.
+        in_flight = []
+        # Compared cycles by cycle, (params, changes), until the cycles before them are written. Bounded, so a cycle
+        # retried over and over doesn't let the buffer grow with the whole run.
+        finished = dict()
+        max_finished = REORDER_WINDOW * concurrency
+        cycles = iter(range(self._cycles))
+        processed = 0
+        with ThreadPoolExecutor(max_workers=2 * concurrency) as executor, \
+                ResultWriter(self.filename, meta, self.compression) as writer:
+            while True:
+                # Keep the pipeline filled
+                while len(in_flight) < concurrency and len(finished) < max_finished:
+                    cycle = next(cycles, None)
+                    if cycle is None:
+                        break
+                    in_flight.append(self._submit(executor, clients, breakers, cycle, paired=paired))
+                if not in_flight:
+                    break
+
+                wait([future for _, _, futures, _ in in_flight for future in futures], return_when=FIRST_COMPLETED)
+                for item in [item for item in in_flight if all(future.done() for future in item[2])]:
+                    in_flight.remove(item)
+                    self.cycle, params, futures, attempt = item
+                    try:
+                        results = futures[0].result() if paired else [future.result() for future in futures]
+                        if paired:
+                            changes = []
+                            if self.cycle >= warmup:
+                                stable, dev = [seconds for _, seconds in results]
+                                latencies[request_name(self._endpoint, params)].append((stable, dev))
+                                if dev > (1 + threshold) * stable:
+                                    changes.append(('latency', "Stable: {:.4f} s\n\nDev: {:.4f} s".format(stable, dev)))
+                        else:
+                            with metrics.REGISTRY.stage('diff', endpoint=self._endpoint, method=method):
+                                changes = self._call_function(method, params, [response for response, _ in results])
+                    except Exception as e:
+                        delay = self.retry_policy.handle(e, attempt)
+                        # Retry the cycle with new parameters
+                        in_flight.append(self._submit(executor, clients, breakers, self.cycle, attempt + 1, delay,
+                                                      paired))
+                        continue
+
+                    finished[self.cycle] = (params, changes)
+                    while processed in finished:
+                        writer.write_cycle(processed, *finished.pop(processed))
+                        processed += 1
+                        if processed % max(self._cycles // 10, 1) == 0:
+                            logger.info("{} requests processed.".format(processed))
+
+        logger.info("Testing finished!\nCycles: {}\nErrors: {}".format(self._cycles,
+                                                                       dict(self.retry_policy.errors)))
+        if paired:
+            self.performance = self._compare_performance(latencies, performance, threshold)
+        if self.requester.acceptance_rate is not None:
+            logger.info("Coordinate acceptance rate: {:.1%}".format(self.requester.acceptance_rate))
+        for client in clients:
+            if isinstance(client, CachingClient):
+                logger.info("Response cache of {}: {} hits, {} misses".format(_base_url(client),
+                                                                              client.hits,
+                                                                              client.misses))
+
+    def _submit(self, executor, clients, breakers, cycle, attempt=0, delay=0, paired=False):
         """
-        Wrapper to call different functions. This is necessary to be able to call itself again upon error.
+        Generates new parameters and requests them from all clients.
 
-        :param pool:
-        :param clients:
-        :param method:
-        :return:
+        :param delay: Seconds to wait before requesting, i.e. the backoff of a retry.
+        :param paired: Whether to request the clients one after the other in random order, in a single future, instead
+            of at the same time.
+        :return: The cycle, its parameters, the futures of the (response, seconds) results and the attempt.
+        :rtype: tuple
         """
-        logger.debug("Starting cycle {}..".format(self.cycle))
-        try:
-            if method == "differ":
-                # Get a new set of parameters
-                self._get_request_parameters()
-                lookups = []  # Initialize values so it can't be empty if pool.map fails with an exception
-                lookups = pool.map(self._compare, clients)
-                # if no element was found, raise error
-                if not lookups:
-                    raise KeyError("Method {} doesn't have valid lookup keys for endpoint {}".format(method,
-                                                                                                     self._endpoint))
-
-                assert lookups[0].keys() == lookups[1].keys()
-                for lookup_key in lookups[0].keys():
-                    collection = list(dictdiffer.diff(lookups[0][lookup_key],
-                                                      lookups[1][lookup_key],
-                                                      tolerance=0.0001,
-                                                      expand=True))
-                    if collection:
-                        for diff in collection:
-                            changeset = diff[0]
-                            if changeset in ('remove', 'add'):
-                                for change in diff[2]:
-                                    change_text = "{} --> {}: {}".format(changeset, *change)
-
-                            if changeset == 'change':
-                                change_text = "Stable: {}\n\nDev: {}".format(*diff[2])
-                            self.out.append((self.cycle, lookup_key, change_text, self.params))
-            else:
-                raise ValueError("{} is not a valid method.".format(method))
-        except Exception as e:
-            # Follow the rules set up in yaml
-            if self.error_breaker > 50:
-                raise Exception("More than 50 exceptions raised consecutively. Check log and change the config.yaml")
-            self.error_breaker += 1
+        logger.debug("Starting cycle {}..".format(cycle))
+        params = self._get_request_parameters()
+        if paired:
+            futures = [executor.submit(self._request_pair, clients, breakers, params, cycle, delay,
+                                       bool(self._order_rng.integers(2)))]
+        else:
+            futures = [executor.submit(self._request, client, breaker, params, cycle, delay)
+                       for client, breaker in zip(clients, breakers)]
 
-            error_name = e.__class__.__name__
-            if error_name == 'JSONDecodeError':
-                self.jsonerrors += 1
-            elif error_name == 'ApiError':
-                self.apierrors += 1
-            rule = self.error_rules.get(error_name, None)
-            if rule in ('skip', 'log') and error_name in self.error_rules.keys():
-                self._call_function(pool, clients, method)
-            else:
-                raise e
-
-    def _compare(self, client):
+        return cycle, params, futures, attempt
+
+    def _compare_performance(self, latencies, performance, threshold):
+        """
+        Compares the paired latencies per endpoint/profile, see orsdev.stats.compare_latencies(). A group regressed if
+        the lower bound of its ratio's confidence interval exceeds 1 + threshold, i.e. dev is significantly slower.
+
+        :return: The comparison per endpoint/profile, with 'regression'.
+        :rtype: dict
+        """
+        report = dict()
+        for name in sorted(latencies):
+            stable, dev = zip(*latencies[name])
+            report[name] = compare_latencies(stable, dev,
+                                             confidence=performance.get('confidence', 0.95),
+                                             resamples=performance.get('resamples', 2000),
+                                             seed=self.seed.entropy)
+            report[name]['regression'] = report[name]['ratio_low'] > 1 + threshold
+            logger.info("{}: dev/stable latency {:.3f} [{:.3f}, {:.3f}] over {} requests{}".format(
+                name, report[name]['ratio'], report[name]['ratio_low'], report[name]['ratio_high'],
+                report[name]['requests'], ", REGRESSION" if report[name]['regression'] else ""))
+        return report
+
+    def _call_function(self, method, params, responses):
+        """
+        Wrapper to call different functions on the responses of one cycle.
+
+        :param method: One of ["differ", "semantic"].
+        :param params: The request parameters of the cycle.
+        :param responses: The responses of the stable and the dev server.
+        :return: The (key, change text) pairs.
+        :rtype: list of tuple
+        """
+        return list(diff.compare_responses(self._endpoint,
+                                           self._endpoint_dict['methods'],
+                                           method,
+                                           responses,
+                                           is3d=bool(params.get('elevation'))))
+
+    @property
+    def apierrors(self):
+        return self.retry_policy.errors['ApiError']
 
+    @property
+    def jsonerrors(self):
+        return self.retry_policy.errors['JSONDecodeError']
+
+    def _request(self, client, breaker, params, cycle, delay=0):
+        """
+        Requests the endpoint from one server. Runs in a worker thread, waits for the backoff and while the server's
+        circuit is open.
+
+        :param client: ors-py client of the server.
+        :param breaker: Circuit breaker of the server.
+        :param params: The request parameters.
+        :param cycle: The cycle the request belongs to.
+        :param delay: Seconds to wait before requesting.
+        :return: The response and the seconds it took.
+        :rtype: tuple
+        """
         if self._endpoint == 'directions':
             client_func = client.directions
         elif self._endpoint == 'isochrones':
@@ -171,44 +291,47 @@ class ORSprocessor(object):
             client_func = client.distance_matrix
         else:
             raise ValueError("{} not a valid endpoint".format(self._endpoint))
+        if delay:
+            time.sleep(delay)
+        breaker.wait()
         # Make actual request and log errors which don't have skip config.yaml values
+        server = _base_url(client)
+        metrics.REGISTRY.count('requests', server=server)
         try:
-            resp = client_func(**self.params, validate=False)
+            # ors-py parses the response, so this is waiting for the server and parsing
+            with metrics.REGISTRY.stage('request', endpoint=self._endpoint, server=server):
+                start = time.perf_counter()
+                response = client_func(**params, validate=False)
+                seconds = time.perf_counter() - start
         except Exception as e:
+            breaker.record(e)
             error_name = e.__class__.__name__
-            if client.req.body:
-                params = json.dumps(json.loads(client.req.body))
-            else:
-                params = client.req.url
-            if self.error_rules.get(error_name) not in ("skip", "raise"):
-                logger.error("Cycle {}:\n{} threw a {}: {}\nURL: {}\nParams: {}".format(self.cycle,
-                                                                                        client.base_url,
-                                                                                        e.__class__.__name__,
-                                                                                        e,
-                                                                                        client.req.url,
-                                                                                        params))
+            metrics.REGISTRY.count('errors', server=server, error=error_name)
+            if self.retry_policy.should_log(e):
+                logger.error("Cycle {}:\n{} threw a {}: {}\nParams: {}".format(cycle,
+                                                                               _base_url(client),
+                                                                               error_name,
+                                                                               e,
+                                                                               json.dumps(params)))
             raise e
+        breaker.record()
+        return response, seconds
 
-        # Compare lookup keys defined in config.yaml
-        # Continue with next key if lookup key doesn't exist (ref. json vs. geojson)
-        values = dict()
-        for lookup in self._endpoint_dict['methods']['differ']:
-            try:
-                values[lookup] = dictdiffer.dot_lookup(resp, lookup)
-            except (KeyError, IndexError):
-                continue
-        return values
+    def _request_pair(self, clients, breakers, params, cycle, delay=0, reverse=False):
+        """
+        Requests the endpoint from both servers right after each other, so neither gets an advantage from warmer caches
+        or a quieter moment.
+
+        :param reverse: Whether to request the dev server first.
+        :return: The (response, seconds) results, in the order of the clients.
+        :rtype: list of tuple
+        """
+        results = [None] * len(clients)
+        for idx in (reversed(range(len(clients))) if reverse else range(len(clients))):
+            results[idx] = self._request(clients[idx], breakers[idx], params, cycle, delay)
+            delay = 0
+        return results
 
     def _get_request_parameters(self):
-        self.params = self.requester.create_requests()
-
-
-if __name__ == "__main__":
-    dev_clnt = ors.Client(base_url='http://129.206.5.136:8080/ors', timeout=120)
-    test = ORSprocessor('matrix',
-                     '../templates/openrouteservice_isochrones_matrix.yaml',
-                     '../../geojson/regbez_karlsruhe.geojson',
-                     300)
-    test.dev_test(
-                 dev_clnt)
-    # test.create_parameters()
\ No newline at end of file
+        return self.requester.create_requests()
+
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import queue
+import threading
+
+from orsdev import metrics
+from orsdev.corpus import serialize_params
+
+# File suffix per compression
+SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+def _open(filename, mode, compression):
+    if compression is None:
+        return open(filename, mode)
+    elif compression == 'gzip':
+        return gzip.open(filename, mode)
+    elif compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd compression needs the zstandard package.")
+        return zstandard.open(filename, mode)
+    raise ValueError("{} is not a valid compression, use one of {}".format(compression, list(SUFFIXES)))
+
+
+def _compression(filename):
+    for compression, suffix in SUFFIXES.items():
+        if suffix and filename.endswith(suffix):
+            return compression
+    return None
+
+
+class ResultWriter(object):
+
+    def __init__(self,
+                 filename,
+                 meta=None,
+                 compression=None,
+                 max_buffer=1000):
+        """
+        Streams the results of a dev test as JSON Lines from a background thread, so the request loop never waits for
+        the disk. The first line holds the metadata, followed per cycle with changes by one line with its parameters,
+        {"cycle": ..., "params": ...}, and one line per change referencing it, {"cycle": ..., "key": ..., "change": ...}.
+
+        Use as context manager or call close() when done.
+
+        :param filename: Path of the output file. Should end with the compression's suffix, see SUFFIXES.
+        :type filename: str
+
+        :param meta: Metadata of the run, e.g. endpoint and seed.
+        :type meta: dict
+
+        :param compression: One of None, 'gzip' or 'zstd'.
+        :type compression: str
+
+        :param max_buffer: How many cycles may wait to be written, before write_cycle() blocks.
+        :type max_buffer: int
+        """
+        self.filename = filename
+        self._file = _open(filename, 'wt', compression)
+        self._file.write(json.dumps(meta or {}) + '\n')
+
+        self._queue = queue.Queue(max_buffer)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write_cycle(self, cycle, params, changes):
+        """
+        Queues the results of a cycle to be written. Cycles without changes are dropped.
+
+        :param cycle: The cycle.
+        :type cycle: int
+
+        :param params: The cycle's request parameters. Must not be modified afterwards.
+        :type params: dict
+
+        :param changes: The (key, change text) pairs of the cycle.
+        :type changes: list of tuple
+        """
+        if self._error is not None:
+            raise self._error
+        if changes:
+            self._queue.put((cycle, params, changes))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                # keep draining, so write_cycle() doesn't block forever
+                continue
+            cycle, params, changes = item
+            try:
+                with metrics.REGISTRY.stage('write'):
+                    lines = [json.dumps({'cycle': cycle, 'params': serialize_params(params)}, separators=(',', ':'))]
+                    lines.extend(json.dumps({'cycle': cycle, 'key': key, 'change': change}, separators=(',', ':'))
+                                 for key, change in changes)
+                    self._file.write('\n'.join(lines) + '\n')
+            except Exception as e:
+                self._error = e
+
+    def close(self):
+        """Writes all queued cycles and closes the file. Raises errors of the background thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+            self._file.close()
+        if self._error is not None:
+            raise self._error
+
+
+def read_results(filename):
+    """
+    Reads the results written by a ResultWriter, the compression is inferred from the file suffix.
+
+    :param filename: Path of the results file.
+    :type filename: str
+
+    :return: The metadata, the parameters by cycle and the (cycle, key, change text) rows.
+    :rtype: tuple of (dict, dict, list)
+    """
+    params, changes = dict(), list()
+    with _open(filename, 'rt', _compression(filename)) as f:
+        meta = json.loads(f.readline())
+        for line in f:
+            record = json.loads(line)
+            if 'params' in record:
+                params[record['cycle']] = record['params']
+            else:
+                changes.append((record['cycle'], record['key'], record['change']))
+
+    return meta, params, changes
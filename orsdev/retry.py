@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+import logging
+import random
+import threading
+import time
+
+from openrouteservice import exceptions
+
+from orsdev.cache import CacheMiss
+
+logger = logging.getLogger(__name__)
+
+
+def is_server_fault(e):
+    """
+    Whether an exception of a request hints at a struggling server, i.e. timeouts, connection and server errors or
+    rate limiting, rather than an invalid request.
+
+    :param e: The exception.
+    :type e: Exception
+
+    :rtype: bool
+    """
+    if isinstance(e, exceptions.ApiError):
+        return e.status == 429 or e.status >= 500
+    return not isinstance(e, (exceptions.ValidationError, CacheMiss))
+
+
+class CircuitBreaker(object):
+
+    def __init__(self,
+                 name,
+                 failures=10,
+                 reset=30):
+        """
+        Pauses all requests to a server after consecutive server faults (see is_server_fault()). After reset seconds a
+        single request probes the server, on success requests continue, on failure the pause starts over.
+
+        Safe to share between threads.
+
+        :param name: Name of the server for logging, e.g. its URL.
+        :type name: str
+
+        :param failures: Consecutive server faults to open the circuit, i.e. pause requests.
+        :type failures: int
+
+        :param reset: Seconds to pause before probing.
+        :type reset: float
+        """
+        self.name = name
+        self.failures = failures
+        self.reset = reset
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened = None
+        self._probing = False
+
+    @property
+    def is_open(self):
+        return self._opened is not None
+
+    def wait(self):
+        """Blocks the calling thread while the circuit is open, except for the one probing request."""
+        while True:
+            with self._lock:
+                if self._opened is None:
+                    return
+                remaining = self._opened + self.reset - time.monotonic()
+                if remaining <= 0 and not self._probing:
+                    self._probing = True
+                    return
+            time.sleep(max(remaining, 0.1))
+
+    def record(self, e=None):
+        """
+        Records the outcome of a request.
+
+        :param e: The exception raised by the request, None if successful.
+        :type e: Exception
+        """
+        with self._lock:
+            if e is None or not is_server_fault(e):
+                if self._opened is not None:
+                    logger.info("Circuit of {} closed again.".format(self.name))
+                self._consecutive = 0
+                self._opened = None
+                self._probing = False
+                return
+
+            self._consecutive += 1
+            if self._probing or (self._opened is None and self._consecutive >= self.failures):
+                logger.warning("Circuit of {} opened after {} consecutive {}, pausing for {} s.".format(
+                    self.name, self._consecutive, e.__class__.__name__, self.reset))
+                self._opened = time.monotonic()
+                self._probing = False
+
+
+class RetryPolicy(object):
+
+    def __init__(self,
+                 rules,
+                 max_attempts=50,
+                 backoff=0.5,
+                 max_backoff=30,
+                 budgets=None):
+        """
+        Decides what happens to a cycle raising an exception, following the rules of a template's error_handler: the
+        exception is raised, or the cycle is retried (and the error logged or skipped). Server faults (see
+        is_server_fault()) are retried after an exponential backoff with full jitter, invalid requests right away.
+
+        Counts the errors of every exception class in errors.
+
+        :param rules: Rule per exception class name, one of 'raise', 'log', 'skip'. Unknown exceptions are raised.
+        :type rules: dict
+
+        :param max_attempts: Consecutive failures of one cycle to give up after.
+        :type max_attempts: int
+
+        :param backoff: Backoff of the first retry in seconds, doubled with every further attempt.
+        :type backoff: float
+
+        :param max_backoff: Upper bound of the backoff in seconds.
+        :type max_backoff: float
+
+        :param budgets: Maximum errors per exception class name in a whole run to give up after.
+        :type budgets: dict
+        """
+        self.rules = rules
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budgets = budgets or dict()
+        self.errors = Counter()
+
+    @classmethod
+    def from_config(cls, error_handler):
+        """
+        :param error_handler: The error_handler section of a template, with the rules in 'errors' and the optional
+            settings in 'retry'.
+        :type error_handler: dict
+
+        :rtype: RetryPolicy
+        """
+        return cls(error_handler['errors'], **error_handler.get('retry', dict()))
+
+    def should_log(self, e):
+        """Whether a request's exception should be logged."""
+        return self.rules.get(e.__class__.__name__) not in ('skip', 'raise')
+
+    def handle(self, e, attempt):
+        """
+        Counts the exception and re-raises it, unless the cycle is to be retried.
+
+        :param e: The exception raised in a cycle.
+        :type e: Exception
+
+        :param attempt: How many times the cycle failed before.
+        :type attempt: int
+
+        :return: Seconds to wait before retrying.
+        :rtype: float
+        """
+        error_name = e.__class__.__name__
+        self.errors[error_name] += 1
+
+        if self.rules.get(error_name) not in ('skip', 'log'):
+            raise e
+        if attempt >= self.max_attempts:
+            raise Exception("More than {} exceptions raised consecutively. "
+                            "Check log and change the config.yaml".format(self.max_attempts))
+        if error_name in self.budgets and self.errors[error_name] > self.budgets[error_name]:
+            raise Exception("More than {} {} raised. Check log and change the config.yaml".format(
+                self.budgets[error_name], error_name))
+
+        if not is_server_fault(e):
+            return 0
+        return random.uniform(0, min(self.backoff * 2 ** attempt, self.max_backoff))
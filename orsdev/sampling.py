@@ -0,0 +1,683 @@
+# -*- coding: utf-8 -*-
+
+from os import path, makedirs, replace, getpid
+import numpy as np
+
+try:
+    # shapely >= 2.0 ships vectorized predicates at top level
+    from shapely import contains_xy, prepare
+except ImportError:
+    from shapely.vectorized import contains as contains_xy
+    prepare = None
+
+try:
+    # shapely >= 2.1
+    from shapely import constrained_delaunay_triangles, get_coordinates
+except ImportError:
+    constrained_delaunay_triangles = None
+
+
+def _save(filename, array):
+    """Saves an array as .npy, written aside and moved in place, so concurrent readers never see a partial file."""
+    tmp_file = '{}.{}.tmp'.format(filename, getpid())
+    with open(tmp_file, 'wb') as f:
+        np.save(f, array)
+    replace(tmp_file, filename)
+
+
+class BoundingBoxSampler(object):
+
+    def __init__(self,
+                 polygon,
+                 batch_size=256):
+        """
+        Draws uniformly distributed candidate coordinates within a (Multi)Polygon by rejection sampling
+        in its bounding box. Candidates are drawn and tested in batches as NumPy arrays against a prepared
+        geometry.
+
+        :param polygon: The geometry to sample from.
+        :type polygon: shapely.geometry.Polygon or shapely.geometry.MultiPolygon
+
+        :param batch_size: How many candidates are drawn from the bounding box at once.
+        :type batch_size: int
+        """
+        self.polygon = polygon
+        if prepare is not None:
+            prepare(self.polygon)
+        self.minx, self.miny, self.maxx, self.maxy = polygon.bounds
+        self.batch_size = batch_size
+
+    def draw(self, rng, size=None):
+        """
+        Draws a batch of candidates from the bounding box and keeps the ones within the polygon.
+
+        :param rng: The random generator to draw with.
+        :type rng: numpy.random.Generator
+
+        :param size: Amount of candidates to draw. Defaults to self.batch_size.
+        :type size: int
+
+        :return: The candidates within the polygon as (k, 2) array and the amount of drawn candidates.
+        :rtype: tuple of (numpy.ndarray, int)
+        """
+        size = size or self.batch_size
+        x = rng.uniform(self.minx, self.maxx, size)
+        y = rng.uniform(self.miny, self.maxy, size)
+        mask = contains_xy(self.polygon, x, y)
+
+        return np.column_stack((x[mask], y[mask])), size
+
+
+class TriangulationSampler(object):
+
+    def __init__(self,
+                 polygon,
+                 batch_size=256,
+                 cache_key=None,
+                 cache_dir=None):
+        """
+        Draws uniformly distributed coordinates directly within a (Multi)Polygon. The polygon is triangulated once
+        and points are drawn from triangles weighted by their area, so no candidate is ever rejected. Suited for thin
+        or fragmented polygons where bounding box rejection hardly accepts any candidate.
+
+        :param polygon: The geometry to sample from.
+        :type polygon: shapely.geometry.Polygon or shapely.geometry.MultiPolygon
+
+        :param batch_size: How many coordinates are drawn at once.
+        :type batch_size: int
+
+        :param cache_key: Identifies the polygon in the cache, e.g. a hash of the GeoJSON. No caching if None.
+        :type cache_key: str
+
+        :param cache_dir: Directory to store triangulations in.
+        :type cache_dir: str
+        """
+        self.batch_size = batch_size
+
+        cache_file = None
+        if cache_key and cache_dir:
+            cache_file = path.join(cache_dir, '{}.triangles.npy'.format(cache_key))
+
+        if cache_file and path.exists(cache_file):
+            self.triangles = np.load(cache_file)
+        else:
+            self.triangles = self._triangulate(polygon)
+            if cache_file:
+                makedirs(cache_dir, exist_ok=True)
+                _save(cache_file, self.triangles)
+
+        a, b, c = self.triangles[:, 0], self.triangles[:, 1], self.triangles[:, 2]
+        self._origin = a
+        self._ab = b - a
+        self._ac = c - a
+        areas = np.abs(self._ab[:, 0] * self._ac[:, 1] - self._ab[:, 1] * self._ac[:, 0]) / 2
+        self._cum_areas = np.cumsum(areas)
+
+    @staticmethod
+    def _triangulate(polygon):
+        """
+        Triangulates the polygon respecting its boundaries and holes.
+
+        :return: The triangles' vertices as (n, 3, 2) array.
+        :rtype: numpy.ndarray
+        """
+        if constrained_delaunay_triangles is None:
+            raise ImportError("Triangulation sampling needs shapely>=2.1.")
+        triangles = constrained_delaunay_triangles(polygon)
+
+        # every triangle is a closed ring of 4 coordinates
+        return get_coordinates(triangles).reshape(-1, 4, 2)[:, :3].copy()
+
+    def draw(self, rng, size=None):
+        """
+        Draws a batch of coordinates within the polygon.
+
+        :param rng: The random generator to draw with.
+        :type rng: numpy.random.Generator
+
+        :param size: Amount of coordinates to draw. Defaults to self.batch_size.
+        :type size: int
+
+        :return: The coordinates as (size, 2) array and the amount of drawn candidates, i.e. size.
+        :rtype: tuple of (numpy.ndarray, int)
+        """
+        size = size or self.batch_size
+        idx = np.searchsorted(self._cum_areas, rng.uniform(0, self._cum_areas[-1], size), side='right')
+        # guard against the upper bound of uniform() due to floating point rounding
+        idx = np.minimum(idx, len(self._cum_areas) - 1)
+
+        u = rng.uniform(size=(size, 1))
+        v = rng.uniform(size=(size, 1))
+        # reflect points from the far half of the parallelogram back into the triangle
+        outside = (u + v) > 1
+        u = np.where(outside, 1 - u, u)
+        v = np.where(outside, 1 - v, v)
+
+        return self._origin[idx] + u * self._ab[idx] + v * self._ac[idx], size
+
+
+def _rings(polygon):
+    """The coordinates of the polygon's exterior and interior rings, as (n, 2) arrays."""
+    for part in getattr(polygon, 'geoms', [polygon]):
+        yield np.asarray(part.exterior.coords)[:, :2]
+        for interior in part.interiors:
+            yield np.asarray(interior.coords)[:, :2]
+
+
+def _grid_cell(polygon, resolution):
+    """The (minx, miny) of the polygon's grid, padded by one cell, and the cell width, see _polygon_grid()."""
+    minx, miny, maxx, maxy = polygon.bounds
+    cell = max(maxx - minx, maxy - miny) / resolution
+    return np.array([minx - cell, miny - cell]), cell
+
+
+def _polygon_grid(polygon, resolution):
+    """
+    Rasterizes a polygon into square cells, each classified as outside (0), inside (1) or crossed by the boundary (2),
+    so most coordinates can be located by a lookup instead of a point in polygon test. The cells along the rings are
+    found by densifying their segments to half a cell, the others by testing the cell center.
+
+    :param resolution: Number of cells along the longer side of the polygon's bounding box.
+    :type resolution: int
+
+    :return: The classes as (nx, ny) array, padded with one outside cell on every side. See _grid_cell() for its
+        origin and cell width.
+    :rtype: numpy.ndarray
+    """
+    minx, miny, maxx, maxy = polygon.bounds
+    origin, cell = _grid_cell(polygon, resolution)
+    nx, ny = int((maxx - minx) // cell) + 1, int((maxy - miny) // cell) + 1
+
+    x, y = np.meshgrid(minx + (np.arange(nx) + 0.5) * cell, miny + (np.arange(ny) + 0.5) * cell, indexing='ij')
+    classes = np.zeros((nx + 2, ny + 2), dtype=np.int8)
+    classes[1:-1, 1:-1] = contains_xy(polygon, x.ravel(), y.ravel()).reshape(nx, ny)
+
+    for ring in _rings(polygon):
+        a, ab = ring[:-1], np.diff(ring, axis=0)
+        steps = np.maximum(np.ceil(np.hypot(*ab.T) / (cell / 2)), 1).astype(np.int64)
+        segment = np.repeat(np.arange(len(a)), steps)
+        t = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / steps[segment]
+        ix, iy = ((a[segment] + ab[segment] * t[:, None] - origin) // cell).astype(np.int64).T
+        # a segment may cut the corner of a neighbouring cell
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                classes[np.clip(ix + dx, 1, nx), np.clip(iy + dy, 1, ny)] = 2
+
+    return classes
+
+
+class AnnulusSampler(object):
+
+    def __init__(self,
+                 polygon,
+                 min_distance,
+                 max_distance,
+                 batch_size=32,
+                 pool_size=4096,
+                 resolution=512,
+                 cache_key=None,
+                 cache_dir=None):
+        """
+        Draws uniformly distributed coordinates from the annulus around a center coordinate, intersected with a
+        (Multi)Polygon. Candidates are drawn in polar coordinates, so only the ones outside the polygon are rejected.
+
+        Every waypoint is the center of the next annulus, so a draw only needs a handful of candidates, too few to
+        vectorize. Instead, the candidates' offsets from the center are drawn ahead in pools and tested one by one
+        against a grid of the polygon's cells, see _polygon_grid(). Only the ones in cells crossed by its boundary
+        are tested against the polygon itself.
+
+        :param polygon: The geometry to sample from.
+        :type polygon: shapely.geometry.Polygon or shapely.geometry.MultiPolygon
+
+        :param min_distance: Inner radius of the annulus in degrees.
+        :type min_distance: float
+
+        :param max_distance: Outer radius of the annulus in degrees.
+        :type max_distance: float
+
+        :param batch_size: How many candidates a draw tests at most.
+        :type batch_size: int
+
+        :param pool_size: How many candidate offsets are drawn ahead at once.
+        :type pool_size: int
+
+        :param resolution: Number of grid cells along the longer side of the polygon's bounding box.
+        :type resolution: int
+
+        :param cache_key: Identifies the polygon in the cache, e.g. a hash of the GeoJSON. No caching if None.
+        :type cache_key: str
+
+        :param cache_dir: Directory to store grids in.
+        :type cache_dir: str
+        """
+        self.polygon = polygon
+        if prepare is not None:
+            prepare(self.polygon)
+        self.min_distance = min_distance
+        self.max_distance = max_distance
+        self.batch_size = batch_size
+        self.pool_size = pool_size
+
+        cache_file = None
+        if cache_key and cache_dir:
+            cache_file = path.join(cache_dir, '{}.grid{}.npy'.format(cache_key, resolution))
+
+        if cache_file and path.exists(cache_file):
+            classes = np.load(cache_file)
+        else:
+            classes = _polygon_grid(self.polygon, resolution)
+            if cache_file:
+                makedirs(cache_dir, exist_ok=True)
+                _save(cache_file, classes)
+
+        origin, self._cell = _grid_cell(self.polygon, resolution)
+        self._origin = origin.tolist()
+        self._nx, self._ny = classes.shape
+        self._classes = classes.tobytes()
+        self.reset()
+
+    def reset(self):
+        """Discards the candidates drawn ahead, e.g. when the random generator is reseeded."""
+        self._dx, self._dy = [], []
+        self._pos = 0
+
+    def _refill(self, rng):
+        # radius is drawn proportionally to the annulus' area, not its width
+        r = np.sqrt(rng.uniform(self.min_distance ** 2, self.max_distance ** 2, self.pool_size))
+        theta = rng.uniform(0, 2 * np.pi, self.pool_size)
+        self._dx = (r * np.cos(theta)).tolist()
+        self._dy = (r * np.sin(theta)).tolist()
+        self._pos = 0
+
+    def draw(self, rng, center, size=None):
+        """
+        Tests candidates around center until one falls within the polygon, at most size.
+
+        :param rng: The random generator to draw with.
+        :type rng: numpy.random.Generator
+
+        :param center: The [x, y] coordinate to draw around.
+        :type center: list
+
+        :param size: Amount of candidates to test at most. Defaults to self.batch_size.
+        :type size: int
+
+        :return: The first candidate within the polygon or None if there was none, and the amount of candidates
+            tested until then.
+        :rtype: tuple of (list, int)
+        """
+        size = size or self.batch_size
+        cx, cy = center
+        ox, oy = self._origin
+
+        for tested in range(1, size + 1):
+            if self._pos == len(self._dx):
+                self._refill(rng)
+            x = cx + self._dx[self._pos]
+            y = cy + self._dy[self._pos]
+            self._pos += 1
+
+            # the grid is padded with outside cells, so truncating small negative indices to 0 is fine
+            ix, iy = int((x - ox) / self._cell), int((y - oy) / self._cell)
+            if not (0 <= ix < self._nx and 0 <= iy < self._ny):
+                continue
+            cell = self._classes[ix * self._ny + iy]
+            if cell == 1 or (cell == 2 and contains_xy(self.polygon, x, y)):
+                return [x, y], tested
+
+        return None, size
+
+
+def save_points(filename, points):
+    """
+    Stores routable points to sample from, e.g. nodes extracted from an OSM extract or the coordinates of successful
+    requests, as a .npy file of unique [x, y] coordinates.
+
+    :param filename: Path of the .npy file.
+    :type filename: str
+
+    :param points: The [x, y] coordinates.
+    :type points: numpy.ndarray or list
+    """
+    if not filename.endswith('.npy'):
+        filename += '.npy'
+    _save(filename, np.unique(np.asarray(points, dtype=float).reshape(-1, 2), axis=0))
+
+
+def load_points(filename, polygon=None):
+    """
+    :param filename: Path of a .npy file written by save_points().
+    :type filename: str
+
+    :param polygon: Only keep the points within this geometry, e.g. the GeoJSON the requests are limited to.
+    :type polygon: shapely.geometry.Polygon or shapely.geometry.MultiPolygon
+
+    :return: The points as (n, 2) array.
+    :rtype: numpy.ndarray
+    """
+    points = np.load(filename, mmap_mode='r')
+    if polygon is not None:
+        if prepare is not None:
+            prepare(polygon)
+        points = points[contains_xy(polygon, points[:, 0], points[:, 1])]
+    if not len(points):
+        raise ValueError("{} doesn't hold any points within the polygon.".format(filename))
+
+    return np.ascontiguousarray(points, dtype=float)
+
+
+class PointSampler(object):
+
+    def __init__(self,
+                 points,
+                 batch_size=256):
+        """
+        Draws coordinates from a set of routable points, see load_points(), so no request fails because a coordinate
+        landed in a forest or lake.
+
+        :param points: The points to sample from as (n, 2) array.
+        :type points: numpy.ndarray
+
+        :param batch_size: How many coordinates are drawn at once.
+        :type batch_size: int
+        """
+        self.points = points
+        self.batch_size = batch_size
+
+    def draw(self, rng, size=None):
+        """
+        Draws a batch of points, with replacement.
+
+        :param rng: The random generator to draw with.
+        :type rng: numpy.random.Generator
+
+        :param size: Amount of points to draw. Defaults to self.batch_size.
+        :type size: int
+
+        :return: The points as (size, 2) array and the amount of drawn candidates, i.e. size.
+        :rtype: tuple of (numpy.ndarray, int)
+        """
+        size = size or self.batch_size
+        return self.points[rng.integers(len(self.points), size=size)], size
+
+
+class PointAnnulusSampler(object):
+
+    def __init__(self,
+                 points,
+                 min_distance,
+                 max_distance,
+                 batch_size=32):
+        """
+        Draws points uniformly from the ones within an annulus around a center coordinate. The points are indexed in a
+        grid with cells as wide as max_distance, so only the points of the 3 x 3 cells around the center are candidates
+        and the cells are found by binary search. Many candidates, i.e. a wide annulus, are sampled by rejection first.
+
+        :param points: The points to sample from as (n, 2) array.
+        :type points: numpy.ndarray
+
+        :param min_distance: Inner radius of the annulus in degrees.
+        :type min_distance: float
+
+        :param max_distance: Outer radius of the annulus in degrees.
+        :type max_distance: float
+
+        :param batch_size: How many candidates are tested at once when sampling by rejection.
+        :type batch_size: int
+        """
+        self.min_distance = min_distance
+        self.max_distance = max_distance
+        self.batch_size = batch_size
+        self._origin = points.min(axis=0)
+        self._n_rows = int((points[:, 1].max() - self._origin[1]) // max_distance) + 1
+
+        cells = self._cell(points)
+        order = np.argsort(cells, kind='stable')
+        self.points = points[order]
+        self._cells = cells[order]
+
+    def _cell(self, points):
+        ix, iy = ((np.asarray(points) - self._origin) // self.max_distance).astype(np.int64).T
+        return ix * self._n_rows + iy
+
+    def draw(self, rng, center, size=None):
+        """
+        Draws a point within the annulus around center.
+
+        :param rng: The random generator to draw with.
+        :type rng: numpy.random.Generator
+
+        :param center: The [x, y] coordinate to draw around.
+        :type center: list
+
+        :param size: Amount of candidates to test at once when sampling by rejection. Defaults to self.batch_size.
+        :type size: int
+
+        :return: The point or None if there is none within the annulus, and the amount of candidates drawn, i.e. 1.
+        :rtype: tuple of (list, int)
+        """
+        cx, cy = ((np.asarray(center) - self._origin) // self.max_distance).astype(np.int64)
+        size = size or self.batch_size
+        first_row, last_row = max(cy - 1, 0), min(cy + 1, self._n_rows - 1)
+        # cells of a column are contiguous, so 3 neighbouring rows are one slice
+        columns = np.array([cx - 1, cx, cx + 1]) * self._n_rows
+        lo = np.searchsorted(self._cells, columns + first_row, side='left')
+        hi = np.searchsorted(self._cells, columns + last_row, side='right')
+        ends = np.cumsum(hi - lo)
+
+        if ends[-1] > 4 * size:
+            # map random positions within the concatenated slices to point indices
+            pos = rng.integers(ends[-1], size=size)
+            column = np.searchsorted(ends, pos, side='right')
+            candidates = self.points[lo[column] + pos - (ends[column] - (hi - lo)[column])]
+            distances = np.hypot(*(candidates - center).T)
+            valid = np.flatnonzero((self.min_distance < distances) & (distances < self.max_distance))
+            if valid.size:
+                return candidates[valid[0]].tolist(), 1
+
+        candidates = np.concatenate([self.points[l:h] for l, h in zip(lo, hi)])
+        distances = np.hypot(*(candidates - center).T)
+        valid = np.flatnonzero((self.min_distance < distances) & (distances < self.max_distance))
+        if not valid.size:
+            return None, 1
+        return candidates[valid[rng.integers(valid.size)]].tolist(), 1
+
+
+def zipf_weights(n, exponent=1.0):
+    """
+    :return: Probabilities of n ranks, the r-th proportional to r ** -exponent.
+    :rtype: numpy.ndarray
+    """
+    weights = np.arange(1, n + 1, dtype=float) ** -exponent
+    return weights / weights.sum()
+
+
+class HotspotSampler(object):
+
+    def __init__(self,
+                 polygon,
+                 hotspots,
+                 weights=None,
+                 spread=0.01,
+                 batch_size=256,
+                 points=None):
+        """
+        Draws coordinates around a fixed set of hotspots, e.g. city centres, to reproduce traffic where a few places
+        dominate. A hotspot is picked by weight, then the coordinate is scattered around it by a normal distribution.
+
+        :param polygon: The geometry to keep the coordinates within.
+        :type polygon: shapely.geometry.Polygon or shapely.geometry.MultiPolygon
+
+        :param hotspots: The hotspots as (k, 2) array.
+        :type hotspots: numpy.ndarray
+
+        :param weights: Probability per hotspot, e.g. from zipf_weights(). Equal if None.
+        :type weights: numpy.ndarray
+
+        :param spread: Standard deviation in degrees of the coordinates around their hotspot. 0 repeats the hotspots'
+            exact coordinates.
+        :type spread: float
+
+        :param batch_size: How many candidates are drawn at once.
+        :type batch_size: int
+
+        :param points: Routable points to draw from instead, see load_points(). Each hotspot then draws from the points
+            within 3 spreads around it, weighted by the normal distribution, or from its nearest point if there is none.
+        :type points: numpy.ndarray
+        """
+        self.polygon = polygon
+        if prepare is not None:
+            prepare(self.polygon)
+        self.hotspots = np.asarray(hotspots, dtype=float)
+        if weights is None:
+            weights = np.full(len(self.hotspots), 1 / len(self.hotspots))
+        self._cum_weights = np.cumsum(weights) / np.sum(weights)
+        self.spread = spread
+        self.batch_size = batch_size
+
+        # Per hotspot the routable points around it and their cumulative weights
+        self._neighbours = None
+        if points is not None:
+            self._neighbours = []
+            for hotspot in self.hotspots:
+                distances = np.hypot(*(points - hotspot).T)
+                idx = np.flatnonzero(distances <= 3 * spread) if spread else np.empty(0, dtype=np.int64)
+                if not idx.size:
+                    idx = np.array([np.argmin(distances)])
+                    cum_weights = np.ones(1)
+                else:
+                    cum_weights = np.cumsum(np.exp(-0.5 * (distances[idx] / spread) ** 2))
+                    cum_weights /= cum_weights[-1]
+                self._neighbours.append((points[idx], cum_weights))
+
+    def draw(self, rng, size=None):
+        """
+        Draws a batch of candidates around the hotspots and keeps the ones within the polygon.
+
+        :param rng: The random generator to draw with.
+        :type rng: numpy.random.Generator
+
+        :param size: Amount of candidates to draw. Defaults to self.batch_size.
+        :type size: int
+
+        :return: The candidates within the polygon as (k, 2) array and the amount of drawn candidates.
+        :rtype: tuple of (numpy.ndarray, int)
+        """
+        size = size or self.batch_size
+        idx = np.minimum(np.searchsorted(self._cum_weights, rng.random(size), side='right'), len(self.hotspots) - 1)
+        if self._neighbours is not None:
+            # routable points are within the polygon already
+            candidates = np.empty((size, 2))
+            for hotspot in np.unique(idx):
+                mask = idx == hotspot
+                points, cum_weights = self._neighbours[hotspot]
+                picks = np.searchsorted(cum_weights, rng.random(int(mask.sum())), side='right')
+                candidates[mask] = points[np.minimum(picks, len(points) - 1)]
+            return candidates, size
+
+        candidates = self.hotspots[idx]
+        if self.spread:
+            candidates = candidates + rng.normal(0, self.spread, (size, 2))
+        mask = contains_xy(self.polygon, candidates[:, 0], candidates[:, 1])
+
+        return candidates[mask], size
+
+
+def load_raster(filename):
+    """
+    Loads a density raster, e.g. population counts, to draw coordinates from with RasterSampler. Either an ESRI ASCII
+    grid (.asc), which most GIS export, or a .npz file with a 'density' array (first row north) and its 'bounds'.
+
+    :param filename: Path of the raster file.
+    :type filename: str
+
+    :return: The density per cell, first row north, and the raster's (minx, miny, maxx, maxy) in degrees.
+    :rtype: tuple of (numpy.ndarray, tuple)
+    """
+    if filename.endswith('.npz'):
+        with np.load(filename) as data:
+            return np.asarray(data['density'], dtype=float), tuple(float(b) for b in data['bounds'])
+
+    with open(filename) as f:
+        lines = f.read().splitlines()
+    header = dict()
+    for line in lines:
+        parts = line.split()
+        if not parts or not parts[0][0].isalpha():
+            break
+        header[parts[0].lower()] = float(parts[1])
+    try:
+        cellsize = header['cellsize']
+        minx = header['xllcorner'] if 'xllcorner' in header else header['xllcenter'] - cellsize / 2
+        miny = header['yllcorner'] if 'yllcorner' in header else header['yllcenter'] - cellsize / 2
+    except KeyError as e:
+        raise ValueError("{} is not a valid ESRI ASCII grid, its header lacks {}.".format(filename, e))
+
+    density = np.loadtxt(lines[len(header):], dtype=float, ndmin=2)
+    if 'nodata_value' in header:
+        density[density == header['nodata_value']] = 0
+    nrows, ncols = density.shape
+
+    return density, (minx, miny, minx + ncols * cellsize, miny + nrows * cellsize)
+
+
+class RasterSampler(object):
+
+    def __init__(self,
+                 polygon,
+                 density,
+                 bounds,
+                 batch_size=256):
+        """
+        Draws coordinates with a probability proportional to a density raster, see load_raster(): a cell by its
+        density, then a uniform coordinate within the cell.
+
+        :param polygon: The geometry to keep the coordinates within.
+        :type polygon: shapely.geometry.Polygon or shapely.geometry.MultiPolygon
+
+        :param density: Non-negative density per cell, first row north. Negative and NaN cells are never drawn.
+        :type density: numpy.ndarray
+
+        :param bounds: (minx, miny, maxx, maxy) of the raster in degrees.
+        :type bounds: tuple
+
+        :param batch_size: How many candidates are drawn at once.
+        :type batch_size: int
+        """
+        self.polygon = polygon
+        if prepare is not None:
+            prepare(self.polygon)
+        density = np.asarray(density, dtype=float)
+        density = np.where(np.isfinite(density) & (density > 0), density, 0)
+        if not density.any():
+            raise ValueError("The density raster has no cell with a positive density.")
+
+        self.nrows, self.ncols = density.shape
+        self.minx, self.miny, self.maxx, self.maxy = bounds
+        self.cell_width = (self.maxx - self.minx) / self.ncols
+        self.cell_height = (self.maxy - self.miny) / self.nrows
+        self._cum_density = np.cumsum(density.ravel())
+        self.batch_size = batch_size
+
+    def draw(self, rng, size=None):
+        """
+        Draws a batch of candidates by density and keeps the ones within the polygon.
+
+        :param rng: The random generator to draw with.
+        :type rng: numpy.random.Generator
+
+        :param size: Amount of candidates to draw. Defaults to self.batch_size.
+        :type size: int
+
+        :return: The candidates within the polygon as (k, 2) array and the amount of drawn candidates.
+        :rtype: tuple of (numpy.ndarray, int)
+        """
+        size = size or self.batch_size
+        cells = np.minimum(np.searchsorted(self._cum_density, rng.random(size) * self._cum_density[-1], side='right'),
+                           len(self._cum_density) - 1)
+        rows, cols = np.divmod(cells, self.ncols)
+        x = self.minx + (cols + rng.random(size)) * self.cell_width
+        y = self.maxy - (rows + rng.random(size)) * self.cell_height
+        mask = contains_xy(self.polygon, x, y)
+
+        return np.column_stack((x[mask], y[mask])), size
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+
+from math import ceil, log, log1p
+import numpy as np
+
+
+class Histogram(object):
+
+    def __init__(self,
+                 precision=0.01,
+                 max_value=1e7):
+        """
+        Streaming histogram with logarithmic buckets, i.e. constant memory and a bounded relative error, no matter how
+        many values are recorded. Histograms with the same settings can be merged, e.g. across locust workers.
+
+        :param precision: Relative width of a bucket. Reported percentiles are off by at most half of it.
+        :type precision: float
+
+        :param max_value: Largest value to distinguish, larger values end up in the last bucket. Values below 1 all
+            end up in the first bucket.
+        :type max_value: float
+        """
+        self.precision = precision
+        self.max_value = max_value
+        self._log_base = log1p(precision)
+        self.counts = np.zeros(int(ceil(log(max_value) / self._log_base)) + 2, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        self.counts[:] = 0
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        if value < 1:
+            return 0
+        return min(int(log(value) / self._log_base) + 1, len(self.counts) - 1)
+
+    def _value(self, idx):
+        """The value representing a bucket, i.e. the middle of its bounds."""
+        if idx == 0:
+            return 0.5
+        return (1 + self.precision / 2) * (1 + self.precision) ** (idx - 1)
+
+    def record(self, value):
+        """
+        :param value: The value to record, e.g. a response time in ms.
+        :type value: float
+        """
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def percentile(self, p):
+        """
+        :param p: Percentile in [0, 100], e.g. 99.9.
+        :type p: float
+
+        :return: The approximate value below which p percent of the recorded values fall.
+        :rtype: float
+        """
+        if not self.count:
+            return None
+        rank = max(int(ceil(p / 100 * self.count)), 1)
+        idx = int(np.searchsorted(np.cumsum(self.counts), rank))
+        # exact extremes are known, don't let bucket rounding exceed them
+        return min(max(self._value(idx), self.min), self.max)
+
+    def snapshot(self):
+        """
+        :return: The histogram's state as builtin types, sparse, e.g. to be sent from a locust worker to the master.
+        :rtype: dict
+        """
+        idx = np.flatnonzero(self.counts)
+        return {
+            'precision': self.precision,
+            'max_value': self.max_value,
+            'buckets': idx.tolist(),
+            'counts': self.counts[idx].tolist(),
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max
+        }
+
+    def merge(self, other):
+        """
+        Adds the values of another histogram with the same settings.
+
+        :param other: The histogram or one of its snapshots.
+        :type other: Histogram or dict
+        """
+        if isinstance(other, Histogram):
+            other = other.snapshot()
+        if (other['precision'], other['max_value']) != (self.precision, self.max_value):
+            raise ValueError("Only histograms with the same precision and max_value can be merged.")
+        if not other['count']:
+            return
+
+        np.add.at(self.counts, other['buckets'], other['counts'])
+        self.count += other['count']
+        self.sum += other['sum']
+        self.min = other['min'] if self.min is None else min(self.min, other['min'])
+        self.max = other['max'] if self.max is None else max(self.max, other['max'])
+
+
+def request_complexity(endpoint, params):
+    """
+    Extracts the features determining the problem size of a generated request.
+
+    :param endpoint: One of 'directions', 'isochrones', 'matrix', 'optimization'.
+    :type endpoint: str
+
+    :param params: Parameters as returned by ORSGenerator.create_requests().
+    :type params: dict
+
+    :return: The features, with the problem size as 'size': jobs * vehicles for optimization, the amount of
+        coordinates for directions, locations * ranges for isochrones and locations ** 2 for matrix.
+    :rtype: dict
+    """
+    if endpoint == 'optimization':
+        features = {'jobs': len(params['jobs']), 'vehicles': len(params['vehicles'])}
+        features['size'] = features['jobs'] * features['vehicles']
+    elif endpoint == 'directions':
+        features = {'coordinates': len(params['coordinates'])}
+        features['size'] = features['coordinates']
+    elif endpoint == 'isochrones':
+        features = {'locations': len(params['locations']), 'ranges': len(params['range'])}
+        features['size'] = features['locations'] * features['ranges']
+    elif endpoint == 'matrix':
+        features = {'locations': len(params['locations'])}
+        features['size'] = features['locations'] ** 2
+    else:
+        raise ValueError("{} not a valid endpoint".format(endpoint))
+
+    return features
+
+
+def request_name(endpoint, params):
+    """
+    :return: The endpoint and profile of a generated request, e.g. 'directions/driving-car', to report stats by.
+    :rtype: str
+    """
+    if params.get('profile'):
+        return '{}/{}'.format(endpoint, params['profile'])
+    return endpoint
+
+
+class ComplexityStats(object):
+
+    def __init__(self, precision=0.01):
+        """
+        Latency histograms bucketed by problem size (see request_complexity()), in power of 2 buckets. Fits a scaling
+        curve latency = a * size ** b, so b tells whether latency grows linearly (~1) or superlinearly (>1).
+
+        :param precision: Precision of the latency histograms.
+        :type precision: float
+        """
+        self.precision = precision
+        # size bucket -> latency histogram, sum of sizes
+        self.buckets = dict()
+
+    def record(self, size, latency):
+        """
+        :param size: Problem size of the request.
+        :type size: int
+
+        :param latency: The request's latency, e.g. in ms.
+        :type latency: float
+        """
+        size = int(size)
+        bucket = 1 << (max(size, 1).bit_length() - 1)
+        if bucket not in self.buckets:
+            self.buckets[bucket] = [Histogram(self.precision), 0]
+        self.buckets[bucket][0].record(float(latency))
+        self.buckets[bucket][1] += size
+
+    def report(self):
+        """
+        :return: Per size bucket [bucket, 2 * bucket): count, mean size and latency p50, p90, p99.
+        :rtype: list of dict
+        """
+        rows = []
+        for bucket in sorted(self.buckets):
+            h, size_sum = self.buckets[bucket]
+            rows.append({'bucket': bucket,
+                         'count': h.count,
+                         'mean_size': size_sum / h.count,
+                         'p50': h.percentile(50),
+                         'p90': h.percentile(90),
+                         'p99': h.percentile(99)})
+        return rows
+
+    def fit(self):
+        """
+        Fits median latency = a * size ** b over the size buckets, weighted by their counts.
+
+        :return: a and b, or None if there are less than 2 size buckets.
+        :rtype: tuple of float
+        """
+        rows = [row for row in self.report() if row['p50'] > 0]
+        if len(rows) < 2:
+            return None
+        x = np.log([row['mean_size'] for row in rows])
+        y = np.log([row['p50'] for row in rows])
+        b, log_a = np.polyfit(x, y, 1, w=np.sqrt([row['count'] for row in rows]))
+        return float(np.exp(log_a)), float(b)
+
+    def snapshot(self):
+        """:return: The state as builtin types, e.g. to be sent from a locust worker to the master."""
+        return {str(bucket): [h.snapshot(), size_sum] for bucket, (h, size_sum) in self.buckets.items()}
+
+    def merge(self, other):
+        """
+        :param other: The stats or one of their snapshots.
+        :type other: ComplexityStats or dict
+        """
+        if isinstance(other, ComplexityStats):
+            other = other.snapshot()
+        for bucket, (snapshot, size_sum) in other.items():
+            bucket = int(bucket)
+            if bucket not in self.buckets:
+                self.buckets[bucket] = [Histogram(self.precision), 0]
+            self.buckets[bucket][0].merge(snapshot)
+            self.buckets[bucket][1] += size_sum
+
+    def reset(self):
+        self.buckets = dict()
+
+
+def compare_latencies(stable, dev, confidence=0.95, resamples=2000, seed=None):
+    """
+    Compares paired latencies of the same requests on two servers. The speed ratio is the geometric mean of dev / stable
+    per request, so a few slow outliers don't dominate, with a bootstrap confidence interval over the requests. The
+    Wilcoxon signed-rank p-value is added if scipy is installed.
+
+    :param stable: Latencies of the stable server.
+    :type stable: list of float
+
+    :param dev: Latencies of the dev server, for the same requests in the same order.
+    :type dev: list of float
+
+    :param confidence: Level of the confidence interval.
+    :type confidence: float
+
+    :param resamples: Amount of bootstrap resamples.
+    :type resamples: int
+
+    :param seed: Seed for a reproducible interval. Random if None.
+    :type seed: int
+
+    :return: Amount of pairs, median latencies, ratio (above 1 if dev is slower), its interval as ratio_low and
+        ratio_high and p_value (None without scipy or with less than 2 pairs).
+    :rtype: dict
+    """
+    stable, dev = np.asarray(stable, dtype=float), np.asarray(dev, dtype=float)
+    if stable.shape != dev.shape:
+        raise ValueError("Latencies need to be paired, got {} stable and {} dev.".format(len(stable), len(dev)))
+    report = {'requests': len(stable), 'stable_p50': None, 'dev_p50': None, 'ratio': None, 'ratio_low': None,
+              'ratio_high': None, 'p_value': None}
+    if not len(stable):
+        return report
+
+    # the fastest responses are exactly 0 at timer resolution
+    log_ratios = np.log(np.maximum(dev, 1e-6) / np.maximum(stable, 1e-6))
+    rng = np.random.default_rng(seed)
+    # resample in batches, a resamples x requests index array doesn't fit into memory for large runs
+    batch = max(int(1e6 // len(log_ratios)), 1)
+    means = np.concatenate([log_ratios[rng.integers(0, len(log_ratios), (min(batch, resamples - start),
+                                                                          len(log_ratios)))].mean(axis=1)
+                            for start in range(0, resamples, batch)])
+    alpha = (1 - confidence) / 2
+
+    report.update(stable_p50=float(np.median(stable)),
+                  dev_p50=float(np.median(dev)),
+                  ratio=float(np.exp(log_ratios.mean())),
+                  ratio_low=float(np.exp(np.percentile(means, 100 * alpha))),
+                  ratio_high=float(np.exp(np.percentile(means, 100 * (1 - alpha)))))
+
+    try:
+        from scipy.stats import wilcoxon
+    except ImportError:
+        wilcoxon = None
+    if wilcoxon is not None and len(log_ratios) > 1 and log_ratios.any():
+        report['p_value'] = float(wilcoxon(log_ratios).pvalue)
+
+    return report
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+from copy import deepcopy
+import numpy as np
+
+
+class ChoiceSampler(object):
+    """Picks one value of a textual parameter list or a numeric min/max(/step) range."""
+
+    def __init__(self, values):
+        # Sanitize to be regular Python builtin types once, e.g. numpy ranges
+        self.values = values.tolist() if isinstance(values, np.ndarray) else list(values)
+        self._mutable = any(isinstance(v, (list, dict)) for v in self.values)
+
+    def __call__(self, rng):
+        value = self.values[rng.integers(len(self.values))]
+        if self._mutable:
+            value = deepcopy(value)
+        return value
+
+
+class MultiSampler(object):
+    """Picks a random amount (at least 1, less than all) of unique values of a parameter list."""
+
+    def __init__(self, values):
+        self.values = list(values)
+        self._amounts = range(1, len(self.values))
+
+    def __call__(self, rng):
+        num = self._amounts[rng.integers(len(self._amounts))]
+        return [self.values[i] for i in rng.choice(len(self.values), num, replace=False)]
+
+
+class ConstantSampler(object):
+    """Always returns the same immutable value."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __call__(self, rng):
+        return self.value
+
+
+class CompiledTemplate(object):
+
+    def __init__(self,
+                 params,
+                 multi_params=None):
+        """
+        Parses an endpoint's parameter tree of a template once into a flat plan of samplers, so generating a request
+        only needs to execute the plan.
+
+        Numeric parameters, i.e. mappings which can be passed to numpy.arange() such as min/max(/step), become ranges
+        to pick from, lists become textual parameters to pick from, unless they're multi parameters.
+
+        :param params: The 'params' section of a template endpoint.
+        :type params: dict
+
+        :param multi_params: Parameters which take several values, e.g. "attributes".
+        :type multi_params: list
+        """
+        self._multi_params = multi_params or []
+        # Each step is (container index, key, sampler). Sampler is None for nested mappings, which are containers
+        # themselves and are indexed in order of appearance.
+        self.plan = []
+        self._n_containers = 1
+        self._compile(params, 0)
+
+    def _compile(self, d, container):
+        for k, v in d.items():
+            if isinstance(v, dict):
+                try:
+                    v = np.arange(*v.values())
+                except Exception:
+                    self.plan.append((container, k, None))
+                    self._n_containers += 1
+                    self._compile(v, self._n_containers - 1)
+                    continue
+
+            if isinstance(v, (list, range, tuple, np.ndarray)):
+                if k in self._multi_params:
+                    sampler = MultiSampler(v)
+                else:
+                    sampler = ChoiceSampler(v)
+            elif isinstance(v, int):
+                sampler = ConstantSampler(range(v))
+            else:
+                raise ValueError("Parameter {} has an invalid value: {}".format(k, v))
+
+            self.plan.append((container, k, sampler))
+
+    def execute(self, rng):
+        """
+        Picks random values for all parameters.
+
+        :param rng: The random generator to pick with.
+        :type rng: numpy.random.Generator
+
+        :return: The request parameters, nested the same way as the template.
+        :rtype: dict
+        """
+        containers = [dict()]
+        for container, k, sampler in self.plan:
+            if sampler is None:
+                containers.append(dict())
+                containers[container][k] = containers[-1]
+            else:
+                containers[container][k] = sampler(rng)
+
+        return containers[0]
@@ -39,7 +39,7 @@ setup(
     long_description_content_type='text/markdown',
     author=about['__author__'],
     author_email=about['__author_email__'],
-    python_requires='>=3.5.0',
+    python_requires='>=3.5.3',
     url=about['__url__'],
     packages=find_packages(exclude=["tests", "*.tests", "*.tests.*", "tests.*"]),
     install_requires=[
@@ -47,10 +47,15 @@ setup(
         'locustio>=0.11',
         'openrouteservice>=2.1.0',
         'shapely>=1.6',
-        'numpy>=1.12',
+        'numpy>=1.17',
         'pyyaml>=0.1.7',
-        'dictdiffer>=0.7.0'
+        'dictdiffer>=0.7.0',
+        'aiohttp>=3.3',
+        'click>=7.0'
     ],
+    entry_points={
+        'console_scripts': ['orsdev=orsdev.orsdev:main']
+    },
     include_package_data=True,
     license='Apache 2.0',
     classifiers=[
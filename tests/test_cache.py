@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import openrouteservice as ors
+
+from orsdev.cache import ResponseCache, CachingClient, CacheMiss, request_key
+
+PATH = '/v2/directions/driving-car/json'
+BODY = {'coordinates': [[8.68, 49.41], [8.69, 49.42]], 'instructions': False}
+RESPONSE = {'routes': [{'summary': {'distance': 1234.5, 'duration': 300.1}}]}
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, 'stable.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_request_key(self):
+        reordered = {'instructions': False, 'coordinates': BODY['coordinates']}
+        self.assertEqual(request_key(PATH, BODY), request_key(PATH, reordered))
+        self.assertNotEqual(request_key(PATH, BODY), request_key('/v2/directions/driving-hgv/json', BODY))
+
+    def test_persistent(self):
+        cache = ResponseCache(self.filename)
+        cache.put('a', RESPONSE)
+        cache.put('gpx', '<gpx/>')
+        cache.close()
+
+        cache = ResponseCache(self.filename)
+        try:
+            self.assertEqual(len(cache), 2)
+            self.assertEqual(cache.get('a'), RESPONSE)
+            self.assertEqual(cache.get('gpx'), '<gpx/>')
+            self.assertIsNone(cache.get('b'))
+            self.assertGreater(cache.size, 0)
+        finally:
+            cache.close()
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(self.filename)
+        cache.put('size', {'value': 'x' * 10})
+        entry_size = cache.size
+        cache.clear()
+        cache.close()
+
+        cache = ResponseCache(self.filename, max_size=3 * entry_size)
+        try:
+            for key in 'abc':
+                cache.put(key, {'value': key * 10})
+            # a is used again, so b is the least recently used one
+            cache.get('a')
+            cache.put('d', {'value': 'd' * 10})
+            self.assertEqual(len(cache), 3)
+            self.assertNotIn('b', cache)
+            for key in 'acd':
+                self.assertIn(key, cache)
+            self.assertLessEqual(cache.size, cache.max_size)
+        finally:
+            cache.close()
+
+
+class CachingClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = ResponseCache(os.path.join(self.tmp_dir, 'stable.sqlite'))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_record_then_hit(self):
+        client = CachingClient(self.cache, base_url='http://localhost:8080')
+        with mock.patch.object(ors.Client, 'request', return_value=RESPONSE) as request:
+            self.assertEqual(client.request(PATH, post_json=BODY), RESPONSE)
+            self.assertEqual(client.request(PATH, post_json=BODY), RESPONSE)
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual((client.hits, client.misses), (1, 1))
+
+    def test_replay(self):
+        self.cache.put(request_key(PATH, BODY), RESPONSE)
+        client = CachingClient(self.cache, replay=True)
+        with mock.patch.object(ors.Client, 'request') as request:
+            self.assertEqual(client.request(PATH, post_json=BODY), RESPONSE)
+            with self.assertRaises(CacheMiss):
+                client.request(PATH, post_json=dict(BODY, instructions=True))
+        request.assert_not_called()
+        self.assertEqual((client.hits, client.misses), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import socket
+import unittest
+
+from aiohttp.test_utils import TestServer
+from openrouteservice import exceptions
+
+from orsdev.client import AsyncClient, TransportError
+from orsdev.fake import FakeServer, LatencyModel
+
+PARAMS = {'profile': 'driving-car', 'coordinates': [[8.68, 49.41], [8.69, 49.42]]}
+
+
+def _request(server, timeout=60, params=PARAMS):
+    """Requests the directions of PARAMS from a FakeServer, or from a closed port if server is None."""
+    async def run():
+        if server is None:
+            with socket.socket() as s:
+                s.bind(('localhost', 0))
+                url = 'http://localhost:{}'.format(s.getsockname()[1])
+            async with AsyncClient(url, timeout=timeout) as client:
+                return await client.directions(**params)
+
+        async with TestServer(server.app(), host='localhost') as test_server:
+            async with AsyncClient(str(test_server.make_url('')), timeout=timeout) as client:
+                return await client.directions(**params)
+
+    return asyncio.run(run())
+
+
+class AsyncClientTest(unittest.TestCase):
+
+    def test_response(self):
+        response = _request(FakeServer())
+        self.assertEqual(len(response['routes']), 1)
+        self.assertGreater(response['routes'][0]['summary']['distance'], 0)
+
+    def test_api_error(self):
+        with self.assertRaises(exceptions.ApiError) as cm:
+            _request(FakeServer(error_rate=1))
+        self.assertEqual(cm.exception.status, 400)
+        self.assertEqual(cm.exception.message['error']['code'], 2003)
+
+        with self.assertRaises(exceptions.ApiError) as cm:
+            _request(FakeServer(server_error_rate=1))
+        self.assertEqual(cm.exception.status, 500)
+
+    def test_busy(self):
+        async def run():
+            server = FakeServer(max_concurrency=1, max_queue=0, latency=LatencyModel(median=300, sigma=0))
+            async with TestServer(server.app(), host='localhost') as test_server:
+                async with AsyncClient(str(test_server.make_url(''))) as client:
+                    return await asyncio.gather(*(client.directions(**PARAMS) for _ in range(2)),
+                                                return_exceptions=True)
+
+        # whichever request comes second finds the server busy
+        errors = [r for r in asyncio.run(run()) if isinstance(r, exceptions.ApiError)]
+        self.assertEqual([e.status for e in errors], [503])
+
+    def test_timeout(self):
+        with self.assertRaises(exceptions.Timeout):
+            _request(FakeServer(latency=LatencyModel(median=2000, sigma=0)), timeout=0.2)
+
+    def test_transport_error(self):
+        with self.assertRaises(TransportError) as cm:
+            _request(None)
+        self.assertIn('ClientConnectorError', str(cm.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
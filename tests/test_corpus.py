@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import yaml
+
+from orsdev.corpus import write_corpus, serialize_params, RequestCorpus
+from orsdev.generator import ORSGenerator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GEOJSON = os.path.join(ROOT, 'geojson/regbez_karlsruhe.geojson')
+
+
+def _generator(endpoint, template):
+    with open(os.path.join(ROOT, 'orsdev/templates', template)) as f:
+        return ORSGenerator(endpoint, yaml.safe_load(f), GEOJSON)
+
+
+class CorpusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _read(self, filename):
+        with open(filename, 'rb') as f:
+            return f.read()
+
+    def test_same_seed_same_corpus(self):
+        files = [os.path.join(self.tmp_dir, '{}.jsonl'.format(idx)) for idx in range(3)]
+        for filename, seed in zip(files, (1, 1, 2)):
+            write_corpus(_generator('directions', 'openrouteservice_car.yaml'), 50, filename, seed=seed)
+        self.assertEqual(self._read(files[0]), self._read(files[1]))
+        self.assertNotEqual(self._read(files[0]), self._read(files[2]))
+
+    def test_same_corpus_in_parallel(self):
+        files = [os.path.join(self.tmp_dir, '{}.jsonl'.format(processes)) for processes in (1, 2)]
+        for filename, processes in zip(files, (1, 2)):
+            write_corpus(_generator('matrix', 'openrouteservice_isochrones_matrix.yaml'), 95, filename, seed=3,
+                         processes=processes, chunk_size=10)
+        self.assertEqual(self._read(files[0]), self._read(files[1]))
+
+    def test_round_trip(self):
+        filename = os.path.join(self.tmp_dir, 'optimization.jsonl')
+        gen = _generator('optimization', 'openrouteservice_optimization.yaml')
+        write_corpus(gen, 5, filename, seed=1)
+
+        # a corpus of a single chunk uses the first stream spawned from the seed
+        gen.seed(np.random.SeedSequence(1).spawn(1)[0])
+        expected = [serialize_params(gen.create_requests()) for _ in range(5)]
+        corpus = RequestCorpus(filename)
+        try:
+            self.assertEqual(len(corpus), 5)
+            self.assertEqual(corpus.endpoint, 'optimization')
+            self.assertEqual(corpus.meta['seed'], 1)
+            self.assertEqual([serialize_params(params) for params in corpus], expected)
+            self.assertEqual(serialize_params(corpus[-1]), expected[-1])
+            with self.assertRaises(IndexError):
+                corpus[5]
+        finally:
+            corpus.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
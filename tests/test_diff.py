@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+
+from orsdev import diff
+from orsdev.fake import encode_polyline
+
+
+class GeometryDiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stable = [[8.68, 49.41, 110.0], [8.69, 49.42, 120.5], [8.7, 49.43, 131.0]]
+        # same x/y, only the elevation changed
+        self.dev = [[x, y, z + 25] for x, y, z in self.stable]
+
+    def test_geojson_elevation_change(self):
+        rows = list(diff.compare({'geometry': {'coordinates': self.stable}},
+                                 {'geometry': {'coordinates': self.dev}}))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][0], 'geometry.coordinates')
+        self.assertIn('max elevation deviation: 25.0 m', rows[0][1])
+
+    def test_encoded_polyline_elevation_change(self):
+        rows = list(diff.compare({'geometry': encode_polyline(self.stable, is3d=True)},
+                                 {'geometry': encode_polyline(self.dev, is3d=True)}, is3d=True))
+        self.assertEqual(len(rows), 1)
+        self.assertIn('max elevation deviation: 25.0 m', rows[0][1])
+
+    def test_equal_3d_geometries(self):
+        self.assertEqual(list(diff.compare({'coordinates': self.stable}, {'coordinates': self.stable})), [])
+
+    def test_metrics(self):
+        metrics = diff.geometry_metrics(np.array(self.stable), np.array(self.dev))
+        self.assertEqual(metrics['max_vertex_deviation'], 0)
+        self.assertEqual(metrics['max_elevation_deviation'], 25)
+        self.assertIsNone(diff.geometry_metrics(np.array(self.stable)[:, :2],
+                                                np.array(self.dev)[:, :2])['max_elevation_deviation'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+from multiprocessing.connection import Client
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+import yaml
+
+from orsdev.corpus import write_corpus
+from orsdev.distributed import Coordinator, run_worker
+from orsdev.fake import serve
+from orsdev.generator import ORSGenerator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _wait_idle(coordinator, n, timeout=10):
+    deadline = time.time() + timeout
+    while coordinator._idle.qsize() < n:
+        if time.time() > deadline:
+            raise RuntimeError("Workers didn't connect within {} s.".format(timeout))
+        time.sleep(0.05)
+
+
+def _fake_server(**kwargs):
+    """Starts a fake ORS server, see orsdev.fake.serve().
+
+    :return: The server process and its URL.
+    """
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        port = s.getsockname()[1]
+    server = multiprocessing.Process(target=serve, args=('localhost', port), kwargs=kwargs, daemon=True)
+    server.start()
+
+    deadline = time.time() + 10
+    while True:
+        try:
+            socket.create_connection(('localhost', port), timeout=1).close()
+            return server, 'http://localhost:{}'.format(port)
+        except OSError:
+            if time.time() > deadline:
+                raise RuntimeError("Fake server didn't start within 10 s.")
+            time.sleep(0.05)
+
+
+class CoordinatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.corpus = os.path.join(self.tmp_dir, 'corpus.jsonl')
+        with open(os.path.join(ROOT, 'orsdev/templates/openrouteservice_isochrones_matrix.yaml')) as f:
+            template_dict = yaml.safe_load(f)
+        self.methods = template_dict['endpoints']['isochrones']['methods']
+        generator = ORSGenerator('isochrones', template_dict, os.path.join(ROOT, 'geojson/regbez_karlsruhe.geojson'))
+        write_corpus(generator, 4, self.corpus, seed=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_worker_lost_after_peer_finished(self):
+        # the requests fail fast against a closed port, a shard of 2 takes 2 s at 1 request per second
+        with Coordinator(self.corpus, shard_size=2) as coordinator:
+            worker = multiprocessing.Process(target=run_worker, args=(coordinator.address, coordinator.authkey),
+                                             daemon=True)
+            worker.start()
+            _wait_idle(coordinator, 1)
+            # connected after forking the worker, which would inherit the socket and keep it open otherwise
+            lost = Client(coordinator.address, authkey=coordinator.authkey)
+            _wait_idle(coordinator, 2)
+
+            reports = []
+            load = threading.Thread(target=lambda: reports.append(coordinator.load('http://localhost:9', 2, workers=2)),
+                                    daemon=True)
+            load.start()
+
+            # each connection gets one of the two shards, the worker finishes its shard while the other one is lost
+            # in the middle of its shard, which is then handed to the finished worker
+            self.assertTrue(lost.poll(10))
+            lost.recv()
+            time.sleep(3)
+            lost.close()
+
+            load.join(20)
+            self.assertFalse(load.is_alive())
+            self.assertEqual(reports[0]['requests'], 4)
+            self.assertEqual(reports[0]['failed_shards'], [])
+        worker.join(10)
+
+    def test_no_worker(self):
+        with Coordinator(self.corpus, shard_size=2, timeout=0.5) as coordinator:
+            start = time.time()
+            report = coordinator.load('http://localhost:9', 2)
+            self.assertLess(time.time() - start, 5)
+        self.assertEqual(report['requests'], 0)
+        self.assertEqual(sorted(report['failed_shards']), [(0, 2), (2, 4)])
+
+    def test_authkey(self):
+        with self.assertRaises(ValueError):
+            Coordinator(self.corpus, address=('0.0.0.0', 0))
+        with Coordinator(self.corpus) as coordinator, Coordinator(self.corpus) as other:
+            self.assertNotEqual(coordinator.authkey, other.authkey)
+        with Coordinator(self.corpus, address=('0.0.0.0', 0), authkey=b'secret') as coordinator:
+            self.assertEqual(coordinator.authkey, b'secret')
+
+    def test_dev_test_error_handler(self):
+        server, url = _fake_server(server_error_rate=0.3, seed=1)
+        try:
+            with Coordinator(self.corpus, workers=1, shard_size=2) as coordinator:
+                # failed requests are retried until they succeed
+                report = coordinator.dev_test(url, url, self.methods,
+                                              error_handler={'errors': {'ApiError': 'skip'}, 'retry': {'backoff': 0}})
+                self.assertEqual((report['requests'], report['failed_shards']), (4, []))
+                self.assertGreater(report['errors']['ApiError'], 0)
+                self.assertEqual(report['rows'], [])
+
+                report = coordinator.dev_test(url, url, self.methods, error_handler={'errors': {'ApiError': 'raise'}})
+                self.assertTrue(report['failed_shards'])
+
+                # only counted without an error_handler
+                report = coordinator.dev_test(url, url, self.methods)
+                self.assertEqual(report['failed_shards'], [])
+        finally:
+            server.terminate()
+            server.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
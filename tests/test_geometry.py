@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from shapely.geometry import mapping, Polygon
+
+from orsdev.geometry import load_geometry
+
+POLYGON = Polygon([(0, 0), (2, 0), (2, 1), (1, 1), (1, 2), (0, 2)])
+
+
+class LoadGeometryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.geojson = os.path.join(self.tmp_dir, 'l.geojson')
+        with open(self.geojson, 'w') as f:
+            json.dump(mapping(POLYGON), f, indent=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_without_cache(self):
+        geometry, key = load_geometry(self.geojson)
+        self.assertTrue(geometry.equals(POLYGON))
+        self.assertEqual(load_geometry(self.geojson)[1], key)
+        self.assertNotEqual(load_geometry(self.geojson, simplify=0.1)[1], key)
+
+    def test_cache_hit(self):
+        geometry, key = load_geometry(self.geojson, self.cache_dir)
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, key + '.wkb')))
+
+        # hits neither read nor parse the GeoJSON
+        with mock.patch('orsdev.geometry.json.loads') as loads:
+            cached, cached_key = load_geometry(self.geojson, self.cache_dir)
+        loads.assert_not_called()
+        self.assertEqual(cached_key, key)
+        self.assertTrue(cached.equals(geometry))
+
+        # the key is the content's, the same for a copy
+        copy = os.path.join(self.tmp_dir, 'copy.geojson')
+        shutil.copy(self.geojson, copy)
+        self.assertEqual(load_geometry(copy, self.cache_dir)[1], key)
+
+        simplified, simplified_key = load_geometry(self.geojson, self.cache_dir, simplify=0.1)
+        self.assertNotEqual(simplified_key, key)
+        with mock.patch('orsdev.geometry.json.loads') as loads:
+            self.assertEqual(load_geometry(self.geojson, self.cache_dir, simplify=0.1)[1], simplified_key)
+        loads.assert_not_called()
+
+    def test_changed_file(self):
+        _, key = load_geometry(self.geojson, self.cache_dir)
+        with open(self.geojson, 'w') as f:
+            json.dump(mapping(Polygon([(0, 0), (3, 0), (0, 3)])), f)
+        # a different size at least, whatever the file system's mtime resolution
+        geometry, changed_key = load_geometry(self.geojson, self.cache_dir)
+        self.assertNotEqual(changed_key, key)
+        self.assertAlmostEqual(geometry.area, 4.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from orsdev.results import ResultWriter, read_results
+
+
+def _cycles(n):
+    return [(cycle,
+             {'coordinates': [[8.68, 49.41 + cycle], [8.69, 49.42]], 'profile': 'driving-car'},
+             [('routes.0.summary.distance', 'value {} changed'.format(cycle))] * (cycle % 3))
+            for cycle in range(n)]
+
+
+class ResultWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write(self, filename, compression=None, max_buffer=1000):
+        with ResultWriter(filename, meta={'endpoint': 'directions', 'seed': 1},
+                          compression=compression, max_buffer=max_buffer) as writer:
+            for cycle, params, changes in _cycles(100):
+                writer.write_cycle(cycle, params, changes)
+
+    def test_ordering(self):
+        filename = os.path.join(self.tmp_dir, 'results.jsonl')
+        # a small buffer makes write_cycle() wait for the background thread
+        self._write(filename, max_buffer=2)
+
+        with open(filename) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(lines[0], {'endpoint': 'directions', 'seed': 1})
+
+        # every cycle's params come right before its changes, in the order the cycles were written
+        expected = []
+        for cycle, params, changes in _cycles(100):
+            if changes:
+                expected.append({'cycle': cycle, 'params': params})
+                expected.extend({'cycle': cycle, 'key': key, 'change': change} for key, change in changes)
+        self.assertEqual(lines[1:], expected)
+
+    def test_drop_cycles_without_changes(self):
+        filename = os.path.join(self.tmp_dir, 'results.jsonl')
+        self._write(filename)
+
+        meta, params, changes = read_results(filename)
+        self.assertEqual(meta, {'endpoint': 'directions', 'seed': 1})
+        self.assertEqual(sorted(params), [cycle for cycle in range(100) if cycle % 3])
+        self.assertEqual(len(changes), sum(cycle % 3 for cycle in range(100)))
+
+    def test_gzip(self):
+        filename = os.path.join(self.tmp_dir, 'results.jsonl.gz')
+        plain = os.path.join(self.tmp_dir, 'results.jsonl')
+        self._write(filename, compression='gzip')
+        self._write(plain)
+
+        with gzip.open(filename, 'rt') as f, open(plain) as g:
+            self.assertEqual(f.read(), g.read())
+        self.assertLess(os.path.getsize(filename), os.path.getsize(plain))
+        self.assertEqual(read_results(filename), read_results(plain))
+
+    def test_invalid_compression(self):
+        with self.assertRaises(ValueError):
+            ResultWriter(os.path.join(self.tmp_dir, 'results.jsonl.bz2'), compression='bz2')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+
+from openrouteservice import exceptions
+
+from orsdev.cache import CacheMiss
+from orsdev.retry import CircuitBreaker, RetryPolicy, is_server_fault
+
+RULES = {'ApiError': 'log', 'Timeout': 'skip', 'ValidationError': 'log'}
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_is_server_fault(self):
+        self.assertTrue(is_server_fault(exceptions.ApiError(500, 'error')))
+        self.assertTrue(is_server_fault(exceptions.ApiError(429, 'rate limit')))
+        self.assertTrue(is_server_fault(exceptions.Timeout()))
+        self.assertFalse(is_server_fault(exceptions.ApiError(400, 'invalid')))
+        self.assertFalse(is_server_fault(exceptions.ValidationError('invalid')))
+        self.assertFalse(is_server_fault(CacheMiss('missing')))
+
+    def test_rules(self):
+        policy = RetryPolicy(RULES)
+        self.assertTrue(policy.should_log(exceptions.ApiError(500, 'error')))
+        self.assertFalse(policy.should_log(exceptions.Timeout()))
+
+        # invalid requests are retried right away
+        self.assertEqual(policy.handle(exceptions.ValidationError('invalid'), 0), 0)
+        self.assertEqual(policy.handle(exceptions.ApiError(404, 'not found'), 3), 0)
+        with self.assertRaises(KeyError):
+            policy.handle(KeyError('unknown'), 0)
+        self.assertEqual(policy.errors, {'ValidationError': 1, 'ApiError': 1, 'KeyError': 1})
+
+    def test_backoff(self):
+        policy = RetryPolicy(RULES, backoff=0.5, max_backoff=3)
+        for attempt in range(10):
+            delays = [policy.handle(exceptions.Timeout(), attempt) for _ in range(50)]
+            self.assertTrue(all(0 <= d <= min(0.5 * 2 ** attempt, 3) for d in delays))
+        # full jitter, not a fixed delay
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_max_attempts(self):
+        policy = RetryPolicy(RULES, max_attempts=3)
+        policy.handle(exceptions.Timeout(), 2)
+        with self.assertRaises(Exception):
+            policy.handle(exceptions.Timeout(), 3)
+
+    def test_budgets(self):
+        policy = RetryPolicy.from_config({'errors': RULES, 'retry': {'budgets': {'Timeout': 2}, 'backoff': 0}})
+        policy.handle(exceptions.Timeout(), 0)
+        policy.handle(exceptions.Timeout(), 0)
+        with self.assertRaises(Exception):
+            policy.handle(exceptions.Timeout(), 0)
+        # other exceptions have no budget
+        for _ in range(10):
+            policy.handle(exceptions.ApiError(500, 'error'), 0)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def test_transitions(self):
+        breaker = CircuitBreaker('test', failures=3, reset=0.2)
+
+        # invalid requests and successes reset the count
+        breaker.record(exceptions.Timeout())
+        breaker.record(exceptions.Timeout())
+        breaker.record(exceptions.ValidationError('invalid'))
+        breaker.record(exceptions.Timeout())
+        breaker.record()
+        breaker.record(exceptions.Timeout())
+        breaker.record(exceptions.Timeout())
+        self.assertFalse(breaker.is_open)
+
+        # closed -> open
+        breaker.record(exceptions.ApiError(503, 'unavailable'))
+        self.assertTrue(breaker.is_open)
+
+        # open -> half open: one probe passes after the reset
+        start = time.monotonic()
+        breaker.wait()
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+        # failed probe: open again right away
+        breaker.record(exceptions.Timeout())
+        self.assertTrue(breaker.is_open)
+
+        # successful probe: closed
+        breaker.wait()
+        breaker.record()
+        self.assertFalse(breaker.is_open)
+        start = time.monotonic()
+        breaker.wait()
+        self.assertLess(time.monotonic() - start, 0.05)
+
+    def test_single_probe(self):
+        breaker = CircuitBreaker('test', failures=1, reset=0.1)
+        breaker.record(exceptions.Timeout())
+
+        passed = []
+
+        def request():
+            breaker.wait()
+            passed.append(time.monotonic())
+
+        threads = [threading.Thread(target=request, daemon=True) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.4)
+        self.assertEqual(len(passed), 1)
+
+        breaker.record()
+        for thread in threads:
+            thread.join(1)
+        self.assertEqual(len(passed), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+import yaml
+from shapely.geometry import Point, Polygon
+
+from orsdev.generator import ORSGenerator
+from orsdev.sampling import BoundingBoxSampler, TriangulationSampler, AnnulusSampler, PointSampler, PointAnnulusSampler, \
+    save_points, load_points
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GEOJSON = os.path.join(ROOT, 'geojson/regbez_karlsruhe.geojson')
+
+# L-shaped, so a third of its bounding box is outside
+POLYGON = Polygon([(0, 0), (2, 0), (2, 1), (1, 1), (1, 2), (0, 2)])
+
+
+def _template(name):
+    with open(os.path.join(ROOT, 'orsdev/templates', name)) as f:
+        return yaml.safe_load(f)
+
+
+class BoundingBoxSamplerTest(unittest.TestCase):
+
+    def test_candidates_within_polygon(self):
+        candidates, drawn = BoundingBoxSampler(POLYGON, batch_size=1000).draw(np.random.default_rng(0))
+        self.assertEqual(drawn, 1000)
+        self.assertEqual(candidates.shape[1], 2)
+        self.assertTrue(all(POLYGON.covers(Point(*c)) for c in candidates))
+        # about three quarters of the bounding box
+        self.assertAlmostEqual(len(candidates) / drawn, 0.75, delta=0.05)
+
+
+class TriangulationSamplerTest(unittest.TestCase):
+
+    def test_coordinates_within_polygon(self):
+        coordinates, drawn = TriangulationSampler(POLYGON).draw(np.random.default_rng(0), 3000)
+        self.assertEqual((drawn, len(coordinates)), (3000, 3000))
+        self.assertTrue(all(POLYGON.covers(Point(*c)) for c in coordinates))
+
+    def test_uniform_by_area(self):
+        coordinates, _ = TriangulationSampler(POLYGON).draw(np.random.default_rng(0), 30000)
+        # the lower right unit square holds a third of the area
+        share = np.mean((coordinates[:, 0] > 1) & (coordinates[:, 1] < 1))
+        self.assertAlmostEqual(share, 1 / 3, delta=0.02)
+
+    def test_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            sampler = TriangulationSampler(POLYGON, cache_key='l', cache_dir=cache_dir)
+            # written aside and moved in place
+            self.assertEqual(os.listdir(cache_dir), ['l.triangles.npy'])
+            cached = TriangulationSampler(Polygon([(0, 0), (1, 0), (0, 1)]), cache_key='l', cache_dir=cache_dir)
+            np.testing.assert_array_equal(cached.triangles, sampler.triangles)
+        finally:
+            shutil.rmtree(cache_dir)
+
+
+class AnnulusSamplerTest(unittest.TestCase):
+
+    def test_grid(self):
+        sampler = AnnulusSampler(POLYGON, 0.1, 0.2, resolution=16)
+        x, y = np.random.default_rng(0).uniform(-0.5, 2.5, (2, 100000))
+        ix, iy = ((np.column_stack((x, y)) - sampler._origin) // sampler._cell).astype(np.int64).T
+        # beyond the grid is outside
+        ix, iy = np.clip(ix, 0, sampler._nx - 1), np.clip(iy, 0, sampler._ny - 1)
+        classes = np.frombuffer(sampler._classes, dtype=np.int8).reshape(sampler._nx, sampler._ny)[ix, iy]
+        inside = np.array([POLYGON.contains(Point(*c)) for c in zip(x, y)])
+        # cells not crossed by the boundary are entirely inside or outside
+        self.assertTrue(np.all(inside[classes == 1]))
+        self.assertFalse(np.any(inside[classes == 0]))
+        self.assertLess(np.mean(classes == 2), 0.3)
+
+    def test_within_annulus_and_polygon(self):
+        sampler = AnnulusSampler(POLYGON, 0.1, 0.5)
+        rng = np.random.default_rng(0)
+        drawn, coordinates = 0, []
+        for center in ([0.5, 0.5], [1.5, 0.5], [0.5, 1.5], [0.95, 1.05]):
+            for _ in range(500):
+                coordinate, tested = sampler.draw(rng, center)
+                drawn += tested
+                if coordinate is not None:
+                    coordinates.append(coordinate)
+                    self.assertTrue(POLYGON.contains(Point(*coordinate)))
+                    self.assertTrue(0.1 < np.hypot(coordinate[0] - center[0], coordinate[1] - center[1]) < 0.5)
+        self.assertEqual(len(coordinates), 2000)
+
+        # uniform by area: the polygon's inner corner at [1, 1] takes up 3/4 of the annulus around it
+        sampler = AnnulusSampler(POLYGON, 0.01, 0.04)
+        hits = sum(sampler.draw(rng, [1.0, 1.0], 1)[0] is not None for _ in range(20000))
+        self.assertAlmostEqual(hits / 20000, 0.75, delta=0.02)
+
+    def test_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            sampler = AnnulusSampler(POLYGON, 0.1, 0.5, resolution=16, cache_key='l', cache_dir=cache_dir)
+            self.assertTrue(os.path.exists(os.path.join(cache_dir, 'l.grid16.npy')))
+            cached = AnnulusSampler(POLYGON, 0.1, 0.5, resolution=16, cache_key='l', cache_dir=cache_dir)
+            self.assertEqual(cached._classes, sampler._classes)
+            self.assertEqual((cached._origin, cached._cell), (sampler._origin, sampler._cell))
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_reset(self):
+        sampler = AnnulusSampler(POLYGON, 0.1, 0.5, pool_size=64)
+        first = [sampler.draw(np.random.default_rng(0), [0.5, 0.5]) for _ in range(10)]
+        sampler.reset()
+        rng = np.random.default_rng(0)
+        self.assertEqual([sampler.draw(rng, [0.5, 0.5]) for _ in range(10)], first)
+
+    def test_faster_than_rejection(self):
+        template_dict = {'distance': _template('openrouteservice_optimization.yaml')['distance'],
+                         'endpoints': {'directions': {'params': {}}}}
+        seconds = dict()
+        for distance_sampling in ('rejection', 'annulus'):
+            gen = ORSGenerator('directions', template_dict, GEOJSON, distance_sampling=distance_sampling, seed=0)
+            timings = []
+            for _ in range(3):
+                start = time.perf_counter()
+                gen._random_coordinates(5000)
+                timings.append(time.perf_counter() - start)
+            seconds[distance_sampling] = min(timings)
+        self.assertLess(seconds['annulus'], seconds['rejection'])
+
+
+class PointSamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.points = np.random.default_rng(0).uniform(-0.5, 2.5, (20000, 2))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_save_load(self):
+        filename = os.path.join(self.tmp_dir, 'points.npy')
+        save_points(filename, np.concatenate([self.points, self.points[:100]]))
+        points = load_points(filename)
+        self.assertEqual(points.shape, (20000, 2))
+        np.testing.assert_array_equal(points, np.unique(self.points, axis=0))
+
+        within = load_points(filename, POLYGON)
+        self.assertTrue(all(POLYGON.contains(Point(*p)) for p in within))
+        self.assertEqual(len(within), sum(POLYGON.contains(Point(*p)) for p in self.points))
+
+        with self.assertRaises(ValueError):
+            load_points(filename, Polygon([(10, 10), (11, 10), (10, 11)]))
+
+        # like numpy.save()
+        save_points(os.path.join(self.tmp_dir, 'suffix'), self.points)
+        np.testing.assert_array_equal(load_points(os.path.join(self.tmp_dir, 'suffix.npy')), points)
+
+    def test_draw_from_points(self):
+        coordinates, drawn = PointSampler(self.points).draw(np.random.default_rng(0), 500)
+        self.assertEqual((drawn, len(coordinates)), (500, 500))
+        points = set(map(tuple, self.points))
+        self.assertTrue(all(tuple(c) in points for c in coordinates))
+
+    def test_annulus(self):
+        points = set(map(tuple, self.points))
+        rng = np.random.default_rng(0)
+        # wide annuli are sampled by rejection, narrow ones from all points of the neighbouring cells
+        for min_distance, max_distance in ((0.1, 0.5), (0.01, 0.02)):
+            sampler = PointAnnulusSampler(self.points, min_distance, max_distance)
+            for center in rng.uniform(0, 2, (200, 2)):
+                point, drawn = sampler.draw(rng, center.tolist())
+                self.assertEqual(drawn, 1)
+                if point is None:
+                    distances = np.hypot(*(self.points - center).T)
+                    self.assertFalse(np.any((min_distance < distances) & (distances < max_distance)))
+                    continue
+                self.assertIn(tuple(point), points)
+                self.assertTrue(min_distance < np.hypot(*(np.asarray(point) - center)) < max_distance)
+
+    def test_generator(self):
+        filename = os.path.join(self.tmp_dir, 'points.npy')
+        gen = ORSGenerator('directions', _template('openrouteservice_car.yaml'), GEOJSON)
+        save_points(filename, gen._random_coordinates(2000))
+
+        points = set(map(tuple, load_points(filename)))
+        for distance_sampling in ('rejection', 'annulus'):
+            gen = ORSGenerator('directions', _template('openrouteservice_car.yaml'), GEOJSON, sampling='points',
+                               points=filename, distance_sampling=distance_sampling, seed=0)
+            coordinates = gen._random_coordinates(20)
+            self.assertTrue(all(tuple(c) in points for c in coordinates))
+            distances = np.hypot(*np.diff(coordinates, axis=0).T)
+            self.assertTrue(np.all((gen.accept_distance['min'] < distances) &
+                                   (distances < gen.accept_distance['max'])))
+
+
+class RandomCoordinatesTest(unittest.TestCase):
+
+    def test_many_coordinates_without_distance(self):
+        gen = ORSGenerator('isochrones', _template('openrouteservice_isochrones_matrix.yaml'), GEOJSON)
+        gen.accept_distance = None
+        coordinates = gen._random_coordinates(20000)
+        self.assertEqual(len(coordinates), 20000)
+
+    def test_seed(self):
+        template_dict = _template('openrouteservice_car.yaml')
+        gens = [ORSGenerator('directions', template_dict, GEOJSON, seed=seed) for seed in (1, 1, 2)]
+        requests = [[gen.create_requests() for _ in range(10)] for gen in gens]
+        self.assertEqual(requests[0], requests[1])
+        self.assertNotEqual(requests[0], requests[2])
+        gens[0].seed(1)
+        self.assertEqual([gens[0].create_requests() for _ in range(10)], requests[0])
+
+    def test_triangulation(self):
+        gen = ORSGenerator('directions', _template('openrouteservice_car.yaml'), GEOJSON, sampling='triangulation')
+        coordinates = gen._random_coordinates(50)
+        self.assertTrue(all(gen.polygon.contains(Point(*c)) for c in coordinates))
+
+    def test_distance_constraint(self):
+        gen = ORSGenerator('directions', _template('openrouteservice_car.yaml'), GEOJSON)
+        coordinates = np.array(gen._random_coordinates(50))
+        distances = np.hypot(*np.diff(coordinates, axis=0).T)
+        self.assertTrue(np.all((gen.accept_distance['min'] < distances) & (distances < gen.accept_distance['max'])))
+        self.assertTrue(all(gen.polygon.contains(Point(*c)) for c in coordinates))
+
+
+if __name__ == '__main__':
+    unittest.main()
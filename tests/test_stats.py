@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+
+from orsdev.stats import Histogram
+
+
+class HistogramTest(unittest.TestCase):
+
+    def setUp(self):
+        self.values = np.random.default_rng(0).lognormal(4, 1, 10000)
+
+    def test_percentiles_within_precision(self):
+        h = Histogram()
+        for value in self.values:
+            h.record(value)
+        self.assertEqual(h.count, len(self.values))
+        self.assertAlmostEqual(h.mean, self.values.mean())
+        for p in (0, 1, 50, 90, 99, 99.9, 100):
+            expected = np.percentile(self.values, p, method='inverted_cdf')
+            self.assertLessEqual(abs(h.percentile(p) - expected) / expected, h.precision / 2 + 1e-9)
+        # never beyond the recorded extremes
+        self.assertLessEqual(h.percentile(100), self.values.max())
+        self.assertGreaterEqual(h.percentile(0), self.values.min())
+
+    def test_empty(self):
+        h = Histogram()
+        self.assertIsNone(h.percentile(50))
+        self.assertIsNone(h.mean)
+
+    def test_merge(self):
+        whole, parts = Histogram(), [Histogram(), Histogram()]
+        for idx, value in enumerate(self.values):
+            whole.record(value)
+            parts[idx % 2].record(value)
+
+        merged = Histogram()
+        merged.merge(parts[0])
+        # as sent from a locust worker
+        merged.merge(parts[1].snapshot())
+        merged.merge(Histogram())
+        np.testing.assert_array_equal(merged.counts, whole.counts)
+        self.assertEqual((merged.count, merged.min, merged.max), (whole.count, whole.min, whole.max))
+        self.assertAlmostEqual(merged.sum, whole.sum)
+        for p in (50, 99):
+            self.assertEqual(merged.percentile(p), whole.percentile(p))
+
+    def test_merge_other_settings(self):
+        with self.assertRaises(ValueError):
+            Histogram().merge(Histogram(precision=0.1))
+
+    def test_reset(self):
+        h = Histogram()
+        h.record(5)
+        h.reset()
+        self.assertEqual((h.count, h.counts.sum(), h.min), (0, 0, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+from copy import deepcopy
+import glob
+import os
+import unittest
+
+import numpy as np
+import yaml
+
+from orsdev.generator import ORSGenerator
+from orsdev.template import CompiledTemplate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _init_parameters(d):
+    for k in d:
+        if isinstance(d[k], dict):
+            try:
+                d[k] = np.arange(*d[k].values())
+            except Exception:
+                _init_parameters(d[k])
+
+
+def _pick_random_parameters(d, multi_params, rng):
+    """The tree walk the compiled plan replaced, as reference, with the same calls of the random stream."""
+    for k in d:
+        if isinstance(d[k], dict):
+            _pick_random_parameters(d[k], multi_params, rng)
+        elif isinstance(d[k], (list, range, tuple, np.ndarray)):
+            if k in multi_params:
+                num = int(rng.integers(1, len(d[k])))
+                d[k] = [d[k][i] for i in rng.choice(len(d[k]), num, replace=False)]
+            else:
+                d[k] = d[k][rng.integers(len(d[k]))]
+            if isinstance(d[k], np.int64):
+                d[k] = int(d[k])
+            if isinstance(d[k], np.float64):
+                d[k] = float(d[k])
+        elif isinstance(d[k], int):
+            d[k] = range(d[k])
+        else:
+            raise ValueError
+    return d
+
+
+class CompiledTemplateTest(unittest.TestCase):
+
+    def test_same_as_tree_walk(self):
+        multi_params_map = ORSGenerator._get_multi_params_map()
+        for filename in sorted(glob.glob(os.path.join(ROOT, 'orsdev/templates/*.yaml'))):
+            with open(filename) as f:
+                template_dict = yaml.safe_load(f)
+            for endpoint, endpoint_dict in template_dict['endpoints'].items():
+                multi_params = multi_params_map.get(endpoint, [])
+                try:
+                    template = CompiledTemplate(endpoint_dict['params'], multi_params)
+                except ValueError:
+                    # e.g. a parameter without any value left uncommented
+                    with self.assertRaises(ValueError):
+                        expected = deepcopy(endpoint_dict['params'])
+                        _init_parameters(expected)
+                        _pick_random_parameters(expected, multi_params, np.random.default_rng())
+                    continue
+                for seed in range(50):
+                    expected = deepcopy(endpoint_dict['params'])
+                    _init_parameters(expected)
+                    expected = _pick_random_parameters(expected, multi_params, np.random.default_rng(seed))
+                    # repr tells apart e.g. 1 and 1.0 or int and numpy.int64
+                    self.assertEqual(repr(template.execute(np.random.default_rng(seed))), repr(expected),
+                                     "{} {} seed {}".format(os.path.basename(filename), endpoint, seed))
+
+    def test_invalid_value(self):
+        with self.assertRaises(ValueError):
+            CompiledTemplate({'profile': 'driving-car'})
+
+
+if __name__ == '__main__':
+    unittest.main()
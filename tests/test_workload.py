@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import yaml
+from shapely.geometry import Point, Polygon
+
+from orsdev.generator import ORSGenerator
+from orsdev.sampling import HotspotSampler, RasterSampler, load_raster, zipf_weights, save_points, load_points
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GEOJSON = os.path.join(ROOT, 'geojson/regbez_karlsruhe.geojson')
+
+SQUARE = Polygon([(0, 0), (4, 0), (4, 2), (0, 2)])
+
+
+def _template(name):
+    with open(os.path.join(ROOT, 'orsdev/templates', name)) as f:
+        return yaml.safe_load(f)
+
+
+class ZipfTest(unittest.TestCase):
+
+    def test_weights(self):
+        weights = zipf_weights(4, 1.0)
+        self.assertAlmostEqual(weights.sum(), 1)
+        np.testing.assert_allclose(weights / weights[0], [1, 1 / 2, 1 / 3, 1 / 4])
+        np.testing.assert_allclose(zipf_weights(3, 0), [1 / 3] * 3)
+
+
+class HotspotSamplerTest(unittest.TestCase):
+
+    def test_zipf(self):
+        hotspots = np.array([[1, 1], [2, 1], [3, 1]], dtype=float)
+        sampler = HotspotSampler(SQUARE, hotspots, zipf_weights(3), spread=0)
+        candidates, drawn = sampler.draw(np.random.default_rng(0), 60000)
+        self.assertEqual((drawn, len(candidates)), (60000, 60000))
+        # no spread repeats the exact hotspots, by rank
+        shares = [np.mean(np.all(candidates == hotspot, axis=1)) for hotspot in hotspots]
+        np.testing.assert_allclose(shares, zipf_weights(3), atol=0.01)
+
+    def test_spread(self):
+        sampler = HotspotSampler(SQUARE, [[0.1, 1]], spread=0.1)
+        candidates, drawn = sampler.draw(np.random.default_rng(0), 10000)
+        # about half is west of the polygon
+        self.assertAlmostEqual(len(candidates) / drawn, 0.5 + 0.5 * 0.683, delta=0.03)
+        self.assertTrue(all(SQUARE.contains(Point(*c)) for c in candidates[:500]))
+        self.assertAlmostEqual(np.std(candidates[:, 1]), 0.1, delta=0.01)
+
+
+class RasterSamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_load_ascii_grid(self):
+        filename = os.path.join(self.tmp_dir, 'density.asc')
+        with open(filename, 'w') as f:
+            f.write("ncols 4\nnrows 2\nxllcorner 0\nyllcorner 0\ncellsize 1\nNODATA_value -9999\n"
+                    "1 0 0 -9999\n0 0 0 3\n")
+        density, bounds = load_raster(filename)
+        np.testing.assert_array_equal(density, [[1, 0, 0, 0], [0, 0, 0, 3]])
+        self.assertEqual(bounds, (0, 0, 4, 2))
+
+        npz = os.path.join(self.tmp_dir, 'density.npz')
+        np.savez(npz, density=density, bounds=bounds)
+        loaded, loaded_bounds = load_raster(npz)
+        np.testing.assert_array_equal(loaded, density)
+        self.assertEqual(loaded_bounds, bounds)
+
+        with open(filename, 'w') as f:
+            f.write("ncols 1\nnrows 1\n1\n")
+        with self.assertRaises(ValueError):
+            load_raster(filename)
+
+    def test_by_density(self):
+        # first row is north: 1 in the north west cell, 3 in the south east one
+        sampler = RasterSampler(SQUARE, [[1, 0, 0, 0], [0, 0, 0, np.nan]], (0, 0, 4, 2))
+        candidates, _ = sampler.draw(np.random.default_rng(0), 1000)
+        self.assertTrue(np.all((candidates[:, 0] < 1) & (candidates[:, 1] > 1)))
+
+        sampler = RasterSampler(SQUARE, [[1, 0, 0, 0], [0, 0, 0, 3]], (0, 0, 4, 2))
+        candidates, drawn = sampler.draw(np.random.default_rng(0), 20000)
+        self.assertEqual(len(candidates), drawn)
+        north_west = (candidates[:, 0] < 1) & (candidates[:, 1] > 1)
+        south_east = (candidates[:, 0] > 3) & (candidates[:, 1] < 1)
+        self.assertTrue(np.all(north_west | south_east))
+        self.assertAlmostEqual(np.mean(north_west), 0.25, delta=0.01)
+
+        with self.assertRaises(ValueError):
+            RasterSampler(SQUARE, [[0, -1]], (0, 0, 2, 1))
+
+
+class WorkloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_hotspots(self):
+        workload = {'spatial': 'hotspots', 'hotspots': {'count': 5, 'spread': 0}}
+        gens = [ORSGenerator('matrix', _template('openrouteservice_isochrones_matrix.yaml'), GEOJSON,
+                             workload=workload, seed=seed) for seed in (1, 2)]
+        # every generator has the same hotspots, whatever its seed
+        np.testing.assert_array_equal(gens[0].sampler.hotspots, gens[1].sampler.hotspots)
+
+        hotspots = set(map(tuple, gens[0].sampler.hotspots))
+        for _ in range(10):
+            locations = gens[0].create_requests()['locations']
+            self.assertTrue(all(tuple(location) in hotspots for location in locations))
+
+    def test_hotspots_on_points(self):
+        filename = os.path.join(self.tmp_dir, 'points.npy')
+        gen = ORSGenerator('matrix', _template('openrouteservice_isochrones_matrix.yaml'), GEOJSON)
+        save_points(filename, gen._random_coordinates(3000))
+        points = set(map(tuple, load_points(filename)))
+
+        for spread in (0, 0.05):
+            gen = ORSGenerator('matrix', _template('openrouteservice_isochrones_matrix.yaml'), GEOJSON,
+                               sampling='points', points=filename, seed=0,
+                               workload={'spatial': 'hotspots', 'hotspots': {'count': 5, 'spread': spread}})
+            locations = [location for _ in range(20) for location in gen.create_requests()['locations']]
+            self.assertTrue(all(tuple(location) in points for location in locations))
+            # no spread repeats the points nearest to the hotspots
+            self.assertEqual(len(set(map(tuple, locations))) <= 5, not spread)
+
+    def test_repeat_rate(self):
+        template_dict = _template('openrouteservice_car.yaml')
+        gen = ORSGenerator('directions', template_dict, GEOJSON, workload={'repeat_rate': 0.5}, seed=0)
+        requests = [gen.create_requests() for _ in range(400)]
+        self.assertAlmostEqual(gen.repeated / 400, 0.5, delta=0.1)
+        self.assertEqual(len(set(repr(request) for request in requests)), 400 - gen.repeated)
+
+        # seed() clears the pool, so the requests are reproducible
+        gen.seed(0)
+        self.assertEqual([gen.create_requests() for _ in range(400)], requests)
+
+        # repeated requests are copies
+        for request in requests:
+            request['coordinates'].clear()
+        self.assertTrue(all(gen.create_requests()['coordinates'] for _ in range(50)))
+
+    def test_invalid(self):
+        template_dict = _template('openrouteservice_car.yaml')
+        with self.assertRaises(ValueError):
+            ORSGenerator('directions', template_dict, GEOJSON, workload={'spatial': 'everywhere'})
+        with self.assertRaises(ValueError):
+            ORSGenerator('directions', template_dict, GEOJSON, workload={'spatial': 'raster'})
+
+
+if __name__ == '__main__':
+    unittest.main()